@@ -6,6 +6,18 @@ from autouri import URIBase
 
 from .arg_tool import update_parsers_defaults_with_conf
 from .backward_compatibility import PARAM_KEY_NAME_CHANGE
+from .caper_defaults import (
+    DEFAULT_BATCH_MAX_SUBMIT_RATE,
+    DEFAULT_BATCH_NUM_THREADS,
+    DEFAULT_DEEPCOPY_NUM_THREADS,
+    DEFAULT_MONITORING_STATS_CACHE_DIR,
+    DEFAULT_MONITORING_STATS_CACHE_MAX_SIZE,
+    DEFAULT_NUM_PROCESSES,
+    DEFAULT_TARGET_RESOURCES,
+    DEFAULT_TROUBLESHOOT_TAIL_BYTES,
+    DEFAULT_WOMTOOL_VALIDATION_CACHE_DIR,
+    DEFAULT_WOMTOOL_VALIDATION_CACHE_MAX_SIZE,
+)
 from .caper_workflow_opts import CaperWorkflowOpts
 from .cromwell import Cromwell
 from .cromwell_backend import (
@@ -22,9 +34,9 @@ from .cromwell_backend import (
     CromwellBackendLocal,
 )
 from .cromwell_rest_api import CromwellRestAPI
-from .resource_analysis import ResourceAnalysis
 from .server_heartbeat import ServerHeartbeat
 from .singularity import Singularity
+from .task_state_server import TaskStateServer
 
 DEFAULT_CAPER_CONF = '~/.caper/default.conf'
 DEFAULT_LIST_FORMAT = 'id,status,name,str_label,user,parent,submission'
@@ -426,6 +438,25 @@ def get_parser_and_defaults(conf_file=None):
         'for a target backend. Make sure that you have installed '
         'gsutil for GCS and aws for S3.',
     )
+    parent_submit.add_argument(
+        '--no-localization-manifest',
+        action='store_true',
+        help='Disable localization manifest on --local-loc-dir. '
+        'Caper records files localized on a storage for a target backend '
+        '(source file\'s URI/size/mtime -> localized file) '
+        'and skips localizing them again while they are not modified. '
+        'This flag makes Caper check md5 hash of all files again.',
+    )
+    parent_submit.add_argument(
+        '--deepcopy-num-threads',
+        type=int,
+        default=DEFAULT_DEEPCOPY_NUM_THREADS,
+        help='Number of threads for deepcopy (recursive localization). '
+        'If > 1, all files in an input JSON and nested JSON/TSV/CSV files '
+        'are localized concurrently. '
+        'Copies to GCS buckets are serialized but reading sources is still '
+        'concurrent.',
+    )
     parent_submit.add_argument(
         '--ignore-womtool',
         action='store_true',
@@ -441,6 +472,33 @@ def get_parser_and_defaults(conf_file=None):
         default=Cromwell.DEFAULT_JAVA_HEAP_WOMTOOL,
         help='Java heap size for Womtool (java -Xmx)',
     )
+    parent_submit.add_argument(
+        '--womtool-validation-cache-dir',
+        default=DEFAULT_WOMTOOL_VALIDATION_CACHE_DIR,
+        help='Local directory to cache results of Womtool validation. '
+        'Womtool is not run again for the same WDL/inputs/imports '
+        'unless Womtool JAR is changed.',
+    )
+    parent_submit.add_argument(
+        '--womtool-validation-cache-max-size',
+        default=DEFAULT_WOMTOOL_VALIDATION_CACHE_MAX_SIZE,
+        type=int,
+        help='Maximum size of Womtool validation cache in bytes. '
+        'Least recently used ones are evicted.',
+    )
+    parent_submit.add_argument(
+        '--no-womtool-validation-cache',
+        action='store_true',
+        help='Disable Womtool validation cache.',
+    )
+    parent_submit.add_argument(
+        '--womtool-worker',
+        action='store_true',
+        help='Validate with a long-lived Womtool JVM process reused across '
+        'validations instead of starting a new JVM for each validation. '
+        'Requires Java >= 11. Can only be used with --batch-inputs: '
+        'each input JSON in a batch is validated on it.',
+    )
     parent_submit.add_argument(
         '--max-retries',
         type=int,
@@ -549,6 +607,12 @@ def get_parser_and_defaults(conf_file=None):
         action='store_true',
         help='Disable automatic retrieval/update/writing of metadata.json upon workflow/task status change.',
     )
+    parent_server.add_argument(
+        '--disable-task-state-server',
+        action='store_true',
+        help='Disable endpoint serving task states to clients '
+        '(e.g. "progress" in "caper list").',
+    )
 
     # run
     parent_run = argparse.ArgumentParser(add_help=False)
@@ -563,6 +627,35 @@ def get_parser_and_defaults(conf_file=None):
         help='Cromwell Java heap size for "run" mode (java -Xmx)',
     )
 
+    # submit
+    parent_submit_batch = argparse.ArgumentParser(add_help=False)
+    parent_submit_batch.add_argument(
+        '--batch-inputs',
+        help='Text file with a list of input JSON files (one per line) '
+        'to submit multiple workflows of the same WDL at once. '
+        'Caper\'s string label for each workflow can be defined '
+        'in the second column (tab-delimited). '
+        'Otherwise, basename of input JSON without extension will be used. '
+        'WDL is parsed only once for all workflows. '
+        'Each input JSON is validated with Womtool '
+        '(see --womtool-worker to make it faster). '
+        'Cannot be used with -i/--inputs.',
+    )
+    parent_submit_batch.add_argument(
+        '--batch-num-threads',
+        type=int,
+        default=DEFAULT_BATCH_NUM_THREADS,
+        help='Number of threads to localize input JSON files and '
+        'submit workflows concurrently for --batch-inputs.',
+    )
+    parent_submit_batch.add_argument(
+        '--batch-max-submit-rate',
+        type=float,
+        default=DEFAULT_BATCH_MAX_SUBMIT_RATE,
+        help='Maximum number of submissions per second for --batch-inputs. '
+        '0 means no limit.',
+    )
+
     # list, metadata, abort
     parent_search_wf = argparse.ArgumentParser(add_help=False)
     parent_search_wf.add_argument(
@@ -599,6 +692,15 @@ def get_parser_and_defaults(conf_file=None):
         'A heartbeat file older than '
         'this interval will be ignored.',
     )
+    parent_server_client.add_argument(
+        '--task-state-port',
+        type=int,
+        default=TaskStateServer.DEFAULT_PORT,
+        help='Port for Caper server\'s endpoint serving task states. '
+        'Task states are caught from Cromwell\'s STDOUT so that clients '
+        'can get progress of workflows without retrieving metadata. '
+        'Use a different port for multiple Caper servers on the same machine.',
+    )
 
     parent_client = argparse.ArgumentParser(add_help=False)
     parent_client.add_argument(
@@ -621,7 +723,10 @@ def get_parser_and_defaults(conf_file=None):
         '"name" (WDL/CWL name), "submission" (date/time), "start", '
         '"end" and "user". '
         '"str_label" is a special key for Caper. See help context '
-        'of "--str-label" for details',
+        'of "--str-label" for details. '
+        '"progress" is another special key to show number of tasks '
+        'for each status (e.g. Done:3,Running:1), which is read from '
+        'Caper server\'s endpoint (--task-state-port).',
     )
     parent_list.add_argument(
         '--hide-result-before',
@@ -648,6 +753,60 @@ def get_parser_and_defaults(conf_file=None):
     parent_troubleshoot.add_argument(
         '--show-stdout', action='store_true', help='Show STDOUT for failed tasks.'
     )
+    parent_troubleshoot.add_argument(
+        '--num-threads',
+        default=URIBase.DEFAULT_NUM_THREADS,
+        type=int,
+        help='Number of threads for reading STDERR/STDOUT of tasks in parallel.',
+    )
+    parent_troubleshoot.add_argument(
+        '--tail-bytes',
+        default=DEFAULT_TROUBLESHOOT_TAIL_BYTES,
+        type=int,
+        help='Show the last N bytes of STDERR/STDOUT only. '
+        'Only the tail is transferred for local, GCS and S3 files.',
+    )
+    parent_troubleshoot.add_argument(
+        '--tail-lines',
+        type=int,
+        help='Show the last N lines of STDERR/STDOUT only. '
+        'Lines are counted within the last --tail-bytes bytes.',
+    )
+    parent_troubleshoot.add_argument(
+        '--full-log',
+        action='store_true',
+        help='Show the whole STDERR/STDOUT. This ignores --tail-bytes and --tail-lines.',
+    )
+
+    # gcp_monitor, gcp_res_analysis
+    parent_multi_metadata = argparse.ArgumentParser(add_help=False)
+    parent_multi_metadata.add_argument(
+        '--num-threads',
+        default=URIBase.DEFAULT_NUM_THREADS,
+        type=int,
+        help='Number of threads for retrieving metadata JSONs of multiple '
+        'workflows from a Cromwell server in parallel. '
+        'Also used for reading monitoring logs and getting sizes of '
+        'input files of tasks in parallel.',
+    )
+    parent_multi_metadata.add_argument(
+        '--monitoring-stats-cache-dir',
+        default=DEFAULT_MONITORING_STATS_CACHE_DIR,
+        help='Local directory to cache statistics parsed from tasks\' monitoring logs. '
+        'Only new/modified monitoring logs are downloaded and parsed.',
+    )
+    parent_multi_metadata.add_argument(
+        '--monitoring-stats-cache-max-size',
+        default=DEFAULT_MONITORING_STATS_CACHE_MAX_SIZE,
+        type=int,
+        help='Maximum size of monitoring stats cache in bytes. '
+        'Least recently used ones are evicted.',
+    )
+    parent_multi_metadata.add_argument(
+        '--no-monitoring-stats-cache',
+        action='store_true',
+        help='Disable monitoring stats cache.',
+    )
 
     # gcp_monitor
     parent_gcp_monitor = argparse.ArgumentParser(add_help=False)
@@ -686,7 +845,7 @@ def get_parser_and_defaults(conf_file=None):
     parent_gcp_res_analysis.add_argument(
         '--target-resources',
         nargs='+',
-        default=list(ResourceAnalysis.DEFAULT_TARGET_RESOURCES),
+        default=list(DEFAULT_TARGET_RESOURCES),
         help='Keys for resources in a JSON gcp_monitor outputs, '
         'which forms y vector for a linear problem. '
         'Analysis will be done separately for each key (resource metric). '
@@ -698,6 +857,13 @@ def get_parser_and_defaults(conf_file=None):
         help='Local path for a 2D scatter plot PDF file. '
         'Scatter plot will not be available if --reduce-in-file-vars is none.',
     )
+    parent_gcp_res_analysis.add_argument(
+        '--num-processes',
+        default=DEFAULT_NUM_PROCESSES,
+        type=int,
+        help='Number of processes to fit models and make plots for tasks in parallel. '
+        'Plots are written on --plot-pdf in the same order regardless of this.',
+    )
 
     # cleanup
     parent_cleanup = argparse.ArgumentParser(add_help=False)
@@ -745,6 +911,7 @@ def get_parser_and_defaults(conf_file=None):
             parent_server_client,
             parent_client,
             parent_submit,
+            parent_submit_batch,
             parent_backend,
         ],
     )
@@ -808,6 +975,7 @@ def get_parser_and_defaults(conf_file=None):
             parent_server_client,
             parent_client,
             parent_search_wf,
+            parent_multi_metadata,
             parent_gcp_monitor,
         ],
     )
@@ -833,6 +1001,7 @@ def get_parser_and_defaults(conf_file=None):
             parent_server_client,
             parent_client,
             parent_search_wf,
+            parent_multi_metadata,
             parent_gcp_res_analysis,
         ],
     )
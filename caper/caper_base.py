@@ -1,17 +1,71 @@
 import logging
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
+from tempfile import TemporaryDirectory
 
 from autouri import GCSURI, S3URI, AbsPath, AutoURI
 
+from . import caper_defaults
 from .cromwell_backend import BACKEND_AWS, BACKEND_GCP
+from .localization_manifest import LocalizationManifest
 
 logger = logging.getLogger(__name__)
 
 
+class AutoURIThreadIdPool:
+    """Pool of autouri's thread_ids.
+
+    autouri caches a storage client (e.g. GCS client, which is not thread-safe)
+    for each thread_id and never releases it. A thread_id is taken from
+    the pool while a thread works on storages and then returned to the pool.
+    So the number of cached clients is bounded by the maximum number of
+    threads working concurrently rather than the number of threads ever created.
+
+    IDs are -2, -3, ... so that they are not shared with autouri's
+    default client (-1) or 0, 1, ... used by autouri/Caper's other thread pools.
+    """
+
+    FIRST_THREAD_ID = -2
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._free_thread_ids = []
+        self._num_thread_ids = 0
+
+    @property
+    def num_thread_ids(self):
+        """Number of thread_ids created so far."""
+        return self._num_thread_ids
+
+    @contextmanager
+    def acquire(self):
+        with self._lock:
+            if self._free_thread_ids:
+                thread_id = self._free_thread_ids.pop()
+            else:
+                thread_id = AutoURIThreadIdPool.FIRST_THREAD_ID - self._num_thread_ids
+                self._num_thread_ids += 1
+        try:
+            yield thread_id
+        finally:
+            with self._lock:
+                self._free_thread_ids.append(thread_id)
+
+
+AUTOURI_THREAD_ID_POOL = AutoURIThreadIdPool()
+
+
+class LocalizationRecursionError(Exception):
+    pass
+
+
 class CaperBase:
     ENV_GOOGLE_APPLICATION_CREDENTIALS = 'GOOGLE_APPLICATION_CREDENTIALS'
     DEFAULT_LOC_DIR_NAME = '.caper_tmp'
+    DEFAULT_DEEPCOPY_NUM_THREADS = caper_defaults.DEFAULT_DEEPCOPY_NUM_THREADS
 
     def __init__(
         self,
@@ -69,6 +123,9 @@ class CaperBase:
         self._local_loc_dir = local_loc_dir
         self._gcp_loc_dir = gcp_loc_dir
         self._aws_loc_dir = aws_loc_dir
+        self._loc_manifest = LocalizationManifest(
+            os.path.join(local_loc_dir, LocalizationManifest.DEFAULT_MANIFEST_DIR_NAME)
+        )
 
         self._set_env_gcp_app_credentials(gcp_service_account_key_json)
 
@@ -105,7 +162,17 @@ class CaperBase:
             )
             os.environ[env_name] = gcp_service_account_key_json
 
-    def localize_on_backend(self, f, backend, recursive=False, make_md5_file=False):
+    def localize_on_backend(
+        self,
+        f,
+        backend,
+        recursive=False,
+        make_md5_file=False,
+        no_loc_manifest=False,
+        num_threads=DEFAULT_DEEPCOPY_NUM_THREADS,
+        no_lock=False,
+        no_checksum=False,
+    ):
         """Localize a file according to the chosen backend.
         Each backend has its corresponding storage.
             - gcp -> GCS bucket path (starting with gs://)
@@ -133,6 +200,22 @@ class CaperBase:
             make_md5_file:
                 Make .md5 file for localized files. This is for local only since
                 GCS/S3 bucket paths already include md5 hash information in their metadata.
+            no_loc_manifest:
+                Do not look up/update localization manifest.
+                Files already localized (recorded on manifest) are skipped
+                without checking their md5 hash.
+            num_threads:
+                Number of threads for recursive localization.
+                If > 1, all files in JSON/CSV/TSV (including nested ones) are
+                found first and then localized concurrently (once for each file).
+                Nested JSON/CSV/TSV files are written before the file
+                pointing to them.
+                Each thread uses its own storage client.
+            no_lock:
+                Do not use a lock file while copying/writing localized files.
+            no_checksum:
+                Do not compare md5 hash (or name/size/mtime) of a source file
+                with that of an existing localized file. Always copy.
 
         Returns:
             localized URI.
@@ -144,12 +227,284 @@ class CaperBase:
         else:
             loc_prefix = self._local_loc_dir
 
-        return AutoURI(f).localize_on(
-            loc_prefix, recursive=recursive, make_md5_file=make_md5_file
-        )
+        loc_manifest = None if no_loc_manifest else self._loc_manifest
+
+        def localize_file(uri):
+            # GCS client is not thread-safe. autouri keeps a client per thread_id.
+            with AUTOURI_THREAD_ID_POOL.acquire() as worker_thread_id:
+                return self._localize(
+                    AutoURI(uri, thread_id=worker_thread_id),
+                    loc_prefix,
+                    make_md5_file=make_md5_file,
+                    loc_manifest=loc_manifest,
+                    thread_id=worker_thread_id,
+                    no_lock=no_lock,
+                    no_checksum=no_checksum,
+                )
+
+        # this function can be called by multiple threads (e.g. batch submission)
+        with AUTOURI_THREAD_ID_POOL.acquire() as thread_id:
+            if not recursive or num_threads <= 1:
+                loc_uri, _ = self._localize(
+                    AutoURI(f, thread_id=thread_id),
+                    loc_prefix,
+                    recursive=recursive,
+                    make_md5_file=make_md5_file,
+                    loc_manifest=loc_manifest,
+                    thread_id=thread_id,
+                    no_lock=no_lock,
+                    no_checksum=no_checksum,
+                )
+                return loc_uri
+
+            contents = {}
+            futures = {}
+            with ThreadPoolExecutor(max_workers=num_threads) as executor:
+
+                def submit(uri):
+                    if uri not in futures:
+                        futures[uri] = executor.submit(localize_file, uri)
+
+                self._find_files_to_localize(
+                    AutoURI(f, thread_id=thread_id), contents, submit
+                )
+                loc_uri, _ = self._localize(
+                    AutoURI(f, thread_id=thread_id),
+                    loc_prefix,
+                    recursive=recursive,
+                    make_md5_file=make_md5_file,
+                    loc_manifest=loc_manifest,
+                    contents=contents,
+                    futures=futures,
+                    thread_id=thread_id,
+                    no_lock=no_lock,
+                    no_checksum=no_checksum,
+                )
+        return loc_uri
+
+    def _find_files_to_localize(self, src_uri, contents, fnc_submit):
+        """Reads JSON/CSV/TSV files recursively and
+        submits all other files found in them for localization.
+
+        Args:
+            src_uri:
+                AutoURI object. Its thread_id is used for all files found.
+            contents:
+                Dict {URI: contents} of JSON/CSV/TSV files already read.
+                This is updated in this function.
+            fnc_submit:
+                Function to be called with each file's URI
+                (including duplicates).
+        """
+        for ext, fnc_recurse in AutoURI.LOC_RECURSE_EXT_AND_FNC.items():
+            if src_uri.ext == ext:
+                break
+        else:
+            return
+        contents[src_uri.uri] = src_uri.read()
+
+        def fnc_find(uri):
+            if uri not in contents:
+                u = AutoURI(uri, thread_id=src_uri.thread_id)
+                if u.is_valid:
+                    if u.ext in AutoURI.LOC_RECURSE_EXT_AND_FNC:
+                        self._find_files_to_localize(u, contents, fnc_submit)
+                    else:
+                        fnc_submit(uri)
+            return uri, False
+
+        fnc_recurse(contents[src_uri.uri], fnc_find)
+
+    def _localize(
+        self,
+        src_uri,
+        loc_prefix,
+        recursive=False,
+        make_md5_file=False,
+        loc_manifest=None,
+        depth=0,
+        contents=None,
+        futures=None,
+        thread_id=-1,
+        no_lock=False,
+        no_checksum=False,
+    ):
+        """Recursive localization like AutoURI.localize().
+
+        AutoURI.localize() cannot be used here since it re-creates all URIs
+        with the default client (thread_id=-1) and has no hook to skip
+        copying a file. Copying/writing a file is still done by autouri
+        (URIBase.cp() and write()).
+
+        Args:
+            contents:
+                Dict {URI: contents} of JSON/CSV/TSV files already read.
+            futures:
+                Dict {URI: Future} of files being localized concurrently.
+                Result of such future is used instead of localizing a file here.
+            thread_id:
+                autouri's thread_id for files found in src_uri and
+                localized files.
+            no_lock, no_checksum:
+                See localize_on_backend.__doc__.
+
+        Returns:
+            Tuple of (localized URI string, modified or localized).
+            See AutoURI.localize.__doc__ for details.
+        """
+        if not src_uri.is_valid:
+            return src_uri.uri, False
+
+        if depth >= AutoURI.LOC_RECURSION_DEPTH_LIMIT:
+            raise LocalizationRecursionError(
+                'Maximum recursion depth {m} exceeded. '
+                'Possible direct/indirect self-reference while '
+                'recursive localization? related file: {f}'.format(m=depth, f=src_uri)
+            )
+
+        cls = AutoURI(loc_prefix).__class__
+        sep = cls.get_path_sep()
+        loc_prefix = loc_prefix.rstrip(sep)
+        on_different_storage = cls is not src_uri.__class__
+
+        modified = False
+        if recursive:
+
+            def fnc_loc(uri):
+                if futures and uri in futures:
+                    return futures[uri].result()
+                return self._localize(
+                    AutoURI(uri, thread_id=thread_id),
+                    loc_prefix,
+                    recursive=recursive,
+                    make_md5_file=make_md5_file,
+                    loc_manifest=loc_manifest,
+                    depth=depth + 1,
+                    contents=contents,
+                    futures=futures,
+                    thread_id=thread_id,
+                    no_lock=no_lock,
+                    no_checksum=no_checksum,
+                )
+
+            for ext, fnc_recurse in AutoURI.LOC_RECURSE_EXT_AND_FNC.items():
+                if src_uri.ext == ext:
+                    if contents and src_uri.uri in contents:
+                        src_contents = contents[src_uri.uri]
+                    else:
+                        src_contents = src_uri.read()
+                    maybe_modified_contents, modified = fnc_recurse(
+                        src_contents, fnc_loc
+                    )
+                    break
+
+        if modified:
+            basename = src_uri.basename_wo_ext + cls.get_loc_suffix() + src_uri.ext
+            loc_uri = sep.join([loc_prefix, src_uri.loc_dirname, basename])
+            loc = AutoURI(loc_uri, thread_id=thread_id)
+            # lock file on GCS is made with the default client.
+            # GCS object is replaced atomically so lock is not needed.
+            loc.write(maybe_modified_contents, no_lock=no_lock or cls is GCSURI)
+
+        elif on_different_storage:
+            loc_uri = sep.join([loc_prefix, src_uri.loc_dirname, src_uri.basename])
+            key = None
+            if loc_manifest:
+                key = loc_manifest.make_key(src_uri, loc_uri)
+            if (
+                key
+                and not no_checksum
+                and loc_manifest.is_localized(key, loc_uri, thread_id=thread_id)
+            ):
+                logger.debug(
+                    'Skipped localization (found on manifest). {src} -> {loc}'.format(
+                        src=src_uri.uri, loc=loc_uri
+                    )
+                )
+            else:
+                if cls is GCSURI:
+                    CaperBase._cp_to_gcs(
+                        src_uri, loc_uri, no_checksum=no_checksum, thread_id=thread_id
+                    )
+                else:
+                    src_uri.cp(
+                        dest_uri=loc_uri,
+                        no_lock=no_lock,
+                        no_checksum=no_checksum,
+                        make_md5_file=make_md5_file,
+                    )
+                if key:
+                    loc_manifest.add(key, loc_uri, thread_id=thread_id)
+        else:
+            loc_uri = src_uri.uri
+
+        return loc_uri, modified or on_different_storage
+
+    @staticmethod
+    def _cp_to_gcs(src_uri, loc_uri, no_checksum=False, thread_id=-1):
+        """Same as URIBase.cp() but uses GCS client of thread_id for destination.
+
+        URIBase.cp() re-creates destination URI (and its lock file) with
+        the default GCS client, which is not thread-safe.
+        Lock file is not used since GCS object is replaced atomically.
+
+        Args:
+            src_uri:
+                AutoURI object of a source file on a storage other than GCS.
+            loc_uri:
+                URI string of destination on GCS. Its basename should be
+                the same as source's.
+        """
+        dest_uri = GCSURI(loc_uri, thread_id=thread_id)
+        if not no_checksum:
+            m_dest = dest_uri.get_metadata()
+            if m_dest.exists:
+                m_src = src_uri.get_metadata()
+                if m_src.md5 is not None and m_src.md5 == m_dest.md5:
+                    logger.info(
+                        'cp: skipped due to md5_match. {src} -> {dest}'.format(
+                            src=src_uri.uri, dest=loc_uri
+                        )
+                    )
+                    return
+                if (
+                    m_src.size is not None
+                    and m_src.size == m_dest.size
+                    and m_src.mtime is not None
+                    and m_dest.mtime is not None
+                    and m_src.mtime <= m_dest.mtime
+                ):
+                    logger.info(
+                        'cp: skipped due to name_size_match. {src} -> {dest}'.format(
+                            src=src_uri.uri, dest=loc_uri
+                        )
+                    )
+                    return
+
+        if isinstance(src_uri, S3URI) and not GCSURI.USE_GSUTIL_FOR_S3:
+            # autouri uploads a temporary local copy with the default client
+            with TemporaryDirectory() as tmp_d:
+                tmp_uri = AbsPath(os.path.join(tmp_d, src_uri.basename))
+                src_uri.cp(dest_uri=tmp_uri, no_lock=True, no_checksum=True)
+                dest_uri._cp_from(tmp_uri)
+        elif not dest_uri._cp_from(src_uri):
+            raise ValueError(
+                'Failed to copy to GCS. {src} -> {dest}'.format(
+                    src=src_uri.uri, dest=loc_uri
+                )
+            )
+        logger.info('cp: copied. {src} -> {dest}'.format(src=src_uri.uri, dest=loc_uri))
 
     def localize_on_backend_if_modified(
-        self, f, backend, recursive=False, make_md5_file=False
+        self,
+        f,
+        backend,
+        recursive=False,
+        make_md5_file=False,
+        no_loc_manifest=False,
+        num_threads=DEFAULT_DEEPCOPY_NUM_THREADS,
+        no_lock=False,
+        no_checksum=False,
     ):
         """Wrapper for localize_on_backend.
 
@@ -160,7 +515,14 @@ class CaperBase:
         Modified localized file has a suffix of the target storage. e.g. .s3.
         """
         f_loc = self.localize_on_backend(
-            f=f, backend=backend, recursive=recursive, make_md5_file=make_md5_file
+            f=f,
+            backend=backend,
+            recursive=recursive,
+            make_md5_file=make_md5_file,
+            no_loc_manifest=no_loc_manifest,
+            num_threads=num_threads,
+            no_lock=no_lock,
+            no_checksum=no_checksum,
         )
 
         if AutoURI(f).basename == AutoURI(f_loc).basename:
@@ -1,8 +1,13 @@
 import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
 
 from autouri import AutoURI
 
-from .caper_base import CaperBase
+from . import caper_defaults
+from .caper_base import AUTOURI_THREAD_ID_POOL, CaperBase
 from .caper_labels import CaperLabels
 from .caper_wdl_parser import CaperWDLParser
 from .caper_workflow_opts import CaperWorkflowOpts
@@ -13,6 +18,32 @@ from .singularity import Singularity
 logger = logging.getLogger(__name__)
 
 
+class SubmitRateLimiter:
+    def __init__(self, max_rate=None):
+        """Limits rate of submissions across threads.
+
+        Args:
+            max_rate:
+                Maximum number of submissions per second.
+                None or 0 means no limit.
+        """
+        self._interval = 1.0 / max_rate if max_rate else 0.0
+        self._lock = Lock()
+        self._next_time = 0.0
+
+    def wait(self):
+        """Blocks until next submission is allowed.
+        """
+        if not self._interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            t = max(now, self._next_time)
+            self._next_time = t + self._interval
+        if t > now:
+            time.sleep(t - now)
+
+
 class CaperClient(CaperBase):
     def __init__(
         self,
@@ -23,6 +54,7 @@ class CaperClient(CaperBase):
         server_hostname=CromwellRestAPI.DEFAULT_HOSTNAME,
         server_port=CromwellRestAPI.DEFAULT_PORT,
         server_heartbeat=None,
+        task_state_server=None,
     ):
         """Initializes for Caper's client functions.
 
@@ -36,6 +68,9 @@ class CaperClient(CaperBase):
             server_heartbeat:
                 ServerHeartbeat object in which a heartbeat file is defined.
                 This object is to read hostname/port pair from it.
+            task_state_server:
+                TaskStateServer object in which a port for server's endpoint
+                serving task states is defined.
         """
         super().__init__(
             local_loc_dir=local_loc_dir,
@@ -56,6 +91,8 @@ class CaperClient(CaperBase):
             )
 
         self._cromwell_rest_api = CromwellRestAPI(server_hostname, server_port)
+        self._server_hostname = server_hostname
+        self._task_state_server = task_state_server
 
     def abort(self, wf_ids_or_labels):
         """Abort running/pending workflows on a Cromwell server.
@@ -99,16 +136,47 @@ class CaperClient(CaperBase):
             Cromwell's metadata JSON file but with limited amount of information.
             e.g. workflow ID, status, labels.
         """
+        return list(
+            self.iter_list(wf_ids_or_labels, exclude_subworkflow=exclude_subworkflow)
+        )
+
+    def iter_list(self, wf_ids_or_labels=None, exclude_subworkflow=True):
+        """Generator version of list.
+        Workflows are retrieved from a Cromwell server page by page and
+        yielded as soon as each page arrives.
+
+        Yields:
+            Workflow found.
+        """
         if wf_ids_or_labels:
             workflow_ids, labels = self._split_workflow_ids_and_labels(wf_ids_or_labels)
         else:
             workflow_ids, labels = ['*'], None
 
-        return self._cromwell_rest_api.find(
+        return self._cromwell_rest_api.iter_find(
             workflow_ids, labels, exclude_subworkflow=exclude_subworkflow
         )
 
-    def metadata(self, wf_ids_or_labels, embed_subworkflow=False):
+    def task_states(self, workflow_id):
+        """Retrieves states of tasks of a workflow from Caper server's endpoint.
+        This does not communicate with Cromwell server.
+
+        Returns:
+            Dict with keys "status_count" ({status: number of tasks}) and
+            "tasks" (list of task state dicts).
+            None if task state server is not defined or not available.
+        """
+        if self._task_state_server:
+            return self._task_state_server.read(self._server_hostname, workflow_id)
+
+    def metadata(
+        self,
+        wf_ids_or_labels,
+        embed_subworkflow=False,
+        num_threads=CromwellRestAPI.DEFAULT_NUM_THREADS,
+        include_keys=None,
+        exclude_keys=None,
+    ):
         """Retrieves metadata for workflows from a Cromwell server.
 
         Args:
@@ -119,13 +187,27 @@ class CaperClient(CaperBase):
                 Recursively embed subworkflow's metadata JSON object
                 in parent workflow's metadata JSON.
                 This is to mimic behavior of Cromwell's run mode paramteter -m.
+            num_threads:
+                Number of threads to retrieve metadata of multiple workflows
+                in parallel.
+            include_keys:
+                List of metadata keys to retrieve. Use this to reduce size of
+                metadata JSON transferred from a Cromwell server.
+                e.g. CromwellMetadata.TROUBLESHOOT_KEYS.
+            exclude_keys:
+                List of metadata keys to exclude.
         Returns:
             List of metadata JSONs of matched worflows.
         """
         workflow_ids, labels = self._split_workflow_ids_and_labels(wf_ids_or_labels)
 
         return self._cromwell_rest_api.get_metadata(
-            workflow_ids, labels, embed_subworkflow=embed_subworkflow
+            workflow_ids,
+            labels,
+            embed_subworkflow=embed_subworkflow,
+            num_threads=num_threads,
+            include_keys=include_keys,
+            exclude_keys=exclude_keys,
         )
 
     def _split_workflow_ids_and_labels(self, workflow_ids_or_labels):
@@ -145,6 +227,9 @@ class CaperClient(CaperBase):
 
 
 class CaperClientSubmit(CaperClient):
+    DEFAULT_BATCH_NUM_THREADS = caper_defaults.DEFAULT_BATCH_NUM_THREADS
+    DEFAULT_BATCH_MAX_SUBMIT_RATE = caper_defaults.DEFAULT_BATCH_MAX_SUBMIT_RATE
+
     def __init__(
         self,
         local_loc_dir=None,
@@ -155,6 +240,8 @@ class CaperClientSubmit(CaperClient):
         server_port=CromwellRestAPI.DEFAULT_PORT,
         server_heartbeat=None,
         womtool=Cromwell.DEFAULT_WOMTOOL,
+        womtool_validation_cache=None,
+        use_womtool_worker=False,
         use_google_cloud_life_sciences=False,
         gcp_zones=None,
         slurm_partition=None,
@@ -171,6 +258,13 @@ class CaperClientSubmit(CaperClient):
         Args:
             womtool:
                 Womtool JAR file.
+            womtool_validation_cache:
+                WomtoolValidationCache object.
+                Womtool is not run again for validated WDL/inputs/imports.
+            use_womtool_worker:
+                Validate on a long-lived Womtool JVM process (Java >= 11)
+                reused across validations of a batch (submit_batch()).
+                Worker is stopped after each submit() or submit_batch().
             use_google_cloud_life_sciences:
                 Use Google Cloud Life Sciences API.
                 gcp_zones will be ignored since it's already configured with in
@@ -204,7 +298,11 @@ class CaperClientSubmit(CaperClient):
             server_heartbeat=server_heartbeat,
         )
 
-        self._cromwell = Cromwell(womtool=womtool)
+        self._cromwell = Cromwell(
+            womtool=womtool,
+            womtool_validation_cache=womtool_validation_cache,
+            use_womtool_worker=use_womtool_worker,
+        )
 
         self._caper_workflow_opts = CaperWorkflowOpts(
             use_google_cloud_life_sciences=use_google_cloud_life_sciences,
@@ -240,6 +338,8 @@ class CaperClientSubmit(CaperClient):
         gcp_monitoring_script=CaperWorkflowOpts.DEFAULT_GCP_MONITORING_SCRIPT,
         ignore_womtool=False,
         no_deepcopy=False,
+        no_loc_manifest=False,
+        deepcopy_num_threads=CaperBase.DEFAULT_DEEPCOPY_NUM_THREADS,
         hold=False,
         java_heap_womtool=Cromwell.DEFAULT_JAVA_HEAP_WOMTOOL,
         dry_run=False,
@@ -300,6 +400,13 @@ class CaperClientSubmit(CaperClient):
             no_deepcopy:
                 Disable recursive localization of files defined in input JSON.
                 Input JSON file itself will still be localized.
+            no_loc_manifest:
+                Do not use localization manifest.
+                Files already localized on backend's storage are
+                checked (md5 hash, size, mtime) again.
+            deepcopy_num_threads:
+                Number of threads for recursive localization of files
+                defined in input JSON.
             hold:
                 Put a workflow on hold when submitted. This workflow will be on hold until
                 it's released. See self.unhold() for details.
@@ -331,26 +438,15 @@ class CaperClientSubmit(CaperClient):
         if backend is None:
             backend = self._cromwell_rest_api.get_default_backend()
 
-        if inputs:
-            # inputs should be localized on corresponding
-            # backend's localization directory.
-            # check if such loc_dir is defined.
-            if self.get_loc_dir(backend) is None:
-                raise ValueError(
-                    'loc_dir is not defined for your backend. {b}'.format(b=backend)
-                )
-
-            maybe_remote_file = self.localize_on_backend_if_modified(
-                inputs, backend=backend, recursive=not no_deepcopy, make_md5_file=True
-            )
-            inputs = AutoURI(maybe_remote_file).localize_on(work_dir)
-
-        options = self._caper_workflow_opts.create_file(
-            directory=work_dir,
+        inputs, options, labels = self._create_submit_files(
+            work_dir=work_dir,
             wdl=wdl,
             backend=backend,
             inputs=inputs,
-            custom_options=options,
+            options=options,
+            labels=labels,
+            str_label=str_label,
+            user=user,
             docker=docker,
             singularity=singularity,
             singularity_cachedir=singularity_cachedir,
@@ -358,21 +454,15 @@ class CaperClientSubmit(CaperClient):
             max_retries=max_retries,
             memory_retry_multiplier=memory_retry_multiplier,
             gcp_monitoring_script=gcp_monitoring_script,
+            no_deepcopy=no_deepcopy,
+            no_loc_manifest=no_loc_manifest,
+            deepcopy_num_threads=deepcopy_num_threads,
         )
 
-        labels = self._caper_labels.create_file(
-            directory=work_dir,
-            backend=backend,
-            custom_labels=labels,
-            str_label=str_label,
-            user=user,
-        )
-
-        wdl_parser = CaperWDLParser(wdl)
         if imports:
             imports = AutoURI(imports).localize_on(work_dir)
         else:
-            imports = wdl_parser.create_imports_file(work_dir)
+            imports = CaperWDLParser(wdl).create_imports_file(work_dir)
 
         logger.debug(
             'submit params: wdl={wdl}, imports={imp}, inputs={inp}, '
@@ -382,12 +472,17 @@ class CaperClientSubmit(CaperClient):
         )
 
         if not ignore_womtool:
-            if not self._cromwell.validate(
-                wdl=wdl,
-                inputs=inputs,
-                imports=imports,
-                java_heap_womtool=java_heap_womtool,
-            ):
+            try:
+                valid = self._cromwell.validate(
+                    wdl=wdl,
+                    inputs=inputs,
+                    imports=imports,
+                    java_heap_womtool=java_heap_womtool,
+                )
+            finally:
+                # worker is not reused for a single submission
+                self._cromwell.stop_womtool_worker()
+            if not valid:
                 return
 
         if dry_run:
@@ -403,3 +498,275 @@ class CaperClientSubmit(CaperClient):
         )
         logger.info('submit: {r}'.format(r=r))
         return r
+
+    def submit_batch(
+        self,
+        wdl,
+        inputs_list,
+        backend=None,
+        options=None,
+        labels=None,
+        imports=None,
+        str_labels=None,
+        user=None,
+        docker=None,
+        singularity=None,
+        singularity_cachedir=Singularity.DEFAULT_SINGULARITY_CACHEDIR,
+        no_build_singularity=False,
+        max_retries=CaperWorkflowOpts.DEFAULT_MAX_RETRIES,
+        memory_retry_multiplier=CaperWorkflowOpts.DEFAULT_MEMORY_RETRY_MULTIPLIER,
+        gcp_monitoring_script=CaperWorkflowOpts.DEFAULT_GCP_MONITORING_SCRIPT,
+        ignore_womtool=False,
+        no_deepcopy=False,
+        no_loc_manifest=False,
+        deepcopy_num_threads=CaperBase.DEFAULT_DEEPCOPY_NUM_THREADS,
+        hold=False,
+        java_heap_womtool=Cromwell.DEFAULT_JAVA_HEAP_WOMTOOL,
+        dry_run=False,
+        work_dir=None,
+        num_threads=DEFAULT_BATCH_NUM_THREADS,
+        max_submit_rate=DEFAULT_BATCH_MAX_SUBMIT_RATE,
+    ):
+        """Submit multiple workflows (one for each input JSON) of the same WDL.
+
+        Work for WDL is done only once for all workflows:
+        localizing WDL, finding server's default backend, parsing WDL
+        to make an imports ZIP file and find docker/singularity images,
+        building a local singularity image and
+        validating WDL/imports with Womtool (to fail early).
+        Each input JSON is then validated with Womtool before submission.
+        Use Womtool worker (see Cromwell.__init__.__doc__) to avoid
+        starting a JVM for each input JSON.
+        The worker is stopped at the end.
+
+        Each input JSON is localized (and deepcopied) concurrently
+        with a separate storage client (autouri's thread_id) for each thread and
+        then submitted to the server at a controlled rate.
+        Failure of a workflow is logged and does not stop submitting others.
+
+        Args:
+            inputs_list:
+                List of input JSON files.
+            str_labels:
+                List of Caper's string labels (one for each input JSON).
+                If not defined, basename of each input JSON without extension
+                will be used.
+            work_dir:
+                Local temporary directory to store all temporary files.
+                A subdirectory will be made on it for each input JSON.
+            num_threads:
+                Number of threads to prepare/submit workflows concurrently.
+            max_submit_rate:
+                Maximum number of submissions per second.
+                None or 0 means no limit.
+            Others:
+                See CaperClientSubmit.submit.__doc__ for details.
+
+        Returns:
+            List of JSON responses (one for each input JSON).
+            None for a failed submission.
+        """
+        wdl_file = AutoURI(wdl)
+        if not wdl_file.exists:
+            raise FileNotFoundError('WDL does not exists. {wdl}'.format(wdl=wdl))
+
+        if str_labels is None:
+            str_labels = [AutoURI(inputs).basename_wo_ext for inputs in inputs_list]
+        if len(str_labels) != len(inputs_list):
+            raise ValueError('str_labels should have the same length as inputs_list.')
+
+        if work_dir is None:
+            work_dir = self.create_timestamped_work_dir(prefix=wdl_file.basename_wo_ext)
+
+        wdl = wdl_file.localize_on(work_dir)
+
+        if backend is None:
+            backend = self._cromwell_rest_api.get_default_backend()
+
+        wdl_parser = CaperWDLParser(wdl)
+        if imports:
+            imports = AutoURI(imports).localize_on(work_dir)
+        else:
+            imports = wdl_parser.create_imports_file(work_dir)
+
+        # find docker/singularity in WDL and build singularity image only once
+        docker, singularity = self._caper_workflow_opts.find_docker_singularity(
+            wdl,
+            backend=backend,
+            docker=docker,
+            singularity=singularity,
+            wdl_parser=wdl_parser,
+        )
+        if singularity and not no_build_singularity:
+            Singularity(singularity, singularity_cachedir).build_local_image()
+            no_build_singularity = True
+
+        # custom options/labels JSONs are read by each thread.
+        # localize them here to avoid sharing a GCS client between threads
+        if options:
+            options = AutoURI(options).localize_on(work_dir)
+        if labels:
+            labels = AutoURI(labels).localize_on(work_dir)
+
+        if not ignore_womtool:
+            if not self._cromwell.validate(
+                wdl=wdl, imports=imports, java_heap_womtool=java_heap_womtool
+            ):
+                self._cromwell.stop_womtool_worker()
+                return [None] * len(inputs_list)
+
+        rate_limiter = SubmitRateLimiter(max_submit_rate)
+
+        def submit_inputs(i):
+            inputs = inputs_list[i]
+            try:
+                sample_work_dir = os.path.join(work_dir, str(i))
+                os.makedirs(sample_work_dir, exist_ok=True)
+
+                (
+                    sample_inputs,
+                    sample_options,
+                    sample_labels,
+                ) = self._create_submit_files(
+                    work_dir=sample_work_dir,
+                    wdl=wdl,
+                    backend=backend,
+                    inputs=inputs,
+                    options=options,
+                    labels=labels,
+                    str_label=str_labels[i],
+                    user=user,
+                    docker=docker,
+                    singularity=singularity,
+                    singularity_cachedir=singularity_cachedir,
+                    no_build_singularity=no_build_singularity,
+                    max_retries=max_retries,
+                    memory_retry_multiplier=memory_retry_multiplier,
+                    gcp_monitoring_script=gcp_monitoring_script,
+                    no_deepcopy=no_deepcopy,
+                    no_loc_manifest=no_loc_manifest,
+                    deepcopy_num_threads=deepcopy_num_threads,
+                    wdl_parser=wdl_parser,
+                )
+                if not ignore_womtool:
+                    if not self._cromwell.validate(
+                        wdl=wdl,
+                        inputs=sample_inputs,
+                        imports=imports,
+                        java_heap_womtool=java_heap_womtool,
+                    ):
+                        logger.error(
+                            'Womtool validation failed. inputs={inputs}'.format(
+                                inputs=inputs
+                            )
+                        )
+                        return
+                if dry_run:
+                    return
+
+                rate_limiter.wait()
+                r = self._cromwell_rest_api.submit(
+                    source=wdl,
+                    dependencies=imports,
+                    inputs=sample_inputs,
+                    options=sample_options,
+                    labels=sample_labels,
+                    on_hold=hold,
+                )
+                logger.info('submit: inputs={inputs}, {r}'.format(inputs=inputs, r=r))
+                return r
+
+            except Exception:
+                logger.error(
+                    'Failed to submit a workflow. inputs={inputs}'.format(
+                        inputs=inputs
+                    ),
+                    exc_info=True,
+                )
+
+        try:
+            with ThreadPoolExecutor(max_workers=num_threads) as executor:
+                return list(executor.map(submit_inputs, range(len(inputs_list))))
+        finally:
+            self._cromwell.stop_womtool_worker()
+
+    def _create_submit_files(
+        self,
+        work_dir,
+        wdl,
+        backend,
+        inputs=None,
+        options=None,
+        labels=None,
+        str_label=None,
+        user=None,
+        docker=None,
+        singularity=None,
+        singularity_cachedir=Singularity.DEFAULT_SINGULARITY_CACHEDIR,
+        no_build_singularity=False,
+        max_retries=CaperWorkflowOpts.DEFAULT_MAX_RETRIES,
+        memory_retry_multiplier=CaperWorkflowOpts.DEFAULT_MEMORY_RETRY_MULTIPLIER,
+        gcp_monitoring_script=CaperWorkflowOpts.DEFAULT_GCP_MONITORING_SCRIPT,
+        no_deepcopy=False,
+        no_loc_manifest=False,
+        deepcopy_num_threads=CaperBase.DEFAULT_DEEPCOPY_NUM_THREADS,
+        wdl_parser=None,
+    ):
+        """Localizes input JSON and creates workflow options/labels JSON files
+        on work_dir for a workflow.
+        See CaperClientSubmit.submit.__doc__ for details about Args.
+        wdl_parser (CaperWDLParser) can be given to avoid parsing WDL again.
+
+        Returns:
+            Tuple of (inputs, options, labels) files.
+        """
+        if inputs:
+            # inputs should be localized on corresponding
+            # backend's localization directory.
+            # check if such loc_dir is defined.
+            if self.get_loc_dir(backend) is None:
+                raise ValueError(
+                    'loc_dir is not defined for your backend. {b}'.format(b=backend)
+                )
+
+            maybe_remote_file = self.localize_on_backend_if_modified(
+                inputs,
+                backend=backend,
+                recursive=not no_deepcopy,
+                make_md5_file=True,
+                no_loc_manifest=no_loc_manifest,
+                num_threads=deepcopy_num_threads,
+            )
+            # same as AutoURI.localize_on() but keeps thread_id of the source.
+            # GCS client is not thread-safe (e.g. batch submission).
+            with AUTOURI_THREAD_ID_POOL.acquire() as thread_id:
+                inputs, _ = self._localize(
+                    AutoURI(maybe_remote_file, thread_id=thread_id),
+                    work_dir,
+                    thread_id=thread_id,
+                )
+
+        options = self._caper_workflow_opts.create_file(
+            directory=work_dir,
+            wdl=wdl,
+            backend=backend,
+            inputs=inputs,
+            custom_options=options,
+            docker=docker,
+            singularity=singularity,
+            singularity_cachedir=singularity_cachedir,
+            no_build_singularity=no_build_singularity,
+            max_retries=max_retries,
+            memory_retry_multiplier=memory_retry_multiplier,
+            gcp_monitoring_script=gcp_monitoring_script,
+            wdl_parser=wdl_parser,
+        )
+
+        labels = self._caper_labels.create_file(
+            directory=work_dir,
+            backend=backend,
+            custom_labels=labels,
+            str_label=str_label,
+            user=user,
+        )
+        return inputs, options, labels
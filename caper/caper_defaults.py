@@ -0,0 +1,28 @@
+"""Default values shared by Caper's classes and command line arguments.
+
+This module should not import anything so that caper_args can get
+default values without importing modules for them
+(e.g. CaperClient, CromwellMetadata).
+"""
+
+# CaperBase
+DEFAULT_DEEPCOPY_NUM_THREADS = 1
+
+# CaperClientSubmit
+DEFAULT_BATCH_NUM_THREADS = 4
+DEFAULT_BATCH_MAX_SUBMIT_RATE = 2.0
+
+# CromwellMetadata
+DEFAULT_TROUBLESHOOT_TAIL_BYTES = 100 * 1024
+
+# ResourceAnalysis
+DEFAULT_TARGET_RESOURCES = ('stats.max.mem', 'stats.max.disk')
+DEFAULT_NUM_PROCESSES = 1
+
+# MonitoringStatsCache
+DEFAULT_MONITORING_STATS_CACHE_DIR = '~/.caper/monitoring_stats_cache'
+DEFAULT_MONITORING_STATS_CACHE_MAX_SIZE = 256 * 1024 * 1024
+
+# WomtoolValidationCache
+DEFAULT_WOMTOOL_VALIDATION_CACHE_DIR = '~/.caper/womtool_validation_cache'
+DEFAULT_WOMTOOL_VALIDATION_CACHE_MAX_SIZE = 16 * 1024 * 1024
@@ -38,6 +38,7 @@ class CaperRunner(CaperBase):
         aws_loc_dir=None,
         cromwell=Cromwell.DEFAULT_CROMWELL,
         womtool=Cromwell.DEFAULT_WOMTOOL,
+        womtool_validation_cache=None,
         disable_call_caching=False,
         max_concurrent_workflows=CromwellBackendCommon.DEFAULT_MAX_CONCURRENT_WORKFLOWS,
         memory_retry_error_keys=CromwellBackendCommon.DEFAULT_MEMORY_RETRY_ERROR_KEYS,
@@ -86,6 +87,9 @@ class CaperRunner(CaperBase):
                 Cromwell JAR URI.
             womtool:
                 Womtool JAR URI.
+            womtool_validation_cache:
+                WomtoolValidationCache object.
+                Womtool is not run again for validated WDL/inputs/imports.
             disable_call_caching:
             max_concurrent_workflows:
             memory_retry_error_keys
@@ -150,7 +154,11 @@ class CaperRunner(CaperBase):
         )
         self._set_env_gcp_prj(gcp_prj)
 
-        self._cromwell = Cromwell(cromwell=cromwell, womtool=womtool)
+        self._cromwell = Cromwell(
+            cromwell=cromwell,
+            womtool=womtool,
+            womtool_validation_cache=womtool_validation_cache,
+        )
 
         if local_out_dir is None:
             local_out_dir = os.getcwd()
@@ -254,11 +262,15 @@ class CaperRunner(CaperBase):
         gcp_monitoring_script=CaperWorkflowOpts.DEFAULT_GCP_MONITORING_SCRIPT,
         ignore_womtool=False,
         no_deepcopy=False,
+        no_loc_manifest=False,
+        deepcopy_num_threads=CaperBase.DEFAULT_DEEPCOPY_NUM_THREADS,
         fileobj_stdout=None,
         fileobj_troubleshoot=None,
         work_dir=None,
         java_heap_run=Cromwell.DEFAULT_JAVA_HEAP_CROMWELL_RUN,
         java_heap_womtool=Cromwell.DEFAULT_JAVA_HEAP_WOMTOOL,
+        on_task_status_change=None,
+        task_state_table=None,
         dry_run=False,
     ):
         """Run a workflow using Cromwell run mode.
@@ -336,6 +348,13 @@ class CaperRunner(CaperBase):
             no_deepcopy:
                 Disable recursive localization of files defined in input JSON.
                 Input JSON file itself will still be localized.
+            no_loc_manifest:
+                Do not use localization manifest.
+                Files already localized on backend's storage are
+                checked (md5 hash, size, mtime) again.
+            deepcopy_num_threads:
+                Number of threads for recursive localization of files
+                defined in input JSON.
             fileobj_stdout:
                 File-like object to write Cromwell's STDOUT.
             fileobj_troubleshoot:
@@ -353,6 +372,13 @@ class CaperRunner(CaperBase):
                 Java heap (java -Xmx) for Cromwell server mode.
             java_heap_womtool:
                 Java heap (java -Xmx) for Womtool.
+            on_task_status_change:
+                Callback function called on any task status change.
+                This should take one parameter (TaskState object).
+            task_state_table:
+                TaskStateTable object to keep task states on.
+                Task states can be queried on this object without
+                communicating with Cromwell.
             dry_run:
                 Stop before running Java command line for Cromwell.
         Returns:
@@ -374,7 +400,12 @@ class CaperRunner(CaperBase):
 
         if inputs:
             maybe_remote_file = self.localize_on_backend_if_modified(
-                inputs, backend=backend, recursive=not no_deepcopy, make_md5_file=True
+                inputs,
+                backend=backend,
+                recursive=not no_deepcopy,
+                make_md5_file=True,
+                no_loc_manifest=no_loc_manifest,
+                num_threads=deepcopy_num_threads,
             )
             inputs = AutoURI(maybe_remote_file).localize_on(work_dir)
 
@@ -444,6 +475,8 @@ class CaperRunner(CaperBase):
             metadata=metadata_output,
             fileobj_stdout=fileobj_stdout,
             fileobj_troubleshoot=fileobj_troubleshoot,
+            on_task_status_change=on_task_status_change,
+            task_state_table=task_state_table,
             dry_run=dry_run,
         )
         return th
@@ -459,6 +492,9 @@ class CaperRunner(CaperBase):
         embed_subworkflow=False,
         java_heap_server=Cromwell.DEFAULT_JAVA_HEAP_CROMWELL_SERVER,
         auto_write_metadata=True,
+        on_task_status_change=None,
+        task_state_table=None,
+        task_state_server=None,
         work_dir=None,
         dry_run=False,
     ):
@@ -495,6 +531,16 @@ class CaperRunner(CaperBase):
                 Java heap (java -Xmx) for Cromwell server mode.
             auto_write_metadata:
                 Automatic retrieval/writing of metadata.json upon workflow/task's status change.
+            on_task_status_change:
+                Callback function called on any task status change.
+                This should take one parameter (TaskState object).
+            task_state_table:
+                TaskStateTable object to keep task states on.
+                Task states can be queried on this object without
+                communicating with Cromwell.
+            task_state_server:
+                TaskStateServer object to serve task states to clients
+                (e.g. progress in "caper list").
             work_dir:
                 Local temporary directory to store all temporary files.
                 Temporary files mean intermediate files used for running Cromwell.
@@ -526,6 +572,9 @@ class CaperRunner(CaperBase):
             embed_subworkflow=embed_subworkflow,
             java_heap_cromwell_server=java_heap_server,
             auto_write_metadata=auto_write_metadata,
+            on_task_status_change=on_task_status_change,
+            task_state_table=task_state_table,
+            task_state_server=task_state_server,
             dry_run=dry_run,
         )
         return th
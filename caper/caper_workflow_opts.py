@@ -117,6 +117,7 @@ class CaperWorkflowOpts:
         memory_retry_multiplier=DEFAULT_MEMORY_RETRY_MULTIPLIER,
         gcp_monitoring_script=DEFAULT_GCP_MONITORING_SCRIPT,
         basename=BASENAME_WORKFLOW_OPTS_JSON,
+        wdl_parser=None,
     ):
         """Creates Cromwell's workflow options JSON file.
         Workflow options JSON file sets default values for attributes
@@ -172,6 +173,9 @@ class CaperWorkflowOpts:
                 Useful to monitor resources on an instance.
             basename:
                 Basename for a temporary workflow options JSON file.
+            wdl_parser:
+                CaperWDLParser object for WDL.
+                WDL is parsed only if needed if this is not defined.
         """
         if singularity and docker:
             raise ValueError('Cannot use both Singularity and Docker.')
@@ -182,46 +186,16 @@ class CaperWorkflowOpts:
         if backend:
             template['backend'] = backend
 
-        wdl_parser = CaperWDLParser(wdl)
-        if docker == '' or backend in (BACKEND_GCP, BACKEND_AWS) and not docker:
-            # find "caper-docker" from WDL's workflow.meta
-            # or "#CAPER docker" from comments
-            docker = wdl_parser.caper_docker
-            if docker:
-                logger.info(
-                    'Docker image found in WDL\'s metadata. wdl={wdl}, d={d}'.format(
-                        wdl=wdl, d=docker
-                    )
-                )
-            else:
-                logger.warning(
-                    "Docker image not found in WDL's metadata, which means that "
-                    "docker is not defined either as comment (#CAPER docker) or "
-                    "in workflow's meta section (under key caper_docker) in WDL. "
-                    "If your WDL already has docker defined "
-                    "in each task's runtime "
-                    "then it should be okay. wdl={wdl}".format(wdl=wdl)
-                )
+        docker, singularity = self.find_docker_singularity(
+            wdl,
+            backend=backend,
+            docker=docker,
+            singularity=singularity,
+            wdl_parser=wdl_parser,
+        )
         if docker:
             dra['docker'] = docker
 
-        if singularity == '':
-            if backend in (BACKEND_GCP, BACKEND_AWS):
-                raise ValueError(
-                    'Singularity cannot be used for cloud backend (e.g. aws, gcp).'
-                )
-
-            singularity = wdl_parser.caper_singularity
-            if singularity:
-                logger.info(
-                    'Singularity image found in WDL\'s metadata. wdl={wdl}, s={s}'.format(
-                        wdl=wdl, s=singularity
-                    )
-                )
-            else:
-                raise ValueError(
-                    'Singularity image not found in WDL. wdl={wdl}'.format(wdl=wdl)
-                )
         if singularity:
             dra['singularity'] = singularity
             if singularity_cachedir:
@@ -258,3 +232,68 @@ class CaperWorkflowOpts:
         AutoURI(final_options_file).write(json.dumps(template, indent=4) + '\n')
 
         return final_options_file
+
+    def find_docker_singularity(
+        self, wdl, backend=None, docker=None, singularity=None, wdl_parser=None
+    ):
+        """Finds Docker/Singularity images in WDL if needed.
+
+        Args:
+            wdl:
+                WDL file.
+            backend:
+                Backend to run a workflow on.
+                Docker image is looked up in WDL for cloud backends
+                if it is not defined.
+            docker:
+                Docker image. Empty string means looking it up in WDL.
+            singularity:
+                Singularity image. Empty string means looking it up in WDL.
+            wdl_parser:
+                CaperWDLParser object for WDL.
+                WDL is parsed only if needed if this is not defined.
+        Returns:
+            Tuple of (docker, singularity).
+        """
+        if docker == '' or backend in (BACKEND_GCP, BACKEND_AWS) and not docker:
+            # find "caper-docker" from WDL's workflow.meta
+            # or "#CAPER docker" from comments
+            if wdl_parser is None:
+                wdl_parser = CaperWDLParser(wdl)
+            docker = wdl_parser.caper_docker
+            if docker:
+                logger.info(
+                    'Docker image found in WDL\'s metadata. wdl={wdl}, d={d}'.format(
+                        wdl=wdl, d=docker
+                    )
+                )
+            else:
+                logger.warning(
+                    "Docker image not found in WDL's metadata, which means that "
+                    "docker is not defined either as comment (#CAPER docker) or "
+                    "in workflow's meta section (under key caper_docker) in WDL. "
+                    "If your WDL already has docker defined "
+                    "in each task's runtime "
+                    "then it should be okay. wdl={wdl}".format(wdl=wdl)
+                )
+
+        if singularity == '':
+            if backend in (BACKEND_GCP, BACKEND_AWS):
+                raise ValueError(
+                    'Singularity cannot be used for cloud backend (e.g. aws, gcp).'
+                )
+            if wdl_parser is None:
+                wdl_parser = CaperWDLParser(wdl)
+            singularity = wdl_parser.caper_singularity
+            if singularity:
+                logger.info(
+                    'Singularity image found in WDL\'s metadata. wdl={wdl}, s={s}'.format(
+                        wdl=wdl, s=singularity
+                    )
+                )
+            else:
+                raise ValueError(
+                    'Singularity image not found in WDL. wdl={wdl}'.format(wdl=wdl)
+                )
+
+        return docker, singularity
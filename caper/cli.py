@@ -7,7 +7,7 @@ import os
 import re
 import sys
 
-from autouri import GCSURI, AutoURI
+from autouri import GCSURI, AbsPath, AutoURI
 
 from . import __version__ as version
 from .caper_args import ResourceAnalysisReductionMethod, get_parser_and_defaults
@@ -22,8 +22,11 @@ from .cromwell_backend import (
 )
 from .cromwell_metadata import CromwellMetadata
 from .dict_tool import flatten_dict
+from .monitoring_stats_cache import MonitoringStatsCache
 from .resource_analysis import LinearResourceAnalysis
 from .server_heartbeat import ServerHeartbeat
+from .task_state_server import TaskStateServer
+from .womtool_validation_cache import WomtoolValidationCache
 
 logger = logging.getLogger(__name__)
 
@@ -183,6 +186,7 @@ def runner(args, nonblocking_server=False):
         gcp_service_account_key_json=get_abspath(args.gcp_service_account_key_json),
         cromwell=get_abspath(args.cromwell),
         womtool=get_abspath(getattr(args, 'womtool', None)),
+        womtool_validation_cache=get_womtool_validation_cache(args),
         disable_call_caching=args.disable_call_caching,
         max_concurrent_workflows=args.max_concurrent_workflows,
         memory_retry_error_keys=args.memory_retry_error_keys,
@@ -252,6 +256,8 @@ def client(args):
             server_port=args.port,
             server_heartbeat=sh,
             womtool=get_abspath(args.womtool),
+            womtool_validation_cache=get_womtool_validation_cache(args),
+            use_womtool_worker=args.womtool_worker,
             use_google_cloud_life_sciences=args.use_google_cloud_life_sciences,
             gcp_zones=args.gcp_zones,
             slurm_partition=args.slurm_partition,
@@ -274,6 +280,7 @@ def client(args):
             server_hostname=args.hostname,
             server_port=args.port,
             server_heartbeat=sh,
+            task_state_server=TaskStateServer(port=args.task_state_port),
         )
         if args.action == 'abort':
             subcmd_abort(c, args)
@@ -319,6 +326,9 @@ def subcmd_server(caper_runner, args, nonblocking=False):
         'embed_subworkflow': True,
         'auto_write_metadata': not args.disable_auto_write_metadata,
         'java_heap_server': args.java_heap_server,
+        'task_state_server': None
+        if args.disable_task_state_server
+        else TaskStateServer(port=args.task_state_port),
         'dry_run': args.dry_run,
     }
 
@@ -340,6 +350,8 @@ def subcmd_server(caper_runner, args, nonblocking=False):
 
 
 def subcmd_run(caper_runner, args):
+    if args.womtool_worker:
+        raise ValueError('--womtool-worker can only be used with --batch-inputs.')
     cromwell_stdout = get_abspath(args.cromwell_stdout)
 
     with open(cromwell_stdout, 'w') as f:
@@ -363,6 +375,8 @@ def subcmd_run(caper_runner, args):
                 gcp_monitoring_script=args.gcp_monitoring_script,
                 ignore_womtool=args.ignore_womtool,
                 no_deepcopy=args.no_deepcopy,
+                no_loc_manifest=args.no_localization_manifest,
+                deepcopy_num_threads=args.deepcopy_num_threads,
                 fileobj_stdout=f,
                 fileobj_troubleshoot=sys.stdout,
                 java_heap_run=args.java_heap_run,
@@ -379,7 +393,70 @@ def subcmd_run(caper_runner, args):
             logger.error(USER_INTERRUPT_WARNING, exc_info=True)
 
 
+def read_batch_inputs(batch_inputs):
+    """Reads a text file with a list of input JSON files.
+    Each line has an input JSON file and an optional string label
+    (tab-delimited).
+
+    Returns:
+        Tuple of (list of input JSON files, list of string labels).
+    """
+    inputs_list = []
+    str_labels = []
+    for line in AutoURI(get_abspath(batch_inputs)).read().splitlines():
+        if not line.strip():
+            continue
+        cols = line.strip().split('\t')
+        inputs_list.append(get_abspath(cols[0]))
+        str_labels.append(
+            cols[1] if len(cols) > 1 else AutoURI(cols[0]).basename_wo_ext
+        )
+    return inputs_list, str_labels
+
+
 def subcmd_submit(caper_client, args):
+    if args.batch_inputs:
+        if args.inputs:
+            raise ValueError('-i/--inputs cannot be used with --batch-inputs.')
+        if args.str_label:
+            raise ValueError('-s/--str-label cannot be used with --batch-inputs.')
+        inputs_list, str_labels = read_batch_inputs(args.batch_inputs)
+        result = caper_client.submit_batch(
+            wdl=get_abspath(args.wdl),
+            inputs_list=inputs_list,
+            backend=args.backend,
+            options=get_abspath(args.options),
+            labels=get_abspath(args.labels),
+            imports=get_abspath(args.imports),
+            str_labels=str_labels,
+            docker=args.docker,
+            singularity=args.singularity,
+            singularity_cachedir=args.singularity_cachedir,
+            no_build_singularity=args.no_build_singularity,
+            max_retries=args.max_retries,
+            memory_retry_multiplier=args.memory_retry_multiplier,
+            gcp_monitoring_script=args.gcp_monitoring_script,
+            ignore_womtool=args.ignore_womtool,
+            no_deepcopy=args.no_deepcopy,
+            no_loc_manifest=args.no_localization_manifest,
+            deepcopy_num_threads=args.deepcopy_num_threads,
+            hold=args.hold,
+            java_heap_womtool=args.java_heap_womtool,
+            dry_run=args.dry_run,
+            num_threads=args.batch_num_threads,
+            max_submit_rate=args.batch_max_submit_rate,
+        )
+        num_failed = sum(1 for r in result if r is None)
+        if num_failed and not args.dry_run:
+            logger.error(
+                'Failed to submit {n}/{total} workflows.'.format(
+                    n=num_failed, total=len(result)
+                )
+            )
+        return
+
+    if args.womtool_worker:
+        raise ValueError('--womtool-worker can only be used with --batch-inputs.')
     caper_client.submit(
         wdl=get_abspath(args.wdl),
         backend=args.backend,
@@ -397,6 +474,8 @@ def subcmd_submit(caper_client, args):
         gcp_monitoring_script=args.gcp_monitoring_script,
         ignore_womtool=args.ignore_womtool,
         no_deepcopy=args.no_deepcopy,
+        no_loc_manifest=args.no_localization_manifest,
+        deepcopy_num_threads=args.deepcopy_num_threads,
         hold=args.hold,
         java_heap_womtool=args.java_heap_womtool,
         dry_run=args.dry_run,
@@ -412,7 +491,7 @@ def subcmd_unhold(caper_client, args):
 
 
 def subcmd_list(caper_client, args):
-    workflows = caper_client.list(
+    workflows = caper_client.iter_list(
         args.wf_id_or_label, exclude_subworkflow=not args.show_subworkflow
     )
 
@@ -422,8 +501,6 @@ def subcmd_list(caper_client, args):
         formats = args.format.split(',')
         writer.writerow(formats)
 
-        if workflows is None:
-            return
         for w in workflows:
             row = []
             workflow_id = w.get('id')
@@ -452,6 +529,17 @@ def subcmd_list(caper_client, args):
                     row.append(str(lbl))
                 elif f == 'parent':
                     row.append(str(parent_workflow_id))
+                elif f == 'progress':
+                    task_states = caper_client.task_states(workflow_id)
+                    if task_states is None:
+                        row.append(str(None))
+                    else:
+                        row.append(
+                            ','.join(
+                                '{s}:{n}'.format(s=s, n=n)
+                                for s, n in sorted(task_states['status_count'].items())
+                            )
+                        )
                 else:
                     row.append(str(w.get(f)))
             writer.writerow(row)
@@ -472,7 +560,7 @@ def subcmd_metadata(caper_client, args):
     print(json.dumps(m[0], indent=4))
 
 
-def get_single_cromwell_metadata_obj(caper_client, args, subcmd):
+def get_single_cromwell_metadata_obj(caper_client, args, subcmd, include_keys=None):
     if not args.wf_id_or_label:
         raise ValueError(
             'Define at least one metadata JSON file or '
@@ -489,10 +577,15 @@ def get_single_cromwell_metadata_obj(caper_client, args, subcmd):
     metadata_file = AutoURI(get_abspath(args.wf_id_or_label[0]))
 
     if metadata_file.exists:
+        if AbsPath(metadata_file.uri).is_valid:
+            # stream calls from a local file which can be huge
+            return CromwellMetadata(metadata_file.uri, streaming=True)
         metadata = json.loads(metadata_file.read())
     else:
         metadata_objs = caper_client.metadata(
-            wf_ids_or_labels=args.wf_id_or_label, embed_subworkflow=True
+            wf_ids_or_labels=args.wf_id_or_label,
+            embed_subworkflow=True,
+            include_keys=include_keys,
         )
         if len(metadata_objs) > 1:
             raise ValueError('Found multiple workflows matching with search query.')
@@ -518,7 +611,7 @@ def split_list_into_file_and_non_file(lst):
     return files, non_files
 
 
-def get_multi_cromwell_metadata_objs(caper_client, args):
+def get_multi_cromwell_metadata_objs(caper_client, args, include_keys=None):
     if not args.wf_id_or_label:
         raise ValueError(
             'Define at least one metadata JSON file or '
@@ -535,7 +628,12 @@ def get_multi_cromwell_metadata_objs(caper_client, args):
 
     if non_files:
         all_metadata.extend(
-            caper_client.metadata(wf_ids_or_labels=non_files, embed_subworkflow=True)
+            caper_client.metadata(
+                wf_ids_or_labels=non_files,
+                embed_subworkflow=True,
+                num_threads=args.num_threads,
+                include_keys=include_keys,
+            )
         )
 
     if not all_metadata:
@@ -544,14 +642,43 @@ def get_multi_cromwell_metadata_objs(caper_client, args):
 
 
 def subcmd_troubleshoot(caper_client, args):
-    cm = get_single_cromwell_metadata_obj(caper_client, args, 'troubleshoot/debug')
+    cm = get_single_cromwell_metadata_obj(
+        caper_client,
+        args,
+        'troubleshoot/debug',
+        include_keys=CromwellMetadata.TROUBLESHOOT_KEYS,
+    )
     sys.stdout.write(
         cm.troubleshoot(
-            show_completed_task=args.show_completed_task, show_stdout=args.show_stdout
+            show_completed_task=args.show_completed_task,
+            show_stdout=args.show_stdout,
+            num_threads=args.num_threads,
+            tail_bytes=None if args.full_log else args.tail_bytes,
+            tail_lines=None if args.full_log else args.tail_lines,
         )
     )
 
 
+def get_womtool_validation_cache(args):
+    """Server subcommand does not have Womtool-related arguments.
+    """
+    if getattr(args, 'no_womtool_validation_cache', True):
+        return None
+    return WomtoolValidationCache(
+        cache_dir=args.womtool_validation_cache_dir,
+        max_size=args.womtool_validation_cache_max_size,
+    )
+
+
+def get_monitoring_stats_cache(args):
+    if args.no_monitoring_stats_cache:
+        return None
+    return MonitoringStatsCache(
+        cache_dir=args.monitoring_stats_cache_dir,
+        max_size=args.monitoring_stats_cache_max_size,
+    )
+
+
 def subcmd_gcp_monitor(caper_client, args):
     """Prints out monitoring result either in a TSV format or in a JSON one.
 
@@ -564,12 +691,23 @@ def subcmd_gcp_monitor(caper_client, args):
         See description at CromwellMetadata.gcp_monitor.__doc__.
         Use a JSON format instead to get more detailed information.
     """
-    all_metadata = get_multi_cromwell_metadata_objs(caper_client, args)
+    all_metadata = get_multi_cromwell_metadata_objs(
+        caper_client, args, include_keys=CromwellMetadata.GCP_MONITOR_KEYS
+    )
     writer = csv.writer(sys.stdout, delimiter=PRINT_ROW_DELIMITER)
 
     result = []
+    # share file size cache across all workflows
+    file_size_cache = {}
+    stats_cache = get_monitoring_stats_cache(args)
     for metadata in all_metadata:
-        result.extend(metadata.gcp_monitor())
+        result.extend(
+            metadata.gcp_monitor(
+                num_threads=args.num_threads,
+                file_size_cache=file_size_cache,
+                stats_cache=stats_cache,
+            )
+        )
 
     if args.json_format:
         print(json.dumps(result, indent=4))
@@ -612,10 +750,16 @@ def subcmd_gcp_res_analysis(caper_client, args):
         - x: input file sizes for a task
         - y: resources (max_mem, max_disk) taken for a task
     """
-    all_metadata = get_multi_cromwell_metadata_objs(caper_client, args)
+    all_metadata = get_multi_cromwell_metadata_objs(
+        caper_client, args, include_keys=CromwellMetadata.GCP_MONITOR_KEYS
+    )
 
     res_analysis = LinearResourceAnalysis()
-    res_analysis.collect_resource_data(all_metadata)
+    res_analysis.collect_resource_data(
+        all_metadata,
+        num_threads=args.num_threads,
+        stats_cache=get_monitoring_stats_cache(args),
+    )
 
     result = res_analysis.analyze(
         in_file_vars=read_json(args.in_file_vars_def_json),
@@ -624,6 +768,7 @@ def subcmd_gcp_res_analysis(caper_client, args):
         ).value,
         target_resources=args.target_resources,
         plot_pdf=get_abspath(args.plot_pdf),
+        num_processes=args.num_processes,
     )
     print(json.dumps(result, indent=4))
 
@@ -631,7 +776,9 @@ def subcmd_gcp_res_analysis(caper_client, args):
 def subcmd_cleanup(caper_client, args):
     """Cleanup outputs of a workflow.
     """
-    cm = get_single_cromwell_metadata_obj(caper_client, args, 'cleanup')
+    cm = get_single_cromwell_metadata_obj(
+        caper_client, args, 'cleanup', include_keys=CromwellMetadata.CLEANUP_KEYS
+    )
     cm.cleanup(dry_run=not args.delete, num_threads=args.num_threads, no_lock=True)
     if not args.delete:
         logger.warning(
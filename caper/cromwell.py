@@ -4,12 +4,14 @@ import os
 import shutil
 import socket
 import tempfile
+from threading import Lock
 
 from autouri import AbsPath, AutoURI
 
 from .cromwell_metadata import CromwellMetadata
 from .cromwell_workflow_monitor import CromwellWorkflowMonitor
-from .nb_subproc_thread import NBSubprocThread, is_fileobj_open
+from .nb_subproc_thread import NBSubprocThread, RingBufferOutputCapture, is_fileobj_open
+from .womtool_worker import WomtoolWorker, WomtoolWorkerError
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +45,7 @@ class Cromwell:
     DEFAULT_JAVA_HEAP_CROMWELL_RUN = '4G'
     DEFAULT_JAVA_HEAP_WOMTOOL = '1G'
     DEFAULT_SERVER_PORT = 8000
+    DEFAULT_METADATA_WRITE_TIMEOUT = 60.0
     SERVER_STATUS_STARTED = 'server_started'
     LOCALHOST = 'localhost'
 
@@ -52,6 +55,8 @@ class Cromwell:
         womtool=DEFAULT_WOMTOOL,
         cromwell_install_dir=DEFAULT_CROMWELL_INSTALL_DIR,
         womtool_install_dir=DEFAULT_WOMTOOL_INSTALL_DIR,
+        womtool_validation_cache=None,
+        use_womtool_worker=False,
     ):
         """
         Args:
@@ -63,6 +68,14 @@ class Cromwell:
                 Local directory to install Cromwell JAR.
             womtool_install_dir:
                 Local directory to install Womtool JAR.
+            womtool_validation_cache:
+                WomtoolValidationCache object to skip running Womtool
+                for WDL/inputs/imports already validated.
+            use_womtool_worker:
+                Validate on a long-lived Womtool JVM process (WomtoolWorker)
+                reused across validations instead of starting a new JVM
+                for each validation. Requires Java >= 11.
+                Falls back to the latter if worker fails.
         """
         self._cromwell = cromwell
         self._womtool = womtool
@@ -80,6 +93,10 @@ class Cromwell:
                 'path. {path}'.format(path=womtool_install_dir)
             )
         self._womtool_install_dir = womtool_install_dir
+        self._womtool_validation_cache = womtool_validation_cache
+        self._use_womtool_worker = use_womtool_worker
+        self._womtool_worker = None
+        self._womtool_worker_lock = Lock()
 
     def validate(
         self,
@@ -90,6 +107,8 @@ class Cromwell:
         java_heap_womtool=DEFAULT_JAVA_HEAP_WOMTOOL,
     ):
         """Validate WDL/inputs/imports using Womtool.
+        Only passed validation is cached (if cache is available)
+        since failure can be due to environment (e.g. Java).
 
         Returns:
             valid:
@@ -108,53 +127,79 @@ class Cromwell:
                     'Inputs JSON defined but does not exist. i={i}'.format(i=inputs)
                 )
 
+        if imports:
+            if not AutoURI(imports).exists:
+                raise FileNotFoundError(
+                    'Imports file defined but does not exist. i={i}'.format(i=imports)
+                )
+
+        cache_key = None
+        if self._womtool_validation_cache:
+            cache_key = self._womtool_validation_cache.make_key(
+                self._womtool, wdl, inputs, imports
+            )
+            if self._womtool_validation_cache.get(cache_key):
+                logger.info('Womtool validation passed (cached).')
+                return True
+
         with tempfile.TemporaryDirectory() as tmp_d:
             if imports:
-                if not AutoURI(imports).exists:
-                    raise FileNotFoundError(
-                        'Imports file defined but does not exist. i={i}'.format(
-                            i=imports
-                        )
-                    )
                 wdl_ = os.path.join(tmp_d, wdl_file.basename)
                 wdl_file.cp(wdl_)
                 shutil.unpack_archive(imports, tmp_d)
             else:
                 wdl_ = wdl_file.localize_on(tmp_d)
 
-            cmd = [
-                'java',
-                '-Xmx{heap}'.format(heap=java_heap_womtool),
-                '-jar',
-                '-DLOG_LEVEL={lvl}'.format(lvl='INFO'),
-                self._womtool,
-                'validate',
-                wdl_,
-            ]
+            womtool_args = ['validate', wdl_]
             if inputs:
-                cmd += ['-i', AutoURI(inputs).localize_on(tmp_d)]
+                womtool_args += ['-i', AutoURI(inputs).localize_on(tmp_d)]
 
             logger.info('Validating WDL/inputs/imports with Womtool...')
 
-            stderr = ''
-
-            def on_stderr(s):
-                nonlocal stderr
-                stderr += s
-
-            th = NBSubprocThread(cmd, cwd=tmp_d, on_stderr=on_stderr, quiet=True)
-            th.start()
-            th.join()
-
-            if th.returncode:
+            if self._use_womtool_worker:
+                try:
+                    returncode, stderr = self._get_womtool_worker(
+                        java_heap_womtool
+                    ).run(womtool_args)
+                except WomtoolWorkerError:
+                    logger.warning(
+                        'Womtool worker failed. Running Womtool for each validation.',
+                        exc_info=True,
+                    )
+                    self.stop_womtool_worker()
+                    self._use_womtool_worker = False
+
+            if not self._use_womtool_worker:
+                cmd = [
+                    'java',
+                    '-Xmx{heap}'.format(heap=java_heap_womtool),
+                    '-jar',
+                    '-DLOG_LEVEL={lvl}'.format(lvl='INFO'),
+                    self._womtool,
+                ] + womtool_args
+
+                stderr = ''
+
+                def on_stderr(s):
+                    nonlocal stderr
+                    stderr += s
+
+                th = NBSubprocThread(cmd, cwd=tmp_d, on_stderr=on_stderr, quiet=True)
+                th.start()
+                th.join()
+                returncode = th.returncode
+
+            if returncode:
                 logger.error(
                     'RC={rc}\nSTDERR={stderr}\nWomtool validation failed.'.format(
-                        rc=th.returncode, stderr=stderr
+                        rc=returncode, stderr=stderr
                     )
                 )
                 return False
             else:
                 logger.info('Womtool validation passed.')
+                if cache_key and returncode == 0:
+                    self._womtool_validation_cache.put(cache_key, {'valid': True})
                 return True
 
     def run(
@@ -174,6 +219,8 @@ class Cromwell:
         work_dir=None,
         cwd=None,
         on_status_change=None,
+        on_task_status_change=None,
+        task_state_table=None,
         dry_run=False,
     ):
         """Run Cromwell run mode (java -jar cromwell.jar run).
@@ -229,6 +276,14 @@ class Cromwell:
                         New status for a task, None if no change.
                     metadata:
                         metadata (dict) of a workflow.
+            on_task_status_change:
+                Callback function called on any task status change
+                caught from Cromwell's STDOUT.
+                This should take one parameter (TaskState object).
+            task_state_table:
+                TaskStateTable object to keep task states caught from
+                Cromwell's STDOUT. Task states can be queried on this object
+                without communicating with Cromwell.
             dry_run:
                 Dry run.
         Returns:
@@ -276,7 +331,12 @@ class Cromwell:
         if dry_run:
             return
 
-        wm = CromwellWorkflowMonitor(on_status_change=on_status_change, is_server=False)
+        wm = CromwellWorkflowMonitor(
+            on_status_change=on_status_change,
+            on_task_status_change=on_task_status_change,
+            task_state_table=task_state_table,
+            is_server=False,
+        )
 
         def on_stdout(stdout):
             nonlocal wm
@@ -312,6 +372,8 @@ class Cromwell:
             on_stdout=on_stdout,
             on_finish=on_finish,
             subprocess_name='Cromwell',
+            stdout_capture=RingBufferOutputCapture(),
+            stderr_capture=RingBufferOutputCapture(),
         )
         th.start()
 
@@ -329,6 +391,9 @@ class Cromwell:
         auto_write_metadata=True,
         on_server_start=None,
         on_status_change=None,
+        on_task_status_change=None,
+        task_state_table=None,
+        task_state_server=None,
         cwd=None,
         dry_run=False,
     ):
@@ -383,6 +448,18 @@ class Cromwell:
                         New status for a task, None if no change.
                     metadata:
                         metadata (dict) of a workflow.
+            on_task_status_change:
+                Callback function called on any task status change
+                caught from Cromwell's STDOUT.
+                This should take one parameter (TaskState object).
+            task_state_table:
+                TaskStateTable object to keep task states caught from
+                Cromwell's STDOUT. Task states can be queried on this object
+                without communicating with Cromwell.
+            task_state_server:
+                TaskStateServer object to serve task states to clients.
+                It is started when Cromwell server is ready and
+                stopped when Cromwell server is done.
             cwd:
                 This will be finally passed to subprocess.Popen(cwd=).
             dry_run:
@@ -432,6 +509,8 @@ class Cromwell:
             auto_write_metadata=auto_write_metadata,
             on_server_start=on_server_start,
             on_status_change=on_status_change,
+            on_task_status_change=on_task_status_change,
+            task_state_table=task_state_table,
         )
 
         def on_stdout(stdout):
@@ -442,6 +521,7 @@ class Cromwell:
             nonlocal fileobj_stdout
             nonlocal wm
             nonlocal server_heartbeat
+            nonlocal task_state_server
 
             if is_fileobj_open(fileobj_stdout):
                 fileobj_stdout.write(stdout)
@@ -451,13 +531,21 @@ class Cromwell:
             if wm.is_server_started():
                 if server_heartbeat and not server_heartbeat.is_alive():
                     server_heartbeat.start(port=server_port, hostname=server_hostname)
+                if task_state_server and not task_state_server.is_alive():
+                    task_state_server.start(task_state_table=wm.task_state_table)
                 return 'server_started'
 
         def on_finish():
             nonlocal server_heartbeat
+            nonlocal task_state_server
+            nonlocal wm
 
             if server_heartbeat:
                 server_heartbeat.stop()
+            if task_state_server:
+                task_state_server.stop()
+            # flush metadata of workflows that were terminated right before
+            wm.stop(wait=True, timeout=Cromwell.DEFAULT_METADATA_WRITE_TIMEOUT)
 
         th = NBSubprocThread(
             cmd,
@@ -465,6 +553,8 @@ class Cromwell:
             on_stdout=on_stdout,
             on_finish=on_finish,
             subprocess_name='Cromwell',
+            stdout_capture=RingBufferOutputCapture(),
+            stderr_capture=RingBufferOutputCapture(),
         )
         th.start()
 
@@ -476,6 +566,31 @@ class Cromwell:
         )
         return self._cromwell
 
+    @property
+    def use_womtool_worker(self):
+        """False if disabled or worker failed.
+        """
+        return self._use_womtool_worker
+
+    def stop_womtool_worker(self):
+        """Stops Womtool worker if running.
+        It is started again on next validation if use_womtool_worker.
+        """
+        with self._womtool_worker_lock:
+            if self._womtool_worker:
+                self._womtool_worker.stop()
+                self._womtool_worker = None
+
+    def _get_womtool_worker(self, java_heap_womtool):
+        """Heap size of the first validation is used for the worker.
+        """
+        with self._womtool_worker_lock:
+            if self._womtool_worker is None:
+                self._womtool_worker = WomtoolWorker(
+                    self._womtool, java_heap=java_heap_womtool
+                )
+            return self._womtool_worker
+
     def install_womtool(self):
         self._womtool = install_file(
             self._womtool, self._womtool_install_dir, 'Womtool JAR'
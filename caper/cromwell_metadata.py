@@ -1,22 +1,28 @@
-import io
+import itertools
 import json
 import logging
 import os
 import re
-from collections import defaultdict
+import threading
+import warnings
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 
 import humanfriendly
-import numpy as np
-import pandas as pd
-from autouri import GCSURI, AbsPath, AutoURI, URIBase
+from autouri import GCSURI, S3URI, AbsPath, AutoURI, URIBase
 
+from . import caper_defaults
 from .dict_tool import recurse_dict_value
+from .json_stream import JSONStreamReader
 
 logger = logging.getLogger(__name__)
 
 
 def get_workflow_root_from_call(call):
-    call_root = call.get('callRoot')
+    return get_workflow_root_from_call_root(call.get('callRoot'))
+
+
+def get_workflow_root_from_call_root(call_root):
     if call_root:
         return '/'.join(call_root.split('/')[:-1])
 
@@ -42,25 +48,397 @@ def parse_cromwell_memory(s):
         return humanfriendly.parse_size(s)
 
 
+def read_tail(uri, num_bytes=None, num_lines=None, thread_id=-1):
+    """Reads the tail of a file with a byte-range read.
+    Only the last `num_bytes` bytes are transferred for a local file (seek),
+    GCS and S3 objects. Other URIs are fully read and then cut.
+
+    Args:
+        uri:
+            URI of a file.
+        num_bytes:
+            Read the last num_bytes bytes only. Read all if None.
+            If truncated, the first partial line is dropped.
+        num_lines:
+            Keep the last num_lines lines only (counted within num_bytes).
+        thread_id:
+            autouri's thread_id. Each thread should have its own
+            since GCS client is not thread-safe.
+    Returns:
+        Tuple of (contents as a string, whether contents are truncated).
+    """
+    if num_bytes is None:
+        b = AutoURI(uri, thread_id=thread_id).read(byte=True)
+    elif AbsPath(uri).is_valid:
+        with open(uri, 'rb') as fp:
+            size = fp.seek(0, os.SEEK_END)
+            fp.seek(max(size - num_bytes, 0))
+            b = fp.read()
+    elif GCSURI(uri).is_valid:
+        blob, _ = GCSURI(uri, thread_id=thread_id).get_blob()
+        size = blob.size
+        b = blob.download_as_bytes(start=max(size - num_bytes, 0))
+    elif S3URI(uri).is_valid:
+        s3_uri = S3URI(uri, thread_id=thread_id)
+        size = s3_uri.size
+        if size <= num_bytes:
+            b = s3_uri.read(byte=True)
+        else:
+            bucket, path = s3_uri.get_bucket_path()
+            obj = S3URI.get_boto3_client(thread_id).get_object(
+                Bucket=bucket, Key=path, Range='bytes=-{n}'.format(n=num_bytes)
+            )
+            b = obj['Body'].read()
+    else:
+        b = AutoURI(uri, thread_id=thread_id).read(byte=True)
+        size = len(b)
+        b = b[-num_bytes:]
+
+    truncated = num_bytes is not None and size > num_bytes
+    if truncated:
+        # drop the first partial line (possibly with a broken multi-byte char)
+        first_newline = b.find(b'\n')
+        if first_newline >= 0:
+            b = b[first_newline + 1 :]
+    s = b.decode(errors='replace')
+
+    if num_lines is not None:
+        lines = s.splitlines(keepends=True)
+        if len(lines) > num_lines:
+            s = ''.join(lines[-num_lines:]) if num_lines else ''
+            truncated = True
+    return s, truncated
+
+
+def map_in_order(fn, iterable, num_threads, max_pending_per_thread=4):
+    """Similar to ThreadPoolExecutor.map() but it does not submit all items
+    at once. At most num_threads * max_pending_per_thread items are
+    submitted (in flight) at a time so that items (and their results)
+    are not materialized all together for a large iterable.
+
+    Yields:
+        Result of fn for each item in the same order as in iterable.
+    """
+    max_pending = max(num_threads, 1) * max_pending_per_thread
+    with ThreadPoolExecutor(max_workers=max(num_threads, 1)) as executor:
+        futures = deque()
+        for item in iterable:
+            futures.append(executor.submit(fn, item))
+            if len(futures) >= max_pending:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+
+def reduce_monitoring_log(contents, excluded_cols=(0,), stat_methods=('mean',)):
+    """Calculates stats for each column of a TSV monitoring log.
+    All columns are parsed into a single NumPy array and each stat is calculated
+    over all columns at once. NaN values are skipped as in pandas.
+
+    Args:
+        contents:
+            Contents of a monitoring log. TSV with a header.
+        excluded_cols:
+            0-based indices of columns to be excluded.
+        stat_methods:
+            Stat methods. See CromwellMetadata.gcp_monitor.__doc__ for details.
+            Methods other than mean/std/var/max/min/sum/median/count/last are
+            calculated with pandas.Series.
+    Returns:
+        Dict of {stat_method: {column name: value}}.
+        Value is a Python type. None for all columns if there is no data.
+    """
+    import numpy as np
+
+    lines = contents.splitlines()
+    header = lines[0].split('\t') if lines else []
+    cols = [i for i in range(len(header)) if i not in excluded_cols]
+    col_names = [header[i] for i in cols]
+    result = {stat_method: {} for stat_method in stat_methods}
+    if not cols:
+        return result
+
+    with np.errstate(all='ignore'), warnings.catch_warnings():
+        # e.g. empty data, std for a single row, all NaN column
+        warnings.simplefilter('ignore', UserWarning)
+        warnings.simplefilter('ignore', RuntimeWarning)
+
+        rows = lines[1:]
+        try:
+            text = np.loadtxt(rows, delimiter='\t', usecols=cols, ndmin=2, dtype=str)
+        except ValueError:
+            # ragged rows (e.g. truncated last line of a running/preempted task).
+            # pad short rows with empty cells (NaN) as in pandas
+            num_cols = len(header)
+            rows = [
+                '\t'.join((row.split('\t') + [''] * num_cols)[:num_cols])
+                for row in rows
+            ]
+            text = np.loadtxt(rows, delimiter='\t', usecols=cols, ndmin=2, dtype=str)
+        text = np.char.strip(text)
+        try:
+            data = text.astype(float)
+        except ValueError:
+            # non-numeric values (including empty cells) will be NaN
+            data = np.genfromtxt(rows, delimiter='\t', usecols=cols, ndmin=2)
+        # one contiguous row per column for faster reduction
+        data = np.ascontiguousarray(data.T)
+
+        nan_mask = np.isnan(data)
+        has_nan = bool(nan_mask.any())
+        # int type for columns of integer texts only as in pandas
+        # e.g. 90.0 is float
+        is_int_col = np.char.isdigit(np.char.lstrip(text, '+-')).all(axis=0)
+        # skip NaN as in pandas. use faster non-NaN functions if possible.
+        funcs = {
+            'mean': np.nanmean if has_nan else np.mean,
+            'std': np.nanstd if has_nan else np.std,
+            'var': np.nanvar if has_nan else np.var,
+            'max': np.nanmax if has_nan else np.max,
+            'min': np.nanmin if has_nan else np.min,
+            'sum': np.nansum if has_nan else np.sum,
+            'median': np.nanmedian if has_nan else np.median,
+        }
+
+        for stat_method in stat_methods:
+            if stat_method in ('max', 'min', 'sum', 'last'):
+                is_int = is_int_col
+            else:
+                is_int = np.zeros(len(cols), dtype=bool)
+
+            if not data.shape[1]:
+                vals = [None] * len(cols)
+            elif stat_method == 'last':
+                vals = data[:, -1]
+            elif stat_method in ('std', 'var'):
+                vals = funcs[stat_method](data, axis=1, ddof=1)
+            elif stat_method in funcs:
+                vals = funcs[stat_method](data, axis=1)
+            elif stat_method == 'count':
+                vals = (~nan_mask).sum(axis=1)
+                is_int = np.ones(len(cols), dtype=bool)
+            else:
+                import pandas as pd
+
+                vals = [getattr(pd.Series(vec), stat_method)() for vec in data]
+
+            for j, col_name in enumerate(col_names):
+                val = vals[j]
+                if val is not None:
+                    val = val.item() if isinstance(val, np.generic) else val
+                    if is_int[j]:
+                        val = int(val)
+                result[stat_method][col_name] = val
+
+    return result
+
+
 def convert_type_np_to_py(o):
     """Convert numpy type to Python type.
     """
+    import numpy as np
+
     if isinstance(o, np.generic):
         return o.item()
     raise TypeError
 
 
+class CallIndex:
+    """Flat columnar table of all calls (tasks) in a workflow
+    including calls in (embedded) subworkflows.
+    Each column is a list and i-th row of all columns is for the i-th call.
+
+    Columns:
+        call_name:
+            Call's name. i.e. key in the original metadata JSON's `calls` dict.
+        parent_call_names:
+            Tuple of Parent call's names.
+        shard_idx, attempt, status, call_root, stdout, stderr, monitoring_log:
+            `shardIndex`, `attempt`, `executionStatus`, `callRoot`,
+            `stdout`, `stderr` and `monitoringLog` of a call.
+        call:
+            Call object itself (not copied).
+            None if keep_calls is False.
+    """
+
+    COLUMNS = (
+        'call_name',
+        'parent_call_names',
+        'shard_idx',
+        'attempt',
+        'status',
+        'call_root',
+        'stdout',
+        'stderr',
+        'monitoring_log',
+        'call',
+    )
+
+    def __init__(self, keep_calls=True):
+        """
+        Args:
+            keep_calls:
+                Keep call objects in column `call`.
+                Set it False to keep a small table only.
+        """
+        self._keep_calls = keep_calls
+        self._columns = {col: [] for col in CallIndex.COLUMNS}
+
+    def __len__(self):
+        return len(self._columns['call_name'])
+
+    def append(self, call_name, call, parent_call_names=tuple()):
+        cols = self._columns
+        cols['call_name'].append(call_name)
+        cols['parent_call_names'].append(parent_call_names)
+        cols['shard_idx'].append(call.get('shardIndex'))
+        cols['attempt'].append(call.get('attempt'))
+        cols['status'].append(call.get('executionStatus'))
+        cols['call_root'].append(call.get('callRoot'))
+        cols['stdout'].append(call.get('stdout'))
+        cols['stderr'].append(call.get('stderr'))
+        cols['monitoring_log'].append(call.get('monitoringLog'))
+        cols['call'].append(call if self._keep_calls else None)
+
+    def column(self, name):
+        return self._columns[name]
+
+    @staticmethod
+    def match(
+        call_name,
+        status,
+        shard_idx,
+        filter_call_name=None,
+        filter_status=None,
+        filter_shard_idx=None,
+        exclude_status=None,
+    ):
+        """Checks if a call matches with all filters.
+        Filter can be a single value or a tuple/list/set of values.
+        None means no filter.
+        """
+
+        def is_in(value, values):
+            if isinstance(values, (tuple, list, set, frozenset)):
+                return value in values
+            return value == values
+
+        return (
+            (filter_call_name is None or is_in(call_name, filter_call_name))
+            and (filter_status is None or is_in(status, filter_status))
+            and (filter_shard_idx is None or is_in(shard_idx, filter_shard_idx))
+            and (exclude_status is None or not is_in(status, exclude_status))
+        )
+
+    def find(self, call_name=None, status=None, shard_idx=None, exclude_status=None):
+        """Finds calls matching with all filters.
+        See CallIndex.match for details about filters.
+
+        Returns:
+            List of row indices.
+        """
+        cols = self._columns
+        return [
+            i
+            for i, row in enumerate(
+                zip(cols['call_name'], cols['status'], cols['shard_idx'])
+            )
+            if CallIndex.match(*row, call_name, status, shard_idx, exclude_status)
+        ]
+
+    def rows(self, indices=None):
+        """Generator for tuples of (call_name, call, parent_call_names).
+
+        Args:
+            indices:
+                Row indices. e.g. return value of find().
+                All rows if None.
+        """
+        cols = self._columns
+        if indices is None:
+            indices = range(len(self))
+        for i in indices:
+            yield cols['call_name'][i], cols['call'][i], cols['parent_call_names'][i]
+
+
 class CromwellMetadata:
+    """
+    Class constants:
+        *_KEYS:
+            Minimal set of metadata keys required for each method.
+            Use them for Cromwell's `includeKey` to retrieve a small
+            metadata JSON from a Cromwell server. e.g.
+            CromwellRestAPI.get_metadata(include_keys=TROUBLESHOOT_KEYS)
+    """
+
     DEFAULT_METADATA_BASENAME = 'metadata.json'
     DEFAULT_GCP_MONITOR_STAT_METHODS = ('mean', 'std', 'max', 'min', 'last')
-
-    def __init__(self, metadata):
+    DEFAULT_TROUBLESHOOT_TAIL_BYTES = caper_defaults.DEFAULT_TROUBLESHOOT_TAIL_BYTES
+
+    WORKFLOW_KEYS = (
+        'id',
+        'status',
+        'workflowRoot',
+        'subWorkflowId',
+        'subWorkflowMetadata',
+    )
+    TROUBLESHOOT_KEYS = WORKFLOW_KEYS + (
+        'failures',
+        'executionStatus',
+        'shardIndex',
+        'returnCode',
+        'jobId',
+        'stdout',
+        'stderr',
+        'executionEvents',
+    )
+    GCP_MONITOR_KEYS = WORKFLOW_KEYS + (
+        'executionStatus',
+        'shardIndex',
+        'attempt',
+        'monitoringLog',
+        'runtimeAttributes',
+        'inputs',
+    )
+    CLEANUP_KEYS = WORKFLOW_KEYS + ('callRoot',)
+
+    def __init__(self, metadata, streaming=False):
         """Parses metadata JSON (dict) object or file.
+
+        Args:
+            metadata:
+                Metadata JSON (dict) object, CromwellMetadata object or file.
+            streaming:
+                For a local metadata JSON file only.
+                Keeps everything except `calls` in memory and streams calls
+                from the file one at a time on each recurse_calls().
+                Use this for a huge metadata JSON with embedded subworkflows.
+                Property `calls` is None in this mode.
         """
+        self._metadata_file = None
+        self._call_index = None
         if isinstance(metadata, dict):
             self._metadata = metadata
         elif isinstance(metadata, CromwellMetadata):
             self._metadata = metadata._metadata
+            self._metadata_file = metadata._metadata_file
+            self._call_index = metadata._call_index
+        elif streaming:
+            metadata = AbsPath.get_abspath_if_exists(metadata)
+            if not AbsPath(metadata).is_valid:
+                raise ValueError(
+                    'Streaming mode is available for a local metadata JSON file only. '
+                    '{f}'.format(f=metadata)
+                )
+            self._metadata_file = metadata
+            self._metadata = {}
+            with open(metadata) as fp:
+                reader = JSONStreamReader(fp)
+                for key in reader.iter_object():
+                    if key == 'calls':
+                        reader.skip_value()
+                    else:
+                        self._metadata[key] = reader.read_value()
         else:
             s = AutoURI(metadata).read()
             self._metadata = json.loads(s)
@@ -87,7 +465,8 @@ class CromwellMetadata:
             return self._metadata['workflowRoot']
         else:
             workflow_roots = [
-                get_workflow_root_from_call(call) for _, call, _ in self.recursed_calls
+                get_workflow_root_from_call_root(call_root)
+                for call_root in self.call_index.column('call_root')
             ]
             common_root = os.path.commonprefix(workflow_roots)
             if common_root:
@@ -107,6 +486,24 @@ class CromwellMetadata:
     def calls(self):
         return self._metadata.get('calls')
 
+    @property
+    def call_index(self):
+        """CallIndex object (flat table of all calls).
+        It is built on first access and cached.
+        In streaming mode, it does not keep call objects (column `call`).
+        """
+        if self._call_index is None:
+            if self._metadata_file:
+                call_index = CallIndex(keep_calls=False)
+                calls = self._stream_all_calls()
+            else:
+                call_index = CallIndex()
+                calls = CromwellMetadata._walk_calls(self.calls)
+            for call_name, call, parent_call_names in calls:
+                call_index.append(call_name, call, parent_call_names)
+            self._call_index = call_index
+        return self._call_index
+
     @property
     def recursed_calls(self):
         """Returns a generator for tuples.
@@ -144,19 +541,88 @@ class CromwellMetadata:
         Returns:
             Generator object for all calls.
         """
-        if not self.calls:
-            return
+        for call_name, call, call_parent_call_names in self._iter_calls():
+            yield fn_call(call_name, call, parent_call_names + call_parent_call_names)
 
-        for call_name, call_list in self.calls.items():
+    def _iter_calls(
+        self, call_name=None, status=None, shard_idx=None, exclude_status=None
+    ):
+        """Generator for tuples of (call_name, call, parent_call_names)
+        for calls matching with filters. See CallIndex.match for filters.
+        Uses call index if not in streaming mode.
+        """
+        if self._metadata_file:
+            for row in self._stream_all_calls():
+                call = row[1]
+                if CallIndex.match(
+                    row[0],
+                    call.get('executionStatus'),
+                    call.get('shardIndex'),
+                    call_name,
+                    status,
+                    shard_idx,
+                    exclude_status,
+                ):
+                    yield row
+        else:
+            call_index = self.call_index
+            yield from call_index.rows(
+                call_index.find(call_name, status, shard_idx, exclude_status)
+            )
+
+    @staticmethod
+    def _walk_calls(calls, parent_call_names=tuple()):
+        """Generator for tuples of (call_name, call, parent_call_names)
+        walking through `calls` of metadata and embedded subworkflows.
+        """
+        if not calls:
+            return
+        for call_name, call_list in calls.items():
             for call in call_list:
                 if 'subWorkflowMetadata' in call:
-                    subworkflow = call['subWorkflowMetadata']
-                    subworkflow_metadata = CromwellMetadata(subworkflow)
-                    yield from subworkflow_metadata.recurse_calls(
-                        fn_call, parent_call_names=parent_call_names + (call_name,)
+                    yield from CromwellMetadata._walk_calls(
+                        call['subWorkflowMetadata'].get('calls'),
+                        parent_call_names + (call_name,),
                     )
                 else:
-                    yield fn_call(call_name, call, parent_call_names)
+                    yield call_name, call, parent_call_names
+
+    def _stream_all_calls(self):
+        """Streams tuples of (call_name, call, parent_call_names)
+        from metadata JSON file.
+        """
+        with open(self._metadata_file) as fp:
+            reader = JSONStreamReader(fp)
+            for key in reader.iter_object():
+                if key == 'calls':
+                    yield from CromwellMetadata._stream_calls(reader)
+                else:
+                    reader.skip_value()
+
+    @staticmethod
+    def _stream_calls(reader, parent_call_names=tuple()):
+        """Streaming version of _walk_calls().
+        JSONStreamReader `reader` should be at the beginning of `calls` object.
+        Only one call object is decoded and kept in memory at a time.
+        """
+        for call_name in reader.iter_object():
+            for _ in reader.iter_array():
+                call = {}
+                is_subworkflow = False
+                for key in reader.iter_object():
+                    if key != 'subWorkflowMetadata':
+                        call[key] = reader.read_value()
+                        continue
+                    is_subworkflow = True
+                    for subworkflow_key in reader.iter_object():
+                        if subworkflow_key == 'calls':
+                            yield from CromwellMetadata._stream_calls(
+                                reader, parent_call_names + (call_name,)
+                            )
+                        else:
+                            reader.skip_value()
+                if not is_subworkflow:
+                    yield call_name, call, parent_call_names
 
     def write_on_workflow_root(self, basename=DEFAULT_METADATA_BASENAME):
         """Update metadata JSON file on metadata's output root directory.
@@ -166,12 +632,26 @@ class CromwellMetadata:
         if root:
             metadata_file = os.path.join(root, basename)
 
-            AutoURI(metadata_file).write(json.dumps(self._metadata, indent=4) + '\n')
+            if self._metadata_file:
+                # streaming mode doesn't have calls in memory
+                if os.path.abspath(self._metadata_file) != metadata_file:
+                    AutoURI(self._metadata_file).cp(metadata_file)
+            else:
+                AutoURI(metadata_file).write(
+                    json.dumps(self._metadata, indent=4) + '\n'
+                )
             logger.info('Wrote metadata file. {f}'.format(f=metadata_file))
 
             return metadata_file
 
-    def troubleshoot(self, show_completed_task=False, show_stdout=False):
+    def troubleshoot(
+        self,
+        show_completed_task=False,
+        show_stdout=False,
+        num_threads=URIBase.DEFAULT_NUM_THREADS,
+        tail_bytes=DEFAULT_TROUBLESHOOT_TAIL_BYTES,
+        tail_lines=None,
+    ):
         """Troubleshoots a workflow.
         Also, finds failure reasons and prints out STDERR and STDOUT.
 
@@ -180,28 +660,48 @@ class CromwellMetadata:
                 Show STDERR/STDOUT of completed tasks.
             show_stdout:
                 Show failed task's STDOUT along with STDERR.
+            num_threads:
+                Number of threads for reading STDERR/STDOUT of tasks in parallel.
+                Order of tasks in the report is kept.
+            tail_bytes:
+                Show the last tail_bytes bytes of STDERR/STDOUT only.
+                Only the tail is transferred for local, GCS and S3 files.
+                None to show everything.
+            tail_lines:
+                Show the last tail_lines lines of STDERR/STDOUT only.
+                Lines are counted within the last tail_bytes bytes.
         Return:
             result:
                 Troubleshooting report as a plain string.
         """
-        result = '* Started troubleshooting workflow: id={id}, status={status}\n'.format(
-            id=self.workflow_id, status=self.workflow_status
-        )
+        result = [
+            '* Started troubleshooting workflow: id={id}, status={status}\n'.format(
+                id=self.workflow_id, status=self.workflow_status
+            )
+        ]
 
         if self.workflow_status == 'Succeeded':
-            result += '* Workflow ran Successfully.\n'
+            result.append('* Workflow ran Successfully.\n')
 
         else:
             if self.failures:
-                result += '* Found failures JSON object.\n{s}\n'.format(
-                    s=json.dumps(self.failures, indent=4)
+                result.append(
+                    '* Found failures JSON object.\n{s}\n'.format(
+                        s=json.dumps(self.failures, indent=4)
+                    )
                 )
 
-            def troubleshoot_call(call_name, call, parent_call_names):
+            # GCS client is not thread-safe. autouri keeps a client per thread_id.
+            thread_local = threading.local()
+            thread_id_counter = itertools.count()
+
+            def troubleshoot_call(row):
                 """Returns troubleshooting help message.
                 """
-                nonlocal show_completed_task
                 nonlocal show_stdout
+                nonlocal tail_bytes
+                nonlocal tail_lines
+                call_name, call, parent_call_names = row
                 status = call.get('executionStatus')
                 shard_index = call.get('shardIndex')
                 rc = call.get('returnCode')
@@ -216,49 +716,58 @@ class CromwellMetadata:
                         run_end = event['endTime']
                         break
 
-                help_msg = ''
-                if show_completed_task or status not in ('Done', 'Succeeded'):
-                    help_msg += (
-                        '\n==== NAME={name}, STATUS={status}, PARENT={p}\n'
-                        'SHARD_IDX={shard_idx}, RC={rc}, JOB_ID={job_id}\n'
-                        'START={start}, END={end}\n'
-                        'STDOUT={stdout}\nSTDERR={stderr}\n'.format(
-                            name=call_name,
-                            status=status,
-                            p=','.join(parent_call_names),
-                            start=run_start,
-                            end=run_end,
-                            shard_idx=shard_index,
-                            rc=rc,
-                            job_id=job_id,
-                            stdout=stdout,
-                            stderr=stderr,
-                        )
+                help_msg = [
+                    '\n==== NAME={name}, STATUS={status}, PARENT={p}\n'
+                    'SHARD_IDX={shard_idx}, RC={rc}, JOB_ID={job_id}\n'
+                    'START={start}, END={end}\n'
+                    'STDOUT={stdout}\nSTDERR={stderr}\n'.format(
+                        name=call_name,
+                        status=status,
+                        p=','.join(parent_call_names),
+                        start=run_start,
+                        end=run_end,
+                        shard_idx=shard_index,
+                        rc=rc,
+                        job_id=job_id,
+                        stdout=stdout,
+                        stderr=stderr,
                     )
-                    if stderr:
-                        if AutoURI(stderr).exists:
-                            help_msg += 'STDERR_CONTENTS=\n{s}\n'.format(
-                                s=AutoURI(stderr).read()
-                            )
-                    if show_stdout and stdout:
-                        if AutoURI(stdout).exists:
-                            help_msg += 'STDOUT_CONTENTS=\n{s}\n'.format(
-                                s=AutoURI(stdout).read()
+                ]
+                for name, log in (('STDERR', stderr), ('STDOUT', stdout)):
+                    if not log or (name == 'STDOUT' and not show_stdout):
+                        continue
+                    if not hasattr(thread_local, 'thread_id'):
+                        thread_local.thread_id = next(thread_id_counter)
+                    thread_id = thread_local.thread_id
+                    if AutoURI(log, thread_id=thread_id).exists:
+                        contents, truncated = read_tail(
+                            log, tail_bytes, tail_lines, thread_id=thread_id
+                        )
+                        help_msg.append(
+                            '{name}_CONTENTS={truncated}\n{s}\n'.format(
+                                name=name,
+                                truncated=' (tail only)' if truncated else '',
+                                s=contents,
                             )
+                        )
 
-                return help_msg
+                return ''.join(help_msg)
 
-            result += '* Recursively finding failures in calls (tasks)...\n'
-            for help_msg in self.recurse_calls(troubleshoot_call):
-                result += help_msg
+            result.append('* Recursively finding failures in calls (tasks)...\n')
+            exclude_status = None if show_completed_task else ('Done', 'Succeeded')
+            rows = self._iter_calls(exclude_status=exclude_status)
+            result.extend(map_in_order(troubleshoot_call, rows, num_threads))
 
-        return result
+        return ''.join(result)
 
     def gcp_monitor(
         self,
         task_name=None,
         excluded_cols=(0,),
         stat_methods=DEFAULT_GCP_MONITOR_STAT_METHODS,
+        num_threads=URIBase.DEFAULT_NUM_THREADS,
+        file_size_cache=None,
+        stats_cache=None,
     ):
         """Recursively parse task(call)'s `monitoringLog`
         (`monitoring.log` in task's execution directory)
@@ -285,6 +794,17 @@ class CromwellMetadata:
                 `last` is to get the last element in data, which usually means the latest data.
                 Some methods in pandas.DataFrame will return `nan` if the number of data row is
                 too small (e.g. `std` requires more than one data row).
+            num_threads:
+                Number of threads for reading `monitoringLog` and getting sizes of
+                input files of calls in parallel. Order of calls is kept.
+            file_size_cache:
+                Dict of {file URI: size} to be updated with input file sizes.
+                Share it across multiple metadata (e.g. in one `caper gcp_monitor`)
+                to avoid looking up the same input file again.
+            stats_cache:
+                MonitoringStatsCache object to reuse a result for a `monitoringLog`
+                (stats and input file sizes) from previous runs.
+                Only new/modified monitoring logs are read.
         Returns:
             List of mean/std/max/min/last of columns along with size of input files.
             Note that
@@ -349,33 +869,50 @@ class CromwellMetadata:
                 ...
             ]
         """
-        file_size_cache = {}
+        if file_size_cache is None:
+            file_size_cache = {}
         workflow_id = self.workflow_id
 
-        def gcp_monitor_call(call_name, call, parent_call_names):
+        # GCS client is not thread-safe. autouri keeps a client per thread_id.
+        thread_local = threading.local()
+        thread_id_counter = itertools.count()
+
+        def gcp_monitor_call(row):
             nonlocal excluded_cols
             nonlocal stat_methods
             nonlocal file_size_cache
+            nonlocal stats_cache
             nonlocal workflow_id
-            nonlocal task_name
+            call_name, call, _ = row
 
-            if task_name and task_name != call_name:
-                return
+            if not hasattr(thread_local, 'thread_id'):
+                thread_local.thread_id = next(thread_id_counter)
+            thread_id = thread_local.thread_id
 
             monitoring_log = call.get('monitoringLog')
             if monitoring_log is None:
                 return
-            if not GCSURI(monitoring_log).is_valid:
+            monitoring_log = GCSURI(monitoring_log, thread_id=thread_id)
+            if not monitoring_log.is_valid:
                 # This feature is for GCSURI only.
                 return
-            if not GCSURI(monitoring_log).exists:
+            monitoring_log_metadata = monitoring_log.get_metadata()
+            if not monitoring_log_metadata.exists:
                 # Workaround for Cromwell-52's bug.
                 # Call-cached task has `monitoringLog`, but it does not exist.
                 return
 
-            dataframe = pd.read_csv(
-                io.StringIO(GCSURI(monitoring_log).read()), delimiter='\t'
-            )
+            if stats_cache:
+                cache_key = stats_cache.make_key(
+                    monitoring_log.uri,
+                    monitoring_log_metadata,
+                    list(excluded_cols),
+                    list(stat_methods),
+                )
+                data = stats_cache.get(cache_key)
+                if data is not None:
+                    return data
+
             rt_attrs = call.get('runtimeAttributes')
 
             data = {
@@ -389,21 +926,11 @@ class CromwellMetadata:
                     'disk': parse_cromwell_disks(rt_attrs.get('disks')),
                     'mem': parse_cromwell_memory(rt_attrs.get('memory')),
                 },
-                'stats': {s: {} for s in stat_methods},
+                'stats': reduce_monitoring_log(
+                    monitoring_log.read(), excluded_cols, stat_methods
+                ),
                 'input_file_sizes': defaultdict(list),
             }
-            for i, col_name in enumerate(dataframe.columns):
-                if i in excluded_cols:
-                    continue
-                for stat_method in stat_methods:
-                    if dataframe.empty:
-                        val = None
-                    elif stat_method == 'last':
-                        last_idx = dataframe.tail(1).index.item()
-                        val = dataframe[col_name][last_idx]
-                    else:
-                        val = getattr(dataframe[col_name], stat_method)()
-                    data['stats'][stat_method][col_name] = val
 
             for input_name, input_value in sorted(call['inputs'].items()):
                 file_sizes_dict = data['input_file_sizes']
@@ -416,19 +943,23 @@ class CromwellMetadata:
                     if GCSURI(file).is_valid:
                         file_size = file_size_cache.get(file)
                         if file_size is None:
-                            file_size = GCSURI(file).size
+                            file_size = GCSURI(file, thread_id=thread_id).size
                             file_size_cache[file] = file_size
                         file_sizes_dict[input_name].append(file_size)
 
                 recurse_dict_value(input_value, add_to_input_files_if_valid)
 
-            return data
+            data['input_file_sizes'] = dict(data['input_file_sizes'])
+            if stats_cache:
+                stats_cache.put(cache_key, data)
 
-        result = list(self.recurse_calls(gcp_monitor_call))
+            return data
 
-        # a bit hacky way to recursively convert numpy type into python type
-        json_str = json.dumps(result, default=convert_type_np_to_py)
-        return json.loads(json_str)
+        return list(
+            map_in_order(
+                gcp_monitor_call, self._iter_calls(call_name=task_name), num_threads
+            )
+        )
 
     def cleanup(
         self, dry_run=False, num_threads=URIBase.DEFAULT_NUM_THREADS, no_lock=False
@@ -1,10 +1,12 @@
 import fnmatch
 import io
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from uuid import UUID
 
 import requests
-from requests.exceptions import ConnectionError, HTTPError
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, HTTPError, Timeout
 
 from .cromwell_metadata import CromwellMetadata
 
@@ -84,6 +86,37 @@ def has_wildcard(workflow_id_or_label):
         return '?' in workflow_id_or_label or '*' in workflow_id_or_label
 
 
+def match_workflow(workflow, workflow_ids=None, labels=None):
+    """Check if workflow JSON (from Cromwell's query endpoint)
+    matches with any of workflow IDs or labels.
+    Wildcards (? and *) are allowed for both parameters.
+
+    Args:
+        workflow:
+            Workflow JSON with keys `id` and `labels`.
+        workflow_ids:
+            List of workflow ID strings.
+        labels:
+            List of labels (key/value pairs).
+    """
+    if workflow_ids:
+        for wf_id in workflow_ids:
+            if fnmatch.fnmatchcase(workflow['id'], wf_id):
+                return True
+    if labels and 'labels' in workflow:
+        for k, v in labels:
+            v_ = workflow['labels'].get(k)
+            if not v_:
+                continue
+            if isinstance(v_, str) and isinstance(v, str):
+                # matching with wildcards for str values only
+                if fnmatch.fnmatchcase(v_, v):
+                    return True
+            elif v_ == v:
+                return True
+    return False
+
+
 class CromwellRestAPI:
     QUERY_URL = 'http://{hostname}:{port}'
     ENDPOINT_BACKEND = '/api/workflows/v1/backends'
@@ -95,16 +128,57 @@ class CromwellRestAPI:
     ENDPOINT_RELEASE_HOLD = '/api/workflows/v1/{wf_id}/releaseHold'
     DEFAULT_HOSTNAME = 'localhost'
     DEFAULT_PORT = 8000
+    DEFAULT_POOL_SIZE = 10
+    DEFAULT_TIMEOUT = None
+    DEFAULT_NUM_THREADS = 1
+    DEFAULT_PAGE_SIZE = 1000
 
     def __init__(
-        self, hostname=DEFAULT_HOSTNAME, port=DEFAULT_PORT, user=None, password=None
+        self,
+        hostname=DEFAULT_HOSTNAME,
+        port=DEFAULT_PORT,
+        user=None,
+        password=None,
+        pool_size=DEFAULT_POOL_SIZE,
+        timeout=DEFAULT_TIMEOUT,
     ):
+        """Talks to Cromwell server via REST API.
+
+        All requests share a single keep-alive session (connection pool)
+        so that back-to-back calls (e.g. monitoring, bulk abort/list)
+        reuse TCP connections to the server instead of opening a new one
+        for each call.
+
+        Args:
+            hostname:
+                Cromwell server hostname.
+            port:
+                Cromwell server port.
+            user:
+                Username for HTTP basic auth.
+            password:
+                Password for HTTP basic auth.
+            pool_size:
+                Maximum number of connections to keep alive in the pool.
+                Set this >= number of threads sharing this object.
+            timeout:
+                Timeout for each request in seconds.
+                Float or tuple of (connect timeout, read timeout).
+                None means waiting forever.
+        """
         self._hostname = hostname
         self._port = port
+        self._timeout = timeout
 
         self._user = user
         self._password = password
         self.__init_auth()
+        self.__init_session(pool_size)
+
+    def close(self):
+        """Close all pooled connections.
+        """
+        self._session.close()
 
     def submit(
         self,
@@ -224,7 +298,15 @@ class CromwellRestAPI:
                 return
             return [w['id'] for w in workflows]
 
-    def get_metadata(self, workflow_ids=None, labels=None, embed_subworkflow=False):
+    def get_metadata(
+        self,
+        workflow_ids=None,
+        labels=None,
+        embed_subworkflow=False,
+        num_threads=DEFAULT_NUM_THREADS,
+        include_keys=None,
+        exclude_keys=None,
+    ):
         """Retrieve metadata for workflows matching workflow IDs or labels
 
         Args:
@@ -238,23 +320,68 @@ class CromwellRestAPI:
                 This flag is to mimic behavior of Cromwell run mode with -m.
                 Metadata JSON generated with Cromwell run mode
                 includes all subworkflows embedded in main workflow's JSON file.
+            num_threads:
+                Number of threads to retrieve metadata of multiple workflows
+                in parallel. Order of workflows is kept in the result.
+                Keep this <= pool_size of this object.
+                A workflow that failed with an HTTP error or timeout is
+                skipped (with an error log) without stopping other workflows.
+            include_keys:
+                List of metadata keys to be included in the result.
+                Cromwell server will send metadata with these keys only
+                (Cromwell's `includeKey`). Any key starting with these
+                will be included. e.g. `stdout`, `executionStatus`.
+                This works for call-level (nested) keys too.
+            exclude_keys:
+                List of metadata keys to be excluded from the result
+                (Cromwell's `excludeKey`).
+                Cannot be used together with include_keys.
         """
+        if include_keys and exclude_keys:
+            raise ValueError('include_keys and exclude_keys are mutually exclusive.')
+
         valid_workflow_ids = self.find_valid_workflow_ids(
             workflow_ids=workflow_ids, labels=labels
         )
         if valid_workflow_ids is None:
             return
 
-        result = []
-        for workflow_id in valid_workflow_ids:
-            params = {}
-            if embed_subworkflow:
-                params['expandSubWorkflows'] = True
+        params = {}
+        if embed_subworkflow:
+            params['expandSubWorkflows'] = True
+        if include_keys:
+            params['includeKey'] = list(include_keys)
+        if exclude_keys:
+            params['excludeKey'] = list(exclude_keys)
+
+        def get_metadata_for_workflow(workflow_id):
+            try:
+                return self.__request_get(
+                    CromwellRestAPI.ENDPOINT_METADATA.format(wf_id=workflow_id),
+                    params=params,
+                )
+            except (ConnectionError, HTTPError, Timeout):
+                logger.error(
+                    'Failed to retrieve metadata from Cromwell server. '
+                    'id={wf_id}'.format(wf_id=workflow_id),
+                    exc_info=True,
+                )
 
-            m = self.__request_get(
-                CromwellRestAPI.ENDPOINT_METADATA.format(wf_id=workflow_id),
-                params=params,
-            )
+        if num_threads > 1 and len(valid_workflow_ids) > 1:
+            with ThreadPoolExecutor(
+                max_workers=min(num_threads, len(valid_workflow_ids))
+            ) as executor:
+                all_metadata = list(
+                    executor.map(get_metadata_for_workflow, valid_workflow_ids)
+                )
+        else:
+            all_metadata = [
+                get_metadata_for_workflow(workflow_id)
+                for workflow_id in valid_workflow_ids
+            ]
+
+        result = []
+        for m in all_metadata:
             if m:
                 cm = CromwellMetadata(m)
                 result.append(cm.metadata)
@@ -301,59 +428,107 @@ class CromwellRestAPI:
         return r
 
     def find_with_wildcard(
-        self, workflow_ids=None, labels=None, exclude_subworkflow=True
+        self,
+        workflow_ids=None,
+        labels=None,
+        exclude_subworkflow=True,
+        statuses=None,
+        submission=None,
+        page_size=DEFAULT_PAGE_SIZE,
     ):
-        """Retrieves all workflows from Cromwell server.
+        """Retrieves all workflows from Cromwell server page by page.
         And then find matching workflows by ID or labels.
         Wildcards (? and *) are allowed for both parameters.
+
+        See iter_find_with_wildcard.__doc__ for details.
+
+        Returns:
+            List of matched workflow JSONs.
         """
-        result = []
+        result = list(
+            self.iter_find_with_wildcard(
+                workflow_ids=workflow_ids,
+                labels=labels,
+                exclude_subworkflow=exclude_subworkflow,
+                statuses=statuses,
+                submission=submission,
+                page_size=page_size,
+            )
+        )
+        logger.debug(
+            'find_with_wildcard: workflow_ids={workflow_ids}, '
+            'labels={labels}, result={result}'.format(
+                workflow_ids=workflow_ids, labels=labels, result=result
+            )
+        )
+        return result
+
+    def iter_find_with_wildcard(
+        self,
+        workflow_ids=None,
+        labels=None,
+        exclude_subworkflow=True,
+        statuses=None,
+        submission=None,
+        page_size=DEFAULT_PAGE_SIZE,
+    ):
+        """Generator version of find_with_wildcard.
+        Queries workflows page by page (with Cromwell's `page`/`pageSize`)
+        and yields matching workflows as soon as each page arrives.
+        So that caller doesn't need to wait for all workflows to be downloaded.
 
+        Args:
+            workflow_ids:
+                List of workflow ID strings. Wildcards (? and *) are allowed.
+            labels:
+                List of labels (key/value pairs). Wildcards (? and *) are allowed
+                for values.
+            exclude_subworkflow:
+                Exclude subworkflows.
+            statuses:
+                List of workflow statuses to filter workflows on server side.
+                e.g. ['Running', 'Submitted'].
+            submission:
+                Datetime string (e.g. 2020-06-13T10:07:00.000Z) to filter
+                workflows submitted at or after it on server side.
+            page_size:
+                Number of workflows to retrieve per page.
+        Yields:
+            Matched workflow JSON.
+        """
         if not workflow_ids and not labels:
-            return result
-
-        resp = self.__request_get(
-            CromwellRestAPI.ENDPOINT_WORKFLOWS,
-            params={
-                'additionalQueryResultFields': 'labels',
-                'includeSubworkflows': not exclude_subworkflow,
-            },
-        )
+            return
+
+        params = {
+            'additionalQueryResultFields': 'labels',
+            'includeSubworkflows': not exclude_subworkflow,
+            'pageSize': page_size,
+        }
+        if statuses:
+            params['status'] = statuses
+        if submission:
+            params['submission'] = submission
+
+        # workflow can be shifted to the next page by new submissions while paging
+        found_workflow_ids = set()
+        page = 1
+        while True:
+            resp = self.__request_get(
+                CromwellRestAPI.ENDPOINT_WORKFLOWS, params=dict(params, page=page)
+            )
+            if not resp or not resp['results']:
+                break
 
-        if resp and resp['results']:
             for workflow in resp['results']:
-                matched = False
-                if 'id' not in workflow:
+                if 'id' not in workflow or workflow['id'] in found_workflow_ids:
                     continue
-                if workflow_ids:
-                    for wf_id in workflow_ids:
-                        if fnmatch.fnmatchcase(workflow['id'], wf_id):
-                            result.append(workflow)
-                            matched = True
-                            break
-                if matched:
-                    continue
-                if labels and 'labels' in workflow:
-                    for k, v in labels:
-                        v_ = workflow['labels'].get(k)
-                        if not v_:
-                            continue
-                        if isinstance(v_, str) and isinstance(v, str):
-                            # matching with wildcards for str values only
-                            if fnmatch.fnmatchcase(v_, v):
-                                result.append(workflow)
-                                break
-                        elif v_ == v:
-                            result.append(workflow)
-                            break
-            logger.debug(
-                'find_with_wildcard: workflow_ids={workflow_ids}, '
-                'labels={labels}, result={result}'.format(
-                    workflow_ids=workflow_ids, labels=labels, result=result
-                )
-            )
+                if match_workflow(workflow, workflow_ids=workflow_ids, labels=labels):
+                    found_workflow_ids.add(workflow['id'])
+                    yield workflow
 
-        return result
+            if page * page_size >= resp.get('totalResultsCount', 0):
+                break
+            page += 1
 
     def find_by_workflow_ids(self, workflow_ids=None, exclude_subworkflow=True):
         """Finds workflows by exactly matching workflow IDs (UUIDs).
@@ -447,8 +622,8 @@ class CromwellRestAPI:
         Find workflows by matching workflow IDs or label (key, value) tuples.
         Does OR search for both parameters.
         Wildcards (? and *) in both parameters are allowed but Caper will
-        retrieve a list of all workflows, which can lead to HTTP 503 of
-        Cromwell server if there are many subworkflows and not `exclude_subworkflow`.
+        retrieve a list of all workflows (page by page), which can take long
+        if there are many subworkflows and not `exclude_subworkflow`.
 
         Args:
             workflow_ids:
@@ -461,36 +636,44 @@ class CromwellRestAPI:
         Returns:
             List of matched workflow JSONs.
         """
+        return list(
+            self.iter_find(
+                workflow_ids=workflow_ids,
+                labels=labels,
+                exclude_subworkflow=exclude_subworkflow,
+            )
+        )
+
+    def iter_find(self, workflow_ids=None, labels=None, exclude_subworkflow=True):
+        """Generator version of find.
+        For wildcard search, matched workflows are yielded page by page.
+
+        Yields:
+            Matched workflow JSON.
+        """
         wildcard_found_in_workflow_ids = has_wildcard(workflow_ids)
         wildcard_found_in_labels = has_wildcard(
             [val for key, val in labels] if labels else None
         )
         if wildcard_found_in_workflow_ids or wildcard_found_in_labels:
-            return self.find_with_wildcard(
+            yield from self.iter_find_with_wildcard(
                 workflow_ids=workflow_ids,
                 labels=labels,
                 exclude_subworkflow=exclude_subworkflow,
             )
-
-        result = []
+            return
 
         result_by_labels = self.find_by_labels(
             labels=labels, exclude_subworkflow=exclude_subworkflow
         )
-        result.extend(result_by_labels)
+        yield from result_by_labels
 
         workflow_ids_found_by_labels = [workflow['id'] for workflow in result_by_labels]
-        result.extend(
-            [
-                workflow
-                for workflow in self.find_by_workflow_ids(
-                    workflow_ids=workflow_ids, exclude_subworkflow=exclude_subworkflow
-                )
-                if workflow['id'] not in workflow_ids_found_by_labels
-            ]
-        )
-
-        return result
+        for workflow in self.find_by_workflow_ids(
+            workflow_ids=workflow_ids, exclude_subworkflow=exclude_subworkflow
+        ):
+            if workflow['id'] not in workflow_ids_found_by_labels:
+                yield workflow
 
     def __init_auth(self):
         """Init auth object
@@ -500,6 +683,17 @@ class CromwellRestAPI:
         else:
             self._auth = None
 
+    def __init_session(self, pool_size):
+        """Init a keep-alive session with a connection pool
+        """
+        self._session = requests.Session()
+        self._session.auth = self._auth
+        self._session.headers.update({'accept': 'application/json'})
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
     @requests_error_handler
     def __request_get(self, endpoint, params=None):
         """GET request
@@ -511,9 +705,7 @@ class CromwellRestAPI:
             CromwellRestAPI.QUERY_URL.format(hostname=self._hostname, port=self._port)
             + endpoint
         )
-        resp = requests.get(
-            url, auth=self._auth, params=params, headers={'accept': 'application/json'}
-        )
+        resp = self._session.get(url, params=params, timeout=self._timeout)
         resp.raise_for_status()
         return resp.json()
 
@@ -528,9 +720,7 @@ class CromwellRestAPI:
             CromwellRestAPI.QUERY_URL.format(hostname=self._hostname, port=self._port)
             + endpoint
         )
-        resp = requests.post(
-            url, files=manifest, auth=self._auth, headers={'accept': 'application/json'}
-        )
+        resp = self._session.post(url, files=manifest, timeout=self._timeout)
         resp.raise_for_status()
         return resp.json()
 
@@ -545,11 +735,11 @@ class CromwellRestAPI:
             CromwellRestAPI.QUERY_URL.format(hostname=self._hostname, port=self._port)
             + endpoint
         )
-        resp = requests.patch(
+        resp = self._session.patch(
             url,
             data=data,
-            auth=self._auth,
-            headers={'accept': 'application/json', 'content-type': 'application/json'},
+            headers={'content-type': 'application/json'},
+            timeout=self._timeout,
         )
         resp.raise_for_status()
         return resp.json()
@@ -1,6 +1,8 @@
 import logging
 import re
 import time
+from collections import OrderedDict, defaultdict
+from threading import Condition, Lock, Thread
 
 from .cromwell_metadata import CromwellMetadata
 from .cromwell_rest_api import CromwellRestAPI
@@ -26,9 +28,14 @@ class WorkflowStatusTransition:
                 where a previous status is matched, found will be used.
         """
         self._regex = regex
+        self._compiled_regex = re.compile(regex)
         self._status_transitions = status_transitions
         self._auto_write_metadata = auto_write_metadata
 
+    @property
+    def regex(self):
+        return self._regex
+
     def parse(self, line, workflow_status_map):
         """
         Args:
@@ -47,26 +54,400 @@ class WorkflowStatusTransition:
                 For this status transition metadataJSON file should be written
                 on workflow's root output directory.
         """
-        r = re.findall(self._regex, line)
-        if r:
-            wf_id = r[0].strip()
-            if wf_id in workflow_status_map:
-                prev_status = workflow_status_map[wf_id]
-            else:
-                prev_status = None
-            for st1, st2 in self._status_transitions:
-                if st1 is None or st1 == prev_status:
-                    if st1 != st2:
-                        logger.info(
-                            'Workflow: id={id}, status={status}'.format(
-                                id=wf_id, status=st2
-                            )
+        m = self._compiled_regex.search(line)
+        if m:
+            return self.transit(m.group(1), workflow_status_map)
+        return None, None, False
+
+    def transit(self, workflow_id, workflow_status_map):
+        """Finds a valid status transition for a workflow
+        that has already been caught by self.regex.
+
+        Args:
+            workflow_id:
+                Workflow's string ID caught by self.regex.
+            workflow_status_map:
+                See parse.__doc__.
+        Returns:
+            See parse.__doc__.
+        """
+        wf_id = workflow_id.strip()
+        prev_status = workflow_status_map.get(wf_id)
+        for st1, st2 in self._status_transitions:
+            if st1 is None or st1 == prev_status:
+                if st1 != st2:
+                    logger.info(
+                        'Workflow: id={id}, status={status}'.format(
+                            id=wf_id, status=st2
                         )
-                        return wf_id, st2, self._auto_write_metadata
-                    break
+                    )
+                    return wf_id, st2, self._auto_write_metadata
+                break
         return None, None, False
 
 
+class LogLineClassifier:
+    def __init__(self, patterns, prefilters=None):
+        """Classifies log lines with a single precompiled regex, which is
+        an alternation of all patterns.
+
+        Args:
+            patterns:
+                List of (kind, regex) tuples.
+                `kind` can be any hashable object to identify a pattern.
+                Groups in `regex` should not be named.
+            prefilters:
+                List of substrings. Lines without any of them are skipped
+                without running the regex.
+                All lines matching any pattern should have at least one of these.
+        """
+        self._prefilters = tuple(prefilters) if prefilters else None
+        # group name: (kind, index of first inner group, number of inner groups)
+        self._groups = {}
+
+        alternatives = []
+        group_idx = 1
+        for i, (kind, regex) in enumerate(patterns):
+            name = 'p{i}'.format(i=i)
+            num_inner_groups = re.compile(regex).groups
+            self._groups[name] = (kind, group_idx, num_inner_groups)
+            alternatives.append('(?P<{name}>{regex})'.format(name=name, regex=regex))
+            group_idx += 1 + num_inner_groups
+
+        self._regex = re.compile('|'.join(alternatives))
+
+    def classify(self, line):
+        """Yields (kind, groups) for the first match of each kind in a line.
+        `groups` is a tuple of groups caught by the pattern of `kind`.
+        """
+        if self._prefilters and not any(p in line for p in self._prefilters):
+            return
+        found = set()
+        for m in self._regex.finditer(line):
+            kind, start, num_inner_groups = self._groups[m.lastgroup]
+            if kind in found:
+                continue
+            found.add(kind)
+            yield kind, m.groups()[start : start + num_inner_groups]
+
+
+class TaskState:
+    """Compact status record of a task (call) caught from Cromwell's STDERR.
+    """
+
+    __slots__ = ('workflow_id', 'task_name', 'shard_idx', 'attempt', 'status', 'job_id')
+
+    def __init__(self, workflow_id, task_name, shard_idx, attempt, status, job_id=None):
+        self.workflow_id = workflow_id
+        self.task_name = task_name
+        self.shard_idx = shard_idx
+        self.attempt = attempt
+        self.status = status
+        self.job_id = job_id
+
+    @property
+    def key(self):
+        return self.workflow_id, self.task_name, self.shard_idx, self.attempt
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in TaskState.__slots__}
+
+    def __repr__(self):
+        return 'TaskState({s})'.format(
+            s=', '.join('{k}={v!r}'.format(k=k, v=v) for k, v in self.to_dict().items())
+        )
+
+
+class TaskStateTable:
+    """In-memory table of task states.
+    (workflow_id, task_name, shard_idx, attempt) -> TaskState.
+
+    Tasks are also indexed by workflow ID so that querying/removing
+    tasks of a workflow doesn't need to scan the whole table.
+    This table can be queried from other threads.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        # workflow_id: {(task_name, shard_idx, attempt): TaskState}
+        self._tasks = defaultdict(dict)
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(tasks) for tasks in self._tasks.values())
+
+    def update(self, workflow_id, task_name, shard_idx, attempt, status, job_id=None):
+        """Updates (or adds) a task's status.
+        job_id is kept if it is not given (None).
+
+        Returns:
+            Updated TaskState object.
+        """
+        with self._lock:
+            tasks = self._tasks[workflow_id]
+            key = (task_name, shard_idx, attempt)
+            task = tasks.get(key)
+            if task is None:
+                task = TaskState(
+                    workflow_id, task_name, shard_idx, attempt, status, job_id
+                )
+                tasks[key] = task
+            else:
+                task.status = status
+                if job_id is not None:
+                    task.job_id = job_id
+            return task
+
+    def get(self, workflow_id, task_name, shard_idx=-1, attempt=1):
+        """Returns a TaskState object or None if not found.
+        """
+        with self._lock:
+            tasks = self._tasks.get(workflow_id)
+            if tasks:
+                return tasks.get((task_name, shard_idx, attempt))
+
+    def find(self, workflow_id=None, task_name=None, status=None):
+        """Finds tasks matching all given conditions.
+        None means no condition.
+
+        Returns:
+            List of TaskState objects.
+        """
+        with self._lock:
+            if workflow_id is None:
+                all_tasks = [
+                    t for tasks in self._tasks.values() for t in tasks.values()
+                ]
+            else:
+                all_tasks = list(self._tasks.get(workflow_id, {}).values())
+        return [
+            t
+            for t in all_tasks
+            if (task_name is None or t.task_name == task_name)
+            and (status is None or t.status == status)
+        ]
+
+    def count_by_status(self, workflow_id):
+        """Counts tasks of a workflow for each status.
+        Only the latest attempt of each task/shard is counted.
+        This is useful to show progress of a workflow.
+
+        Returns:
+            Dict of {status: number of tasks}.
+        """
+        with self._lock:
+            latest = {}
+            for (task_name, shard_idx, attempt), task in self._tasks.get(
+                workflow_id, {}
+            ).items():
+                prev = latest.get((task_name, shard_idx))
+                if prev is None or prev.attempt < attempt:
+                    latest[(task_name, shard_idx)] = task
+        result = defaultdict(int)
+        for task in latest.values():
+            result[task.status] += 1
+        return dict(result)
+
+    def remove_workflow(self, workflow_id):
+        with self._lock:
+            self._tasks.pop(workflow_id, None)
+
+
+class MetadataWriteQueue:
+    """Background work queue to retrieve/write metadata JSON of workflows.
+
+    Requests for a workflow that is already pending in the queue are merged
+    into one. A request for a workflow that is being written is deferred
+    until the current write is done. Failed writes are retried with
+    exponential backoff. All writes are done on a bounded number of
+    daemonized worker threads so that the caller is never blocked.
+    """
+
+    DEFAULT_NUM_THREADS = 4
+    DEFAULT_DELAY = 10.0
+    DEFAULT_MAX_RETRY = 3
+    DEFAULT_BACKOFF = 2.0
+
+    def __init__(
+        self,
+        write_fn,
+        num_threads=DEFAULT_NUM_THREADS,
+        delay=DEFAULT_DELAY,
+        max_retry=DEFAULT_MAX_RETRY,
+        backoff=DEFAULT_BACKOFF,
+    ):
+        """
+        Args:
+            write_fn:
+                Function to retrieve/write metadata of a workflow.
+                This function should take one argument (workflow_id)
+                and raise an exception on failure.
+            num_threads:
+                Number of worker threads.
+            delay:
+                Delay in seconds before the first trial.
+                This gives Cromwell server time to update workflow's metadata.
+            max_retry:
+                Maximum number of retrials for a failed write.
+            backoff:
+                Delay is multiplied by this for each retrial.
+        """
+        self._write_fn = write_fn
+        self._num_threads = num_threads
+        self._delay = delay
+        self._max_retry = max_retry
+        self._backoff = backoff
+
+        self._cond = Condition()
+        # workflow_id: (due time, trial)
+        self._pending = dict()
+        self._in_progress = set()
+        self._deferred = set()
+        self._threads = []
+        self._stop_it = False
+        self._timed_out = False
+
+        self._num_requested = 0
+        self._num_merged = 0
+        self._num_written = 0
+        self._num_failed = 0
+
+    @property
+    def queue_depth(self):
+        """Number of workflows waiting to be written.
+        """
+        with self._cond:
+            return len(self._pending)
+
+    @property
+    def stats(self):
+        """Dict of queue metrics.
+        """
+        with self._cond:
+            return {
+                'queue_depth': len(self._pending),
+                'in_progress': len(self._in_progress),
+                'deferred': len(self._deferred),
+                'requested': self._num_requested,
+                'merged': self._num_merged,
+                'written': self._num_written,
+                'failed': self._num_failed,
+            }
+
+    def start(self):
+        for _ in range(self._num_threads):
+            th = Thread(target=self._run_worker, daemon=True)
+            th.start()
+            self._threads.append(th)
+
+    def stop(self, wait=False, timeout=None):
+        """Stops all workers.
+
+        Args:
+            wait:
+                Wait for all pending/deferred workflows to be written.
+            timeout:
+                Maximum time in seconds to wait for pending/deferred workflows.
+                Workflows not written until then are dropped.
+                None means waiting indefinitely.
+        """
+        with self._cond:
+            self._stop_it = True
+            if not wait:
+                self._pending.clear()
+                self._deferred.clear()
+            self._cond.notify_all()
+
+        end = None if timeout is None else time.time() + timeout
+        for th in self._threads:
+            th.join(None if end is None else max(end - time.time(), 0.0))
+
+        with self._cond:
+            if self._pending or self._deferred:
+                logger.warning(
+                    'Timed out waiting for metadata to be written. '
+                    'Dropped {n} workflow(s).'.format(
+                        n=len(self._pending.keys() | self._deferred)
+                    )
+                )
+                self._pending.clear()
+                self._deferred.clear()
+            # workers still in progress will exit without taking retrials
+            self._timed_out = True
+            self._cond.notify_all()
+        self._threads = [th for th in self._threads if th.is_alive()]
+
+    def put(self, workflow_id):
+        """Requests retrieving/writing metadata of a workflow.
+        This does not block.
+        """
+        with self._cond:
+            self._num_requested += 1
+            if workflow_id in self._pending or workflow_id in self._deferred:
+                self._num_merged += 1
+            elif workflow_id in self._in_progress:
+                self._deferred.add(workflow_id)
+            else:
+                self._pending[workflow_id] = (time.time() + self._delay, 0)
+                self._cond.notify()
+
+    def _next(self):
+        """Waits for the next workflow that is due.
+        Returns a tuple of (workflow_id, trial) or None if stopped.
+        """
+        with self._cond:
+            while True:
+                if self._timed_out:
+                    return
+                if self._pending:
+                    workflow_id, (due, trial) = min(
+                        self._pending.items(), key=lambda x: x[1][0]
+                    )
+                    wait = 0.0 if self._stop_it else due - time.time()
+                    if wait <= 0.0:
+                        del self._pending[workflow_id]
+                        self._in_progress.add(workflow_id)
+                        return workflow_id, trial
+                    self._cond.wait(wait)
+                elif self._stop_it and not self._in_progress:
+                    return
+                else:
+                    self._cond.wait()
+
+    def _run_worker(self):
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            workflow_id, trial = item
+
+            try:
+                self._write_fn(workflow_id)
+                success = True
+            except Exception:
+                logger.error(
+                    'Failed to retrieve/write metadata. '
+                    'trial={t}, id={wf_id}'.format(t=trial, wf_id=workflow_id)
+                )
+                success = False
+
+            with self._cond:
+                self._in_progress.discard(workflow_id)
+                if success:
+                    self._num_written += 1
+                elif trial < self._max_retry:
+                    delay = self._delay * self._backoff ** (trial + 1)
+                    self._pending[workflow_id] = (time.time() + delay, trial + 1)
+                else:
+                    self._num_failed += 1
+
+                if workflow_id in self._deferred:
+                    self._deferred.discard(workflow_id)
+                    if workflow_id not in self._pending:
+                        self._pending[workflow_id] = (time.time() + self._delay, 0)
+                self._cond.notify_all()
+
+
 class CromwellWorkflowMonitor:
     """Class constants include several regular expressions to catch
     status changes of workflow/task by Cromwell's STDERR (logging level>=INFO).
@@ -117,10 +498,46 @@ class CromwellWorkflowMonitor:
     RE_TASK_CALL_CACHED = r'\[UUID\((\b[0-9a-f]{8})\)\]: Job results retrieved \(CallCached\): \'(.+)\' \(scatter index: (.+), attempt (\d+)\)'
     RE_SUBWORKFLOW_FOUND = r'(\b[0-9a-f]{8}\b-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-\b[0-9a-f]{12}\b)-SubWorkflowActor-SubWorkflow'
 
+    # all lines matching any of regexes above have one of these substrings
+    # most lines from Cromwell are filtered out by these cheap substring checks
+    LOG_LINE_PREFILTERS = (
+        ' service started on',
+        ' submitted',
+        'WorkflowActor-',
+        ' failed',
+        'Abort requested for workflow ',
+        ' completed with status',
+        ']: job id: ',
+        '(CallCached)',
+        ']: Status change from ',
+    )
+
+    LOG_LINE_SERVER_START = 'server_start'
+    LOG_LINE_SUBWORKFLOW = 'subworkflow'
+    LOG_LINE_TASK_START = 'task_start'
+    LOG_LINE_TASK_CALL_CACHED = 'task_call_cached'
+    LOG_LINE_TASK_STATUS_CHANGE = 'task_status_change'
+
+    LOG_LINE_CLASSIFIER = LogLineClassifier(
+        patterns=[
+            (LOG_LINE_SERVER_START, RE_CROMWELL_SERVER_START),
+            *[(t, t.regex) for t in ALL_STATUS_TRANSITIONS],
+            (LOG_LINE_SUBWORKFLOW, RE_SUBWORKFLOW_FOUND),
+            (LOG_LINE_TASK_START, RE_TASK_START),
+            (LOG_LINE_TASK_CALL_CACHED, RE_TASK_CALL_CACHED),
+            (LOG_LINE_TASK_STATUS_CHANGE, RE_TASK_STATUS_CHANGE),
+        ],
+        prefilters=LOG_LINE_PREFILTERS,
+    )
+
     MAX_RETRY_WRITE_METADATA = 3
     INTERVAL_RETRY_WRITE_METADATA = 10.0
+    NUM_THREADS_WRITE_METADATA = 4
     DEFAULT_SERVER_HOSTNAME = 'localhost'
     DEFAULT_SERVER_PORT = 8000
+    DEFAULT_TERMINAL_WORKFLOW_RETENTION_SEC = 3600.0
+    TERMINAL_STATUSES = ('Succeeded', 'Failed', 'Aborted')
+    LEN_SHORT_WORKFLOW_ID = 8
 
     def __init__(
         self,
@@ -131,6 +548,9 @@ class CromwellWorkflowMonitor:
         auto_write_metadata=False,
         on_status_change=None,
         on_server_start=None,
+        terminal_workflow_retention=DEFAULT_TERMINAL_WORKFLOW_RETENTION_SEC,
+        on_task_status_change=None,
+        task_state_table=None,
     ):
         """Parses STDERR from Cromwell to updates workflow/task information.
         Also, write/update metadata.json on each workflow's root directory.
@@ -160,6 +580,8 @@ class CromwellWorkflowMonitor:
                 automatically updates metadata JSON file on workflow's root directory.
                 metadata JSON is retrieved by communicating with Cromwell server via
                 REST API.
+                Retrieving/writing is done on background threads (MetadataWriteQueue)
+                so that parsing Cromwell's STDERR is not blocked by it.
             on_status_change:
                 Callback function called on any workflow/task status change.
                 This should take one parameter (workflow's metadata dict).
@@ -172,6 +594,19 @@ class CromwellWorkflowMonitor:
             on_server_start:
                 Callback function called on server start.
                 This function should not take parameter.
+            terminal_workflow_retention:
+                Workflows (and subworkflows) in a terminal state
+                (Succeeded, Failed, Aborted) are forgotten after this period
+                (in seconds) so that memory and lookup cost stay flat for a
+                long-running server.
+            on_task_status_change:
+                Callback function called on any task status change.
+                This should take one parameter (TaskState object).
+                Unlike on_status_change, this does not need any communication
+                with Cromwell server. Do not modify the TaskState object.
+            task_state_table:
+                TaskStateTable object to keep task states on.
+                A new one is created if not given.
         """
         self._is_server = is_server
 
@@ -186,124 +621,225 @@ class CromwellWorkflowMonitor:
         self._auto_write_metadata = auto_write_metadata
         self._on_status_change = on_status_change
         self._on_server_start = on_server_start
+        self._on_task_status_change = on_task_status_change
+
+        self._terminal_workflow_retention = terminal_workflow_retention
 
         self._workflow_status_map = dict()
-        self._subworkflows = set()
+        # subworkflow ID: time when it was last found. oldest first.
+        self._subworkflows = OrderedDict()
+        # short workflow ID (first 8 chars): full workflow ID
+        self._short_id_index = dict()
+        # workflow ID: time when it reached a terminal state. oldest first.
+        self._terminal_workflows = OrderedDict()
+        self._task_state_table = (
+            TaskStateTable() if task_state_table is None else task_state_table
+        )
         self._is_server_started = False
 
+        if self._is_server and self._auto_write_metadata:
+            self._metadata_write_queue = MetadataWriteQueue(
+                write_fn=self._retrieve_and_write_metadata,
+                num_threads=CromwellWorkflowMonitor.NUM_THREADS_WRITE_METADATA,
+                delay=CromwellWorkflowMonitor.INTERVAL_RETRY_WRITE_METADATA,
+                max_retry=CromwellWorkflowMonitor.MAX_RETRY_WRITE_METADATA,
+            )
+            self._metadata_write_queue.start()
+        else:
+            self._metadata_write_queue = None
+
+    @property
+    def metadata_write_queue(self):
+        """MetadataWriteQueue object. Check its property `stats` for
+        queue metrics (e.g. queue depth). None if not server mode or
+        auto_write_metadata is off.
+        """
+        return self._metadata_write_queue
+
+    @property
+    def task_state_table(self):
+        """TaskStateTable object to query task states of workflows
+        without communicating with Cromwell server.
+        e.g. task_state_table.count_by_status(workflow_id) for progress.
+        """
+        return self._task_state_table
+
+    def get_workflow_status(self, workflow_id):
+        return self._workflow_status_map.get(workflow_id)
+
     def is_server_started(self):
         return self._is_server_started
 
+    def stop(self, wait=False, timeout=None):
+        """Stops background threads for writing metadata.
+
+        Args:
+            wait:
+                Wait for all pending metadata to be written.
+            timeout:
+                Maximum time in seconds to wait for pending metadata.
+        """
+        if self._metadata_write_queue:
+            self._metadata_write_queue.stop(wait=wait, timeout=timeout)
+
     def update(self, stderr):
         """Update workflows by parsing Cromwell's stderr.
+        Each line is split/classified only once and then
+        dispatched to a corresponding handler.
 
         Args:
             stderr:
                 stderr from Cromwell.
                 Should be a full line (or lines) ending with blackslash n.
         """
-        if self._is_server:
-            self._update_server_start(stderr)
+        workflows_to_write_metadata = set()
+
+        for line in stderr.split('\n'):
+            for kind, groups in CromwellWorkflowMonitor.LOG_LINE_CLASSIFIER.classify(
+                line
+            ):
+                if isinstance(kind, WorkflowStatusTransition):
+                    workflow_id, status, auto_write_metadata = kind.transit(
+                        groups[0], self._workflow_status_map
+                    )
+                    if workflow_id:
+                        self._update_workflow_status(workflow_id, status)
+                        if auto_write_metadata:
+                            workflows_to_write_metadata.add(workflow_id)
+
+                elif kind == CromwellWorkflowMonitor.LOG_LINE_SERVER_START:
+                    self._update_server_start()
 
-        updated_workflows, workflows_to_write_metadata = self._update_workflows(stderr)
-        self._update_subworkflows(stderr)
-        self._update_tasks(stderr)
+                elif kind == CromwellWorkflowMonitor.LOG_LINE_SUBWORKFLOW:
+                    self._update_subworkflows(groups[0])
+
+                else:
+                    self._update_tasks(kind, groups)
 
         for w in workflows_to_write_metadata:
             self._write_metadata(w)
 
-    def _update_server_start(self, stderr):
-        if not self._is_server_started:
-            for line in stderr.split('\n'):
-                r1 = re.findall(CromwellWorkflowMonitor.RE_CROMWELL_SERVER_START, line)
-                if r1:
-                    self._is_server_started = True
-                    if self._on_server_start:
-                        self._on_server_start()
-                    logger.info('Cromwell server started. Ready to take submissions.')
-                    break
-
-    def _update_workflows(self, stderr):
-        """Updates workflow status by parsing Cromwell's stderr lines.
+        self._evict_terminal_workflows()
+
+    def _update_server_start(self):
+        if self._is_server and not self._is_server_started:
+            self._is_server_started = True
+            if self._on_server_start:
+                self._on_server_start()
+            logger.info('Cromwell server started. Ready to take submissions.')
+
+    def _update_workflow_status(self, workflow_id, status):
+        self._workflow_status_map[workflow_id] = status
+        self._add_to_short_id_index(workflow_id)
+
+        if status in CromwellWorkflowMonitor.TERMINAL_STATUSES:
+            self._terminal_workflows[workflow_id] = time.time()
+            self._terminal_workflows.move_to_end(workflow_id)
+
+    def _update_subworkflows(self, subworkflow_id):
+        if subworkflow_id not in self._subworkflows:
+            logger.info('Subworkflow found: {id}'.format(id=subworkflow_id))
+        self._subworkflows[subworkflow_id] = time.time()
+        self._subworkflows.move_to_end(subworkflow_id)
+        self._add_to_short_id_index(subworkflow_id)
+
+    def _add_to_short_id_index(self, workflow_id):
+        short_id = workflow_id[: CromwellWorkflowMonitor.LEN_SHORT_WORKFLOW_ID]
+        self._short_id_index[short_id] = workflow_id
+
+    def _evict_terminal_workflows(self):
+        """Forget workflows which have been in a terminal state
+        longer than retention period.
+
+        Cromwell's log does not tell which workflow a subworkflow belongs to.
+        So a subworkflow is also forgotten if it has not been in
+        a non-terminal state since it was found longer than retention period
+        (e.g. its terminal state was not caught in the log).
         """
-        updated_workflows = set()
-        workflows_to_write_metadata = set()
-        for line in stderr.split('\n'):
-            for st_transitions in CromwellWorkflowMonitor.ALL_STATUS_TRANSITIONS:
-                workflow_id, status, auto_write_metadata = st_transitions.parse(
-                    line, self._workflow_status_map
-                )
-                if workflow_id:
-                    self._workflow_status_map[workflow_id] = status
-                    updated_workflows.add(workflow_id)
-                    if auto_write_metadata:
-                        workflows_to_write_metadata.add(workflow_id)
+        expiration = time.time() - self._terminal_workflow_retention
+        while self._terminal_workflows:
+            workflow_id, terminated = next(iter(self._terminal_workflows.items()))
+            if terminated > expiration:
+                break
+            del self._terminal_workflows[workflow_id]
+            self._forget_workflow(workflow_id)
 
-        return updated_workflows, workflows_to_write_metadata
+        while self._subworkflows:
+            subworkflow_id, found = next(iter(self._subworkflows.items()))
+            if found > expiration:
+                break
+            status = self._workflow_status_map.get(subworkflow_id)
+            if status and status not in CromwellWorkflowMonitor.TERMINAL_STATUSES:
+                # still running. check it again after another retention period
+                self._subworkflows[subworkflow_id] = time.time()
+                self._subworkflows.move_to_end(subworkflow_id)
+                continue
+            self._terminal_workflows.pop(subworkflow_id, None)
+            self._forget_workflow(subworkflow_id)
 
-    def _update_subworkflows(self, stderr):
-        for line in stderr.split('\n'):
-            r_sub = re.findall(CromwellWorkflowMonitor.RE_SUBWORKFLOW_FOUND, line)
-            if r_sub:
-                subworkflow_id = r_sub[0]
-                if subworkflow_id not in self._subworkflows:
-                    logger.info('Subworkflow found: {id}'.format(id=subworkflow_id))
-                self._subworkflows.add(subworkflow_id)
-
-    def _update_tasks(self, stderr):
-        """Check if workflow's task status changed by parsing Cromwell's stderr lines.
+    def _forget_workflow(self, workflow_id):
+        self._workflow_status_map.pop(workflow_id, None)
+        self._subworkflows.pop(workflow_id, None)
+        self._task_state_table.remove_workflow(workflow_id)
+
+        short_id = workflow_id[: CromwellWorkflowMonitor.LEN_SHORT_WORKFLOW_ID]
+        if self._short_id_index.get(short_id) == workflow_id:
+            del self._short_id_index[short_id]
+        logger.debug('Evicted workflow: {id}'.format(id=workflow_id))
+
+    def _update_tasks(self, kind, groups):
+        """Updates task's status caught from Cromwell's stderr line.
+
+        Args:
+            kind:
+                One of LOG_LINE_TASK_* constants.
+            groups:
+                Groups caught by regex for `kind`.
         """
-        for line in stderr.split('\n'):
-            r_common = None
-            r_start = re.findall(CromwellWorkflowMonitor.RE_TASK_START, line)
-            if r_start:
-                r_common = r_start[0]
-                status = 'Started'
-                job_id = r_common[4]
-
-            r_callcached = re.findall(CromwellWorkflowMonitor.RE_TASK_CALL_CACHED, line)
-            if r_callcached:
-                r_common = r_callcached[0]
-                status = 'CallCached'
-                job_id = None
-
-            r_status_change = re.findall(
-                CromwellWorkflowMonitor.RE_TASK_STATUS_CHANGE, line
+        if kind == CromwellWorkflowMonitor.LOG_LINE_TASK_START:
+            status = 'Started'
+            job_id = groups[4]
+        elif kind == CromwellWorkflowMonitor.LOG_LINE_TASK_CALL_CACHED:
+            status = 'CallCached'
+            job_id = None
+        else:
+            status = groups[5]
+            job_id = None
+
+        short_id = groups[0]
+        workflow_id = self._find_workflow_id_from_short_id(short_id)
+        task_name = groups[1]
+        shard_idx = groups[2]
+        try:
+            shard_idx = int(shard_idx)
+        except ValueError:
+            shard_idx = -1
+        retry = int(groups[3])
+
+        msg = 'Task: id={id}, task={name}:{shard_idx}, retry={retry}, status={status}'.format(
+            id=workflow_id,
+            name=task_name,
+            shard_idx=shard_idx,
+            retry=retry - 1,
+            status=status,
+        )
+        if job_id:
+            msg += ', job_id={job_id}'.format(job_id=job_id)
+        logger.info(msg)
+
+        if workflow_id:
+            task = self._task_state_table.update(
+                workflow_id, task_name, shard_idx, retry, status, job_id
             )
-            if r_status_change:
-                r_common = r_status_change[0]
-                status = r_common[5]
-                job_id = None
-
-            if r_common:
-                short_id = r_common[0]
-                workflow_id = self._find_workflow_id_from_short_id(short_id)
-                task_name = r_common[1]
-                shard_idx = r_common[2]
-                try:
-                    shard_idx = int(shard_idx)
-                except ValueError:
-                    shard_idx = -1
-                retry = int(r_common[3])
-
-                msg = 'Task: id={id}, task={name}:{shard_idx}, retry={retry}, status={status}'.format(
-                    id=workflow_id,
-                    name=task_name,
-                    shard_idx=shard_idx,
-                    retry=retry - 1,
-                    status=status,
-                )
-                if job_id:
-                    msg += ', job_id={job_id}'.format(job_id=job_id)
-                logger.info(msg)
+            if self._on_task_status_change:
+                self._on_task_status_change(task)
 
     def _find_workflow_id_from_short_id(self, short_id):
-        for w in self._subworkflows.union(set(self._workflow_status_map.keys())):
-            if w.startswith(short_id):
-                return w
+        return self._short_id_index.get(short_id)
 
     def _write_metadata(self, workflow_id):
-        """Update metadata on Cromwell'e exec root.
+        """Request updating metadata on Cromwell'e exec root.
+        Metadata is retrieved/written on a background thread.
         """
         if not self._is_server or not self._auto_write_metadata:
             return
@@ -314,21 +850,16 @@ class CromwellWorkflowMonitor:
                 )
             )
             return
-        for trial in range(CromwellWorkflowMonitor.MAX_RETRY_WRITE_METADATA + 1):
-            try:
-                time.sleep(CromwellWorkflowMonitor.INTERVAL_RETRY_WRITE_METADATA)
-                metadata = self._cromwell_rest_api.get_metadata(
-                    workflow_ids=[workflow_id],
-                    embed_subworkflow=self._embed_subworkflow,
-                )[0]
-                if self._on_status_change:
-                    self._on_status_change(metadata)
-                cm = CromwellMetadata(metadata)
-                cm.write_on_workflow_root()
-            except Exception:
-                logger.error(
-                    'Failed to retrieve metadata from Cromwell server. '
-                    'trial={t}, id={wf_id}'.format(t=trial, wf_id=workflow_id)
-                )
-                continue
-            break
+        self._metadata_write_queue.put(workflow_id)
+
+    def _retrieve_and_write_metadata(self, workflow_id):
+        """Retrieve metadata from Cromwell server and write it
+        on workflow's root. Raises an exception on failure.
+        """
+        metadata = self._cromwell_rest_api.get_metadata(
+            workflow_ids=[workflow_id], embed_subworkflow=self._embed_subworkflow
+        )[0]
+        if self._on_status_change:
+            self._on_status_change(metadata)
+        cm = CromwellMetadata(metadata)
+        cm.write_on_workflow_root()
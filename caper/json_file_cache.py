@@ -0,0 +1,145 @@
+import json
+import logging
+import os
+import tempfile
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+
+class JSONFileCache:
+    """Local on-disk cache for JSON-serializable values.
+
+    Each entry is a JSON file named after its key (e.g. a hash string)
+    so that lookup is O(1) and multiple processes can share a cache.
+    Least recently used entries are evicted when total size of cache
+    exceeds max_size.
+    """
+
+    CACHE_FILE_EXT = '.json'
+    TMP_FILE_EXT = '.tmp'
+    # while total size is unknown, eviction is checked after writing
+    # this ratio of max_size
+    UNKNOWN_SIZE_EVICTION_CHECK_RATIO = 0.1
+
+    def __init__(self, cache_dir, max_size):
+        """
+        Args:
+            cache_dir:
+                Local directory to store cache files.
+            max_size:
+                Maximum total size of cache files in bytes.
+        """
+        self._cache_dir = os.path.expanduser(cache_dir)
+        self._max_size = max_size
+        self._lock = Lock()
+        os.makedirs(self._cache_dir, exist_ok=True)
+        # total size is not known until cache directory is scanned.
+        # scanning is deferred until eviction runs
+        self._size = None
+        # size written since construction while total size is unknown
+        self._size_unscanned = 0
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    @property
+    def size(self):
+        """Total size of cache files in bytes.
+        Cache directory is scanned if it's not known yet.
+        """
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._scan())
+                self._size_unscanned = 0
+            return self._size
+
+    def get(self, key):
+        """Returns a cached value or None if not found.
+        """
+        cache_file = self._get_cache_file(key)
+        try:
+            with open(cache_file) as fp:
+                value = json.load(fp)
+            # for LRU eviction
+            os.utime(cache_file)
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, value, default=None):
+        """Writes a value on cache and evicts old ones if needed.
+
+        Args:
+            default:
+                json.dumps's default to serialize value.
+        """
+        b = json.dumps(value, default=default).encode()
+        cache_file = self._get_cache_file(key)
+        # unique tmp file for each writer (thread/process) of the same key
+        fd, tmp_file = tempfile.mkstemp(
+            prefix=key, suffix=JSONFileCache.TMP_FILE_EXT, dir=self._cache_dir
+        )
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(b)
+
+        with self._lock:
+            try:
+                old_size = os.path.getsize(cache_file)
+            except OSError:
+                old_size = 0
+            os.replace(tmp_file, cache_file)
+            if self._size is None:
+                self._size_unscanned += len(b) - old_size
+                if (
+                    self._size_unscanned
+                    > self._max_size * JSONFileCache.UNKNOWN_SIZE_EVICTION_CHECK_RATIO
+                ):
+                    self._evict()
+            else:
+                self._size += len(b) - old_size
+                if self._size > self._max_size:
+                    self._evict()
+
+    def _get_cache_file(self, key):
+        return os.path.join(self._cache_dir, key + JSONFileCache.CACHE_FILE_EXT)
+
+    def _scan(self):
+        """Returns a list of tuples of (path, size, mtime) of cache files.
+        """
+        result = []
+        for entry in os.scandir(self._cache_dir):
+            if entry.name.endswith(JSONFileCache.CACHE_FILE_EXT):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                result.append((entry.path, stat.st_size, stat.st_mtime))
+        return result
+
+    def _evict(self):
+        """Removes least recently used cache files until total size
+        becomes lower than 90% of max_size to avoid evicting on every put().
+        Total size is updated with a new scan.
+        """
+        entries = sorted(self._scan(), key=lambda x: x[2])
+        size = sum(size for _, size, _ in entries)
+        target_size = self._max_size * 0.9
+        num_evicted = 0
+        for path, file_size, _ in entries:
+            if size <= target_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= file_size
+            num_evicted += 1
+        self._size = size
+        self._size_unscanned = 0
+        logger.debug(
+            'Evicted {n} cache files on {d}. size={size}'.format(
+                n=num_evicted, d=self._cache_dir, size=size
+            )
+        )
@@ -0,0 +1,145 @@
+import json
+import re
+
+RE_WHITESPACE = re.compile(r'[ \t\n\r]*')
+NUMBER_CHARS = '+-.0123456789eE'
+
+
+class JSONStreamReader:
+    DEFAULT_CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, fp, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Incremental reader for a JSON text file.
+
+        Walks through containers (objects/arrays) one item at a time
+        and decodes values only on demand so that the whole JSON
+        is not held in memory. Only a chunk of text and the value
+        being decoded are kept in memory.
+
+        Containers should be consumed in order. e.g.
+            for key in reader.iter_object():
+                if key == 'calls':
+                    for call_name in reader.iter_object():
+                        ...
+                else:
+                    value = reader.read_value()
+
+        Args:
+            fp:
+                File object opened in text mode.
+            chunk_size:
+                Number of characters to read from fp at once.
+        """
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, size=0):
+        """Drops consumed text and appends at least `size` more characters.
+
+        Returns:
+            False if EOF is reached.
+        """
+        if self._eof:
+            return False
+        data = self._fp.read(max(size, self._chunk_size))
+        self._buf = self._buf[self._pos :] + data
+        self._pos = 0
+        if not data:
+            self._eof = True
+            return False
+        return True
+
+    def peek(self):
+        """Skips whitespaces and returns the next character.
+        """
+        while True:
+            self._pos = RE_WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                raise ValueError('Unexpected end of JSON stream.')
+
+    def _expect(self, chars):
+        ch = self.peek()
+        if ch not in chars:
+            raise ValueError(
+                'Expected one of {chars} but found {ch} in JSON stream.'.format(
+                    chars=chars, ch=ch
+                )
+            )
+        self._pos += 1
+        return ch
+
+    def read_value(self):
+        """Decodes the next value (any JSON type) entirely.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # a number at the end of buffer can be truncated. e.g. `1.` of `1.5`
+                # so it is complete only if followed by a non-number character.
+                is_number = self._buf[self._pos] in NUMBER_CHARS
+                if (
+                    self._eof
+                    or not is_number
+                    or self._buf[end : end + 1].strip(NUMBER_CHARS)
+                ):
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            # read as much as the current value to avoid quadratic re-decoding
+            self._fill(len(self._buf) - self._pos)
+
+    def skip_value(self):
+        """Skips the next value without decoding a large container at once.
+        """
+        ch = self.peek()
+        if ch == '{':
+            for _ in self.iter_object():
+                self.skip_value()
+        elif ch == '[':
+            for _ in self.iter_array():
+                self.skip_value()
+        else:
+            self.read_value()
+
+    def iter_object(self):
+        """Generator for keys of the next object.
+        Caller must consume the value of each key
+        (read_value, skip_value, iter_object or iter_array)
+        before getting the next key.
+        """
+        self._expect('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                raise ValueError('Expected a key string in JSON stream.')
+            key = self.read_value()
+            self._expect(':')
+            yield key
+            if self._expect(',}') == '}':
+                return
+
+    def iter_array(self):
+        """Generator for indices of the next array.
+        Caller must consume each item before getting the next one.
+        """
+        self._expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        i = 0
+        while True:
+            yield i
+            i += 1
+            if self._expect(',]') == ']':
+                return
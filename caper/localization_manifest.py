@@ -0,0 +1,122 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from autouri import AutoURI
+
+logger = logging.getLogger(__name__)
+
+
+class LocalizationManifest:
+    """Persistent index of files localized on backend storages
+    (see CaperBase.localize_on_backend).
+
+    Each entry maps a version of a source file (URI, size, mtime and md5 if
+    available without calculating it) and its localization destination
+    to metadata (size, mtime) of the localized file.
+    Each entry is a JSON file keyed by a hash of them so that
+    lookup is O(1) and multiple Caper processes can share a manifest.
+
+    A localized file is considered valid only if its current
+    size/mtime match with those recorded in the manifest.
+    Otherwise, the entry is removed and the file will be localized again.
+    """
+
+    DEFAULT_MANIFEST_DIR_NAME = '.localization_manifest'
+    MANIFEST_FILE_EXT = '.json'
+    TMP_FILE_EXT = '.tmp'
+
+    def __init__(self, manifest_dir):
+        """
+        Args:
+            manifest_dir:
+                Local directory to store manifest files.
+                It is created on the first write.
+        """
+        self._manifest_dir = manifest_dir
+
+    @property
+    def manifest_dir(self):
+        return self._manifest_dir
+
+    @staticmethod
+    def make_key(src_uri, loc_uri):
+        """Makes a key from source file's version and localization destination.
+
+        Args:
+            src_uri:
+                AutoURI object of a source file.
+            loc_uri:
+                URI string of a localization destination.
+        Returns:
+            Key string. None if source file does not exist or
+            its version cannot be identified (no mtime and md5),
+            e.g. HTTP URL without Last-Modified header.
+        """
+        m = src_uri.get_metadata(skip_md5=True)
+        if not m.exists or (m.mtime is None and m.md5 is None):
+            return None
+        s = json.dumps([src_uri.uri, m.size, m.mtime, m.md5, loc_uri])
+        return hashlib.sha256(s.encode()).hexdigest()
+
+    def is_localized(self, key, loc_uri, thread_id=-1):
+        """Checks if a source file (key) is already localized on loc_uri
+        and localized file is not modified after that.
+
+        Args:
+            thread_id:
+                autouri's thread_id to get metadata of loc_uri.
+        """
+        manifest_file = self._get_manifest_file(key)
+        try:
+            with open(manifest_file) as fp:
+                entry = json.load(fp)
+        except (OSError, ValueError):
+            return False
+
+        m = AutoURI(loc_uri, thread_id=thread_id).get_metadata(skip_md5=True)
+        if (
+            entry.get('loc_uri') == loc_uri
+            and m.exists
+            and m.size == entry.get('size')
+            and m.mtime == entry.get('mtime')
+        ):
+            return True
+
+        logger.debug(
+            'Localized file has been modified or deleted. {f}'.format(f=loc_uri)
+        )
+        self.remove(key)
+        return False
+
+    def add(self, key, loc_uri, thread_id=-1):
+        """Records a localized file.
+
+        Args:
+            thread_id:
+                autouri's thread_id to get metadata of loc_uri.
+        """
+        m = AutoURI(loc_uri, thread_id=thread_id).get_metadata(skip_md5=True)
+        if not m.exists:
+            return
+        os.makedirs(self._manifest_dir, exist_ok=True)
+        # unique tmp file for each writer (thread/process) of the same key
+        fd, tmp_file = tempfile.mkstemp(
+            prefix=key, suffix=LocalizationManifest.TMP_FILE_EXT, dir=self._manifest_dir
+        )
+        with os.fdopen(fd, 'w') as fp:
+            json.dump({'loc_uri': loc_uri, 'size': m.size, 'mtime': m.mtime}, fp)
+        os.replace(tmp_file, self._get_manifest_file(key))
+
+    def remove(self, key):
+        try:
+            os.remove(self._get_manifest_file(key))
+        except OSError:
+            pass
+
+    def _get_manifest_file(self, key):
+        return os.path.join(
+            self._manifest_dir, key + LocalizationManifest.MANIFEST_FILE_EXT
+        )
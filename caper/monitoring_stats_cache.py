@@ -0,0 +1,51 @@
+import hashlib
+import json
+
+from . import caper_defaults
+from .json_file_cache import JSONFileCache
+
+
+class MonitoringStatsCache(JSONFileCache):
+    """Local on-disk cache for parsed/reduced statistics of
+    task's `monitoringLog` (see CromwellMetadata.gcp_monitor).
+
+    Monitoring logs of finished tasks do not change so that their stats
+    can be reused across multiple `caper gcp_monitor`/`gcp_res_analysis` runs.
+    Each entry is a JSON file keyed by a hash of monitoring log's URI and
+    version (md5/mtime/size) and parameters for reduction.
+
+    Least recently used entries are evicted when total size of cache
+    exceeds max_size.
+    """
+
+    DEFAULT_CACHE_DIR = caper_defaults.DEFAULT_MONITORING_STATS_CACHE_DIR
+    DEFAULT_MAX_SIZE = caper_defaults.DEFAULT_MONITORING_STATS_CACHE_MAX_SIZE
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_size=DEFAULT_MAX_SIZE):
+        """
+        Args:
+            cache_dir:
+                Local directory to store cache files.
+            max_size:
+                Maximum total size of cache files in bytes.
+        """
+        super().__init__(cache_dir=cache_dir, max_size=max_size)
+
+    @staticmethod
+    def make_key(uri, uri_metadata, *params):
+        """Makes a key for a monitoring log.
+
+        Args:
+            uri:
+                URI of a monitoring log.
+            uri_metadata:
+                autouri's URIMetadata of a monitoring log.
+                md5, mtime and size are used as version of the log.
+            params:
+                Any JSON-serializable parameters affecting cached value.
+        """
+        s = json.dumps(
+            [uri, uri_metadata.md5, uri_metadata.mtime, uri_metadata.size, params],
+            sort_keys=True,
+        )
+        return hashlib.sha256(s.encode()).hexdigest()
@@ -1,8 +1,11 @@
 import logging
+import os
+import selectors
 import time
+from collections import deque
 from signal import SIGTERM
 from subprocess import PIPE, Popen
-from threading import Thread
+from threading import Lock, Thread
 
 logger = logging.getLogger(__name__)
 
@@ -11,10 +14,117 @@ def is_fileobj_open(fileobj):
     return fileobj and not getattr(fileobj, 'closed', False)
 
 
+class OutputCapture:
+    """Captures all output strings in memory (unlimited).
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._chunks = []
+
+    def write(self, text):
+        with self._lock:
+            self._chunks.append(text)
+
+    def getvalue(self):
+        with self._lock:
+            if len(self._chunks) > 1:
+                # compact to avoid joining everything again on next access
+                self._chunks = [''.join(self._chunks)]
+            return self._chunks[0] if self._chunks else ''
+
+    def close(self):
+        pass
+
+
+class RingBufferOutputCapture(OutputCapture):
+    DEFAULT_MAX_SIZE = 1024 * 1024
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        """Keeps last max_size characters of output only so that
+        memory usage is bounded for a long-running subprocess.
+
+        Args:
+            max_size:
+                Maximum number of characters to keep in memory.
+        """
+        super().__init__()
+        self._max_size = max_size
+        self._chunks = deque()
+        self._size = 0
+
+    def write(self, text):
+        with self._lock:
+            self._chunks.append(text)
+            self._size += len(text)
+            while self._size > self._max_size:
+                if len(self._chunks) == 1:
+                    self._chunks[0] = self._chunks[0][-self._max_size :]
+                    self._size = len(self._chunks[0])
+                    break
+                self._size -= len(self._chunks.popleft())
+
+    def getvalue(self):
+        with self._lock:
+            return ''.join(self._chunks)
+
+
+class SpillOutputCapture(RingBufferOutputCapture):
+    DEFAULT_MAX_SIZE = 64 * 1024
+
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE):
+        """Spills all output to a local file while keeping
+        last max_size characters (tail) in memory.
+
+        Args:
+            path:
+                Local file path to spill output to. Appended if exists.
+            max_size:
+                Maximum number of characters of tail to keep in memory.
+        """
+        super().__init__(max_size=max_size)
+        self._path = path
+        self._fp = None
+
+    @property
+    def path(self):
+        return self._path
+
+    def write(self, text):
+        super().write(text)
+        with self._lock:
+            if self._fp is None:
+                self._fp = open(self._path, 'a')
+            self._fp.write(text)
+
+    def read_all(self):
+        """Reads all spilled output from the file.
+        """
+        with self._lock:
+            if self._fp is not None:
+                self._fp.flush()
+        if not os.path.exists(self._path):
+            return ''
+        with open(self._path) as fp:
+            return fp.read()
+
+    def close(self):
+        with self._lock:
+            if self._fp is not None:
+                self._fp.close()
+                self._fp = None
+
+
 class NBSubprocThread(Thread):
     DEFAULT_POLL_INTERVAL_SEC = 0.01
     DEFAULT_SUBPROCESS_NAME = 'Subprocess'
     DEFAULT_STOP_SIGNAL = SIGTERM
+    DEFAULT_READ_SIZE = 65536
+
+    ENGINE_THREAD = 'thread'
+    ENGINE_SELECTOR = 'selector'
+    # selectors cannot watch pipes on Windows
+    DEFAULT_ENGINE = ENGINE_SELECTOR if os.name == 'posix' else ENGINE_THREAD
 
     def __init__(
         self,
@@ -28,11 +138,20 @@ class NBSubprocThread(Thread):
         poll_interval=DEFAULT_POLL_INTERVAL_SEC,
         quiet=False,
         subprocess_name=DEFAULT_SUBPROCESS_NAME,
+        engine=DEFAULT_ENGINE,
+        stdout_capture=None,
+        stderr_capture=None,
     ):
         """Non-blocking STDOUT/STDERR streaming for subprocess.Popen().
 
-        This class makes two daemonized threads for nonblocking
-        streaming of STDOUT/STDERR.
+        There are two engines for nonblocking streaming of STDOUT/STDERR:
+            - selector:
+                A single I/O loop (in this thread) waits on STDOUT/STDERR pipes
+                with selectors. It wakes up only when there is new output,
+                the subprocess closes its pipes or stop() is called.
+            - thread:
+                Makes two daemonized threads reading STDOUT/STDERR and
+                polls the subprocess every poll_interval.
 
         Note that return value of callback functions are updated
         for the following properties:
@@ -59,6 +178,8 @@ class NBSubprocThread(Thread):
             on_poll:
                 Callback on every polling.
                 If return value is not None then it is used for updating property `status`.
+                For selector engine, this is called on every wake-up of
+                the I/O loop and at least every poll_interval.
             on_stdout:
                 Callback on every non-empty STDOUT line.
                 If return value is not None then it is used for updating property `status`.
@@ -80,6 +201,17 @@ class NBSubprocThread(Thread):
                 No logging.
             subprocess_name:
                 Subprocess name for logging.
+            engine:
+                Engine for streaming STDOUT/STDERR (selector or thread).
+            stdout_capture:
+                OutputCapture object to capture STDOUT for property `stdout`.
+                Defaults to an unlimited in-memory OutputCapture.
+                Use RingBufferOutputCapture (last N characters) or
+                SpillOutputCapture (all to a file, tail in memory)
+                for a long-running subprocess.
+            stderr_capture:
+                OutputCapture object to capture STDERR for property `stderr`.
+                Same as stdout_capture.
         """
         super().__init__(
             target=self._popen,
@@ -88,22 +220,34 @@ class NBSubprocThread(Thread):
         self._poll_interval = poll_interval
         self._quiet = quiet
         self._subprocess_name = subprocess_name
+        if engine not in (
+            NBSubprocThread.ENGINE_SELECTOR,
+            NBSubprocThread.ENGINE_THREAD,
+        ):
+            raise ValueError('Unsupported engine: {engine}'.format(engine=engine))
+        self._engine = engine
 
-        self._stdout_list = []
-        self._stderr_list = []
+        self._stdout_capture = stdout_capture or OutputCapture()
+        self._stderr_capture = stderr_capture or OutputCapture()
         self._returncode = None
         self._stop_it = False
         self._stop_signal = None
         self._status = None
         self._returnvalue = None
+        # write end of a self-pipe to wake up selector engine's I/O loop
+        self._wakeup_fd = None
 
     @property
     def stdout(self):
-        return ''.join(self._stdout_list)
+        """Captured STDOUT. This can be a tail only according to stdout_capture.
+        """
+        return self._stdout_capture.getvalue()
 
     @property
     def stderr(self):
-        return ''.join(self._stderr_list)
+        """Captured STDERR. This can be a tail only according to stderr_capture.
+        """
+        return self._stderr_capture.getvalue()
 
     @property
     def returncode(self):
@@ -138,6 +282,7 @@ class NBSubprocThread(Thread):
         """
         self._stop_it = True
         self._stop_signal = stop_signal
+        self._wakeup()
         if wait:
             if self._returncode is None:
                 logger.info(
@@ -166,7 +311,7 @@ class NBSubprocThread(Thread):
         def read_stdout(stdout_bytes):
             text = stdout_bytes.decode()
             if text:
-                self._stdout_list.append(text)
+                self._stdout_capture.write(text)
                 if on_stdout:
                     ret_on_stdout = on_stdout(text)
                     if ret_on_stdout is not None:
@@ -175,47 +320,20 @@ class NBSubprocThread(Thread):
         def read_stderr(stderr_bytes):
             text = stderr_bytes.decode()
             if text:
-                self._stderr_list.append(text)
+                self._stderr_capture.write(text)
                 if on_stderr:
                     ret_on_stderr = on_stderr(text)
                     if ret_on_stderr is not None:
                         self._status = ret_on_stderr
 
-        def read_from_stdout_obj(stdout):
-            if is_fileobj_open(stdout):
-                for line in iter(stdout.readline, b''):
-                    read_stdout(line)
-
-        def read_from_stderr_obj(stderr):
-            if is_fileobj_open(stderr):
-                for line in iter(stderr.readline, b''):
-                    read_stderr(line)
-
         self._stop_it = False
 
         try:
             p = Popen(args, stdout=PIPE, stderr=PIPE, cwd=cwd, stdin=stdin)
-            thread_stdout = Thread(
-                target=read_from_stdout_obj, args=(p.stdout,), daemon=True
-            )
-            thread_stderr = Thread(
-                target=read_from_stderr_obj, args=(p.stderr,), daemon=True
-            )
-            thread_stdout.start()
-            thread_stderr.start()
-
-            while True:
-                if on_poll:
-                    ret_on_poll = on_poll()
-                    if ret_on_poll is not None:
-                        self._status = ret_on_poll
-                if p.poll() is not None:
-                    self._returncode = p.poll()
-                    break
-                if self._stop_it and self._stop_signal:
-                    p.send_signal(self._stop_signal)
-                    break
-                time.sleep(self._poll_interval)
+            if self._engine == NBSubprocThread.ENGINE_SELECTOR:
+                self._communicate_with_selector(p, on_poll, read_stdout, read_stderr)
+            else:
+                self._communicate_with_threads(p, on_poll, read_stdout, read_stderr)
 
         except Exception as e:
             if not self._quiet:
@@ -226,6 +344,8 @@ class NBSubprocThread(Thread):
             read_stdout(stdout_bytes)
             read_stderr(stderr_bytes)
             self._returncode = p.returncode
+            self._stdout_capture.close()
+            self._stderr_capture.close()
 
         if on_finish:
             ret_on_finish = on_finish()
@@ -243,3 +363,111 @@ class NBSubprocThread(Thread):
                 logger.info(
                     '{name} finished successfully.'.format(name=self._subprocess_name)
                 )
+
+    def _call_on_poll(self, on_poll):
+        if on_poll:
+            ret_on_poll = on_poll()
+            if ret_on_poll is not None:
+                self._status = ret_on_poll
+
+    def _wakeup(self):
+        wakeup_fd = self._wakeup_fd
+        if wakeup_fd is not None:
+            try:
+                os.write(wakeup_fd, b'\0')
+            except OSError:
+                pass
+
+    def _communicate_with_threads(self, p, on_poll, read_stdout, read_stderr):
+        """Reads STDOUT/STDERR on two daemonized threads and
+        polls the subprocess every poll_interval.
+        """
+
+        def read_from_stdout_obj(stdout):
+            if is_fileobj_open(stdout):
+                for line in iter(stdout.readline, b''):
+                    read_stdout(line)
+
+        def read_from_stderr_obj(stderr):
+            if is_fileobj_open(stderr):
+                for line in iter(stderr.readline, b''):
+                    read_stderr(line)
+
+        thread_stdout = Thread(
+            target=read_from_stdout_obj, args=(p.stdout,), daemon=True
+        )
+        thread_stderr = Thread(
+            target=read_from_stderr_obj, args=(p.stderr,), daemon=True
+        )
+        thread_stdout.start()
+        thread_stderr.start()
+
+        while True:
+            self._call_on_poll(on_poll)
+            if p.poll() is not None:
+                self._returncode = p.poll()
+                break
+            if self._stop_it and self._stop_signal:
+                p.send_signal(self._stop_signal)
+                break
+            time.sleep(self._poll_interval)
+
+    def _communicate_with_selector(self, p, on_poll, read_stdout, read_stderr):
+        """Single I/O loop waiting on STDOUT/STDERR pipes and a self-pipe
+        written by stop(). Incoming bytes are split into lines so that
+        on_stdout/on_stderr are called for each line as in thread engine.
+
+        Returns when the subprocess closes both STDOUT/STDERR and exits.
+        Remaining outputs/returncode are handled by the caller.
+        """
+        rfd, wfd = os.pipe()
+        os.set_blocking(wfd, False)
+        sel = selectors.DefaultSelector()
+        sel.register(rfd, selectors.EVENT_READ)
+        pending = {}
+        for fileobj, read_fn in ((p.stdout, read_stdout), (p.stderr, read_stderr)):
+            if is_fileobj_open(fileobj):
+                sel.register(fileobj, selectors.EVENT_READ, read_fn)
+                pending[fileobj] = b''
+
+        self._wakeup_fd = wfd
+        signal_sent = False
+        timeout = self._poll_interval if on_poll else None
+        try:
+            while True:
+                self._call_on_poll(on_poll)
+                if self._stop_it and self._stop_signal and not signal_sent:
+                    p.send_signal(self._stop_signal)
+                    signal_sent = True
+                if not pending:
+                    # pipes are closed. wait for the subprocess to exit.
+                    if p.poll() is not None:
+                        self._returncode = p.returncode
+                        break
+                    timeout = self._poll_interval
+
+                for key, _ in sel.select(timeout):
+                    if key.data is None:
+                        os.read(rfd, NBSubprocThread.DEFAULT_READ_SIZE)
+                        continue
+                    fileobj, read_fn = key.fileobj, key.data
+                    data = os.read(fileobj.fileno(), NBSubprocThread.DEFAULT_READ_SIZE)
+                    if not data:
+                        sel.unregister(fileobj)
+                        if pending[fileobj]:
+                            read_fn(pending[fileobj])
+                        del pending[fileobj]
+                        continue
+                    buf = pending[fileobj] + data
+                    idx = buf.rfind(b'\n')
+                    if idx < 0:
+                        pending[fileobj] = buf
+                        continue
+                    pending[fileobj] = buf[idx + 1 :]
+                    for line in buf[:idx].split(b'\n'):
+                        read_fn(line + b'\n')
+        finally:
+            self._wakeup_fd = None
+            sel.close()
+            os.close(rfd)
+            os.close(wfd)
@@ -3,17 +3,141 @@ import json
 import logging
 from abc import ABC, abstractmethod
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
-import numpy as np
-from matplotlib import pyplot
-from matplotlib.backends.backend_pdf import PdfPages
-from sklearn import linear_model
+from autouri import URIBase
 
+from . import caper_defaults
 from .cromwell_metadata import CromwellMetadata, convert_type_np_to_py
 from .dict_tool import flatten_dict
 
 logger = logging.getLogger(__name__)
 
+# vectorized equivalents of Python's reduction functions for reduce_in_file_vars
+NUMPY_REDUCE_FUNCS = {sum: 'sum', max: 'max', min: 'min'}
+
+# numpy, matplotlib and sklearn are slow to import.
+# they are imported in methods so that CLI subcommands which do not
+# analyze resources (e.g. `caper list`) don't pay for them.
+
+
+class TaskResourceTable:
+    """Columnar store of resource data of tasks
+    (result of CromwellMetadata.gcp_monitor()) grouped by task name.
+    Each column is a NumPy array and i-th row of all columns is for the i-th task.
+
+    Columns:
+        Resource metrics:
+            Numeric values in a task's flattened (dot notation) dict
+            except for `input_file_sizes`. e.g. `stats.max.mem`.
+            Tuple of (values, mask) where mask is True for a non-zero value.
+        Input file sizes:
+            Sum of sizes of files for each input file var.
+            Tuple of (values, mask) where mask is True for a non-empty var.
+    """
+
+    def __init__(self, task_resources):
+        """
+        Args:
+            task_resources:
+                List of task resource data from CromwellMetadata.gcp_monitor().
+        """
+        import numpy as np
+
+        self._num_rows = len(task_resources)
+        rows = defaultdict(list)
+        resources = defaultdict(dict)
+        in_file_sizes = defaultdict(dict)
+
+        for i, task in enumerate(task_resources):
+            rows[task['task_name']].append(i)
+            for in_file_var, in_file_size in task.get('input_file_sizes', {}).items():
+                if in_file_size:
+                    in_file_sizes[in_file_var][i] = sum(in_file_size)
+            task = {k: v for k, v in task.items() if k != 'input_file_sizes'}
+            for res_metric, res_val in flatten_dict(task, reducer='.').items():
+                if res_val and isinstance(res_val, (int, float)):
+                    resources[res_metric][i] = res_val
+
+        self._rows = {
+            task_name: np.array(r, dtype=np.intp) for task_name, r in rows.items()
+        }
+        self._resources = {k: self._make_column(v) for k, v in resources.items()}
+        self._in_file_sizes = {
+            k: self._make_column(v) for k, v in in_file_sizes.items()
+        }
+
+    def __len__(self):
+        return self._num_rows
+
+    @property
+    def task_names(self):
+        return list(self._rows)
+
+    def _make_column(self, values):
+        """Makes a tuple of (values, mask) from a sparse dict {row: value}.
+        dtype is int64 if all values are int to keep them int as in metadata.
+        """
+        import numpy as np
+
+        if all(isinstance(v, int) for v in values.values()):
+            dtype = np.int64
+        else:
+            dtype = np.float64
+        col = np.zeros(self._num_rows, dtype=dtype)
+        mask = np.zeros(self._num_rows, dtype=bool)
+        idx = np.fromiter(values.keys(), dtype=np.intp, count=len(values))
+        col[idx] = np.fromiter(values.values(), dtype=dtype, count=len(values))
+        mask[idx] = True
+        return col, mask
+
+    def find_rows(self, task_name):
+        """Finds rows of tasks matching with a task name.
+
+        Args:
+            task_name:
+                Task name. Wildcards (*, ?) are allowed.
+        Returns:
+            Sorted NumPy array of row indices.
+        """
+        import numpy as np
+
+        matched = [
+            r for name, r in self._rows.items() if fnmatch.fnmatchcase(name, task_name)
+        ]
+        if not matched:
+            return np.array([], dtype=np.intp)
+        return np.sort(np.concatenate(matched))
+
+    def get_resources(self, rows, res_metrics):
+        """Returns a dict of {res_metric: (values, mask)} sliced with rows.
+        Resource metrics not found in any task are excluded.
+        """
+        result = {}
+        for res_metric in res_metrics:
+            if res_metric in self._resources:
+                col, mask = self._resources[res_metric]
+                result[res_metric] = col[rows], mask[rows]
+        return result
+
+    def get_in_file_sizes(self, rows, in_file_vars=None):
+        """Returns a dict of {in_file_var: (values, mask)} sliced with rows.
+        Input file vars which are empty in all rows are excluded.
+
+        Args:
+            in_file_vars:
+                List of input file vars to be included.
+                If None or False, then all input file vars.
+        """
+        result = {}
+        for in_file_var in sorted(self._in_file_sizes):
+            if in_file_vars and in_file_var not in in_file_vars:
+                continue
+            col, mask = self._in_file_sizes[in_file_var]
+            if mask[rows].any():
+                result[in_file_var] = col[rows], mask[rows]
+        return result
+
 
 class ResourceAnalysis(ABC):
     """
@@ -23,10 +147,13 @@ class ResourceAnalysis(ABC):
             e.g. sum, min, max, ...
         DEFAULT_TARGET_RESOURCES:
             Keys to make y vector.
+        DEFAULT_NUM_PROCESSES:
+            Number of processes to fit models for tasks in parallel.
     """
 
     DEFAULT_REDUCE_IN_FILE_VARS = sum
-    DEFAULT_TARGET_RESOURCES = ('stats.max.mem', 'stats.max.disk')
+    DEFAULT_TARGET_RESOURCES = caper_defaults.DEFAULT_TARGET_RESOURCES
+    DEFAULT_NUM_PROCESSES = caper_defaults.DEFAULT_NUM_PROCESSES
 
     def __init__(self):
         """Solves y = f(X) in a statistical way where
@@ -34,12 +161,24 @@ class ResourceAnalysis(ABC):
         y is a vector of resources (e.g. [max_mem, max_disk, ...])
         """
         self._task_resources = []
+        self._task_resource_table = None
+
+    def __getstate__(self):
+        """Collected resource data is not needed to fit models
+        in a worker process (see ResourceAnalysis.analyze).
+        """
+        state = self.__dict__.copy()
+        state['_task_resources'] = []
+        state['_task_resource_table'] = None
+        return state
 
     @property
     def task_resources(self):
         return self._task_resources
 
-    def collect_resource_data(self, metadata_jsons):
+    def collect_resource_data(
+        self, metadata_jsons, num_threads=URIBase.DEFAULT_NUM_THREADS, stats_cache=None
+    ):
         """Collect resource data from parsing metadata JSON files.
 
         self._task_resources is an extended (across all workflows) list of resource monitoring
@@ -61,10 +200,31 @@ class ResourceAnalysis(ABC):
             metadata_jsons:
                 List of metadata JSON file URIs or metadata JSONs
                 or CromwellMetadata objects.
+            num_threads:
+                Number of threads for CromwellMetadata.gcp_monitor().
+            stats_cache:
+                MonitoringStatsCache object for CromwellMetadata.gcp_monitor().
         """
         self._task_resources = []
+        # share file size cache across all workflows
+        file_size_cache = {}
         for metadata_json in metadata_jsons:
-            self._task_resources.extend(CromwellMetadata(metadata_json).gcp_monitor())
+            self._task_resources.extend(
+                CromwellMetadata(metadata_json).gcp_monitor(
+                    num_threads=num_threads,
+                    file_size_cache=file_size_cache,
+                    stats_cache=stats_cache,
+                )
+            )
+        self._task_resource_table = TaskResourceTable(self._task_resources)
+
+    @property
+    def task_resource_table(self):
+        """TaskResourceTable built from collected resource data.
+        """
+        if self._task_resource_table is None:
+            self._task_resource_table = TaskResourceTable(self._task_resources)
+        return self._task_resource_table
 
     def analyze(
         self,
@@ -72,6 +232,7 @@ class ResourceAnalysis(ABC):
         reduce_in_file_vars=DEFAULT_REDUCE_IN_FILE_VARS,
         target_resources=DEFAULT_TARGET_RESOURCES,
         plot_pdf=None,
+        num_processes=DEFAULT_NUM_PROCESSES,
     ):
         """Find and analyze all tasks.
         Run `self.collect_resource_data()` first to collect resource data before analysis.
@@ -88,6 +249,10 @@ class ResourceAnalysis(ABC):
                 Keys (in dot notation) to make vector y.
             plot_pdf:
                 Local file name for a PDF plot.
+            num_processes:
+                Number of processes to fit models and make plots for tasks.
+                Tasks are fitted independently in a process pool and
+                plots are written on plot_pdf in the order of tasks.
         Returns:
             Results in a dict form: {
                 TASK_NAME: {
@@ -99,6 +264,8 @@ class ResourceAnalysis(ABC):
         """
         plot_pp = None
         if plot_pdf:
+            from matplotlib.backends.backend_pdf import PdfPages
+
             plot_pp = PdfPages(plot_pdf)
 
         result = {}
@@ -106,17 +273,43 @@ class ResourceAnalysis(ABC):
         if in_file_vars:
             all_tasks = in_file_vars.keys()
         else:
-            all_tasks = list(set([task['task_name'] for task in self.task_resources]))
+            all_tasks = self.task_resource_table.task_names
 
-        for task_name in all_tasks:
-            result[task_name] = self.analyze_task(
+        all_tasks = list(all_tasks)
+        datasets = [
+            self._make_dataset(
                 task_name,
                 in_file_vars=in_file_vars[task_name] if in_file_vars else None,
                 reduce_in_file_vars=reduce_in_file_vars,
                 target_resources=target_resources,
-                plot_pp=plot_pp,
+            )
+            for task_name in all_tasks
+        ]
+        x_datas, y_datas, x_matrices = zip(*datasets) if datasets else ((), (), ())
+        make_plots = [plot_pp is not None] * len(all_tasks)
+
+        if num_processes > 1 and len(all_tasks) > 1:
+            with ProcessPoolExecutor(max_workers=num_processes) as executor:
+                fitted = list(
+                    executor.map(
+                        self._fit_task,
+                        all_tasks,
+                        x_datas,
+                        y_datas,
+                        x_matrices,
+                        make_plots,
+                    )
+                )
+        else:
+            fitted = list(
+                map(self._fit_task, all_tasks, x_datas, y_datas, x_matrices, make_plots)
             )
 
+        for task_name, (task_result, figures) in zip(all_tasks, fitted):
+            result[task_name] = task_result
+            for figure in figures:
+                plot_pp.savefig(figure)
+
         if plot_pdf:
             plot_pp.close()
 
@@ -194,91 +387,145 @@ class ResourceAnalysis(ABC):
                 Analysis result.
                 e.g. (coeffs, intercept) for linear regression.
         """
-        result = {}
+        x_data, y_data, x_matrix = self._make_dataset(
+            task_name,
+            in_file_vars=in_file_vars,
+            reduce_in_file_vars=reduce_in_file_vars,
+            target_resources=target_resources,
+        )
+        result, figures = self._fit_task(
+            task_name, x_data, y_data, x_matrix, make_plots=plot_pp is not None
+        )
+        for figure in figures:
+            plot_pp.savefig(figure)
+        return result
 
-        in_file_vars_found = set()
-        x_data = defaultdict(list)
-        y_data = defaultdict(list)
+    def _make_dataset(
+        self,
+        task_name,
+        in_file_vars=None,
+        reduce_in_file_vars=DEFAULT_REDUCE_IN_FILE_VARS,
+        target_resources=DEFAULT_TARGET_RESOURCES,
+    ):
+        """Makes a dataset for a task from collected resource data.
+        See ResourceAnalysis.analyze_task.__doc__ for details about Args.
+
+        Returns:
+            Tuple of (x_data, y_data, x_matrix).
+        """
+        import numpy as np
 
         logger.info('Analyzing task={task}'.format(task=task_name))
-        # first look at task's optional/empty input file vars across all workflows
+        table = self.task_resource_table
+        rows = table.find_rows(task_name)
+
+        # it's possible that y_data doesn't exists
+        # if a task is done immediately after initializing
+        # even before the monitoring script runs
+        # so if there is no y_data, then ignore x_data too.
+        resources = table.get_resources(rows, target_resources)
+        found_y_data = np.zeros(len(rows), dtype=bool)
+        y_data = {}
+        for res_metric, (res_vals, mask) in resources.items():
+            found_y_data |= mask
+            if mask.any():
+                y_data[res_metric] = res_vals[mask]
+
+        # look at task's optional/empty input file vars across all workflows
         # e.g. SE (single-ended) pipeline runs does not have fastqs_R2
         # but we want to mix both SE/PE (paired-ended) data.
         # so need to look at all workflows to check if optional/empty var is
-        # actully a file var.
-        matched_task_resources = []
-        for task in self.task_resources:
-            if not fnmatch.fnmatchcase(task['task_name'], task_name):
-                continue
-            matched_task_resources.append(task)
-
-            for in_file_var, in_file_size in task['input_file_sizes'].items():
-                if in_file_vars and in_file_var not in in_file_vars:
-                    continue
-
-                if in_file_size:
-                    in_file_vars_found.add(in_file_var)
-
-        for task in matched_task_resources:
-            # gather y_data
-            found_y_data = False
-            for res_metric, res_val in flatten_dict(task, reducer='.').items():
-                if res_metric in target_resources and res_val:
-                    y_data[res_metric].append(res_val)
-                    found_y_data = True
-
-            # it's possible that y_data doesn't exists
-            # if a task is done immediately after initializing
-            # even before the monitoring script runs
-            # so if there is no y_data, then ignore x_data too.
-            if not found_y_data:
-                continue
-
-            # gather x_data
-            for in_file_var in in_file_vars_found:
-                in_file_size = task['input_file_sizes'].get(in_file_var)
-                if in_file_size:
-                    x_data[in_file_var].append(sum(in_file_size))
-                else:
-                    x_data[in_file_var].append(0)
+        # actully a file var. empty var's size is 0.
+        x_data = {}
+        if found_y_data.any():
+            for in_file_var, (in_file_sizes, _) in table.get_in_file_sizes(
+                rows, in_file_vars
+            ).items():
+                x_data[in_file_var] = in_file_sizes[found_y_data]
 
         if reduce_in_file_vars:
             key = '{reduce_name}({vars})'.format(
                 reduce_name=reduce_in_file_vars.__name__,
                 vars=','.join(sorted(x_data.keys())),
             )
-            # transpose to reduce(sum by default) file sizes
-            # over all in_file_vars
-            tranposed = np.transpose([vec for vec in x_data.values()])
-            reduced = [reduce_in_file_vars(vec) for vec in tranposed]
+            if not x_data:
+                reduced = np.array([], dtype=np.int64)
+            elif reduce_in_file_vars in NUMPY_REDUCE_FUNCS:
+                reduce_fn = getattr(np, NUMPY_REDUCE_FUNCS[reduce_in_file_vars])
+                reduced = reduce_fn(np.vstack(list(x_data.values())), axis=0)
+            else:
+                # transpose to reduce file sizes over all in_file_vars
+                reduced = np.array(
+                    [
+                        reduce_in_file_vars(vec)
+                        for vec in np.transpose(list(x_data.values())).tolist()
+                    ]
+                )
             x_data = {key: reduced}
 
         # tranpose it to make x matrix
-        x_matrix = np.transpose([vec for vec in x_data.values()])
+        x_matrix = np.transpose(list(x_data.values()))
+
+        x_data = {k: v.tolist() for k, v in x_data.items()}
+        y_data = {k: v.tolist() for k, v in y_data.items()}
+        return x_data, y_data, x_matrix
+
+    def _fit_task(self, task_name, x_data, y_data, x_matrix, make_plots=False):
+        """Solves y = f(X) for each y vector in y_data.
+        This can run in a separate process (see ResourceAnalysis.analyze).
 
+        Args:
+            make_plots:
+                Make a plot (matplotlib Figure) for each y vector.
+                matplotlib is not imported if False.
+        Returns:
+            Tuple of (result, figures):
+                result:
+                    Result of ResourceAnalysis.analyze_task.
+                figures:
+                    List of matplotlib Figure objects.
+        """
         result = {'x': x_data, 'y': y_data, 'coeffs': {}}
+        figures = []
         for res_metric, y_vec in y_data.items():
-            result['coeffs'][res_metric] = self._solve(
+            coeffs = self._solve(
                 x_matrix=x_matrix,
                 y_vec=y_vec,
                 plot_y_label=res_metric,
                 plot_title=task_name,
-                plot_pp=plot_pp,
             )
+            result['coeffs'][res_metric] = coeffs
+            if make_plots and coeffs is not None:
+                figure = self._plot(
+                    x_matrix=x_matrix,
+                    y_vec=y_vec,
+                    coeffs=coeffs,
+                    plot_y_label=res_metric,
+                    plot_title=task_name,
+                )
+                if figure is not None:
+                    figures.append(figure)
 
         # a bit hacky way to recursively convert numpy type into python type
         json_str = json.dumps(result, default=convert_type_np_to_py)
-        return json.loads(json_str)
+        return json.loads(json_str), figures
 
     @abstractmethod
-    def _solve(self, x_matrix, y_vec, plot_y_label=None, plot_title=None, plot_pp=None):
+    def _solve(self, x_matrix, y_vec, plot_y_label=None, plot_title=None):
         raise NotImplementedError
 
+    def _plot(self, x_matrix, y_vec, coeffs, plot_y_label=None, plot_title=None):
+        """Makes a plot for a solution of y = f(X).
+
+        Returns:
+            matplotlib Figure object or None if not available.
+        """
+        return None
+
 
 class LinearResourceAnalysis(ResourceAnalysis):
-    def _solve(self, x_matrix, y_vec, plot_y_label=None, plot_title=None, plot_pp=None):
+    def _solve(self, x_matrix, y_vec, plot_y_label=None, plot_title=None):
         """Solve y = A(X) with linear regression.
-        Also make a scatter plot (for one-dimensional x_matrix only).
         Use `reduce_in_file_vars` in ResourceAnalysis.analyze()
         to reduce a matrix into a vector.
 
@@ -291,11 +538,12 @@ class LinearResourceAnalysis(ResourceAnalysis):
                 y label for plot.
             plot_title:
                 Plot title.
-            plot_pp:
-                Matplotlib's PDF backend PdfPages object.
         Returns:
             Tuple of (coeffs, intercept).
         """
+        import numpy as np
+        from sklearn import linear_model
+
         x_matrix = np.array(x_matrix)
 
         try:
@@ -316,21 +564,32 @@ class LinearResourceAnalysis(ResourceAnalysis):
             )
             return
 
-        if plot_pp:
-            if x_matrix.shape[1] > 1:
-                logger.warning(
-                    'Cannot make a 2D scatter plot. dim(x_matrix) > 1. '
-                    'Multi-dimensional analysis without reducing x matrix?'
-                )
-            else:
-                x_vec = x_matrix[:, 0]
-                # scatter plot with a fitting line
-                pyplot.scatter(x_vec, y_vec, s=np.pi * 3, color=(0, 0, 0), alpha=0.5)
-                pyplot.plot(x_vec, model.coef_ * x_vec + model.intercept_)
-                pyplot.title(plot_title)
-                pyplot.xlabel('input_file_size')
-                pyplot.ylabel(plot_y_label)
-                pyplot.savefig(plot_pp, format='pdf')
-                pyplot.clf()
-
         return list(model.coef_), model.intercept_
+
+    def _plot(self, x_matrix, y_vec, coeffs, plot_y_label=None, plot_title=None):
+        """Make a scatter plot with a fitting line
+        (for one-dimensional x_matrix only).
+        """
+        import numpy as np
+
+        x_matrix = np.array(x_matrix)
+        if x_matrix.shape[1] > 1:
+            logger.warning(
+                'Cannot make a 2D scatter plot. dim(x_matrix) > 1. '
+                'Multi-dimensional analysis without reducing x matrix?'
+            )
+            return
+        # use Figure directly instead of pyplot's global state
+        # since plots can be made in multiple processes
+        from matplotlib.figure import Figure
+
+        coef, intercept = coeffs
+        x_vec = x_matrix[:, 0]
+        figure = Figure()
+        ax = figure.subplots()
+        ax.scatter(x_vec, y_vec, s=np.pi * 3, color=(0, 0, 0), alpha=0.5)
+        ax.plot(x_vec, coef[0] * x_vec + intercept)
+        ax.set_title(plot_title)
+        ax.set_xlabel('input_file_size')
+        ax.set_ylabel(plot_y_label)
+        return figure
@@ -0,0 +1,133 @@
+import json
+import logging
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Thread
+from urllib.error import URLError
+from urllib.parse import quote, unquote
+from urllib.request import urlopen
+
+logger = logging.getLogger(__name__)
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TaskStateServer:
+    """HTTP endpoint to share task states caught by Caper server's
+    workflow monitor (TaskStateTable) with clients.
+    Clients can get progress of a workflow without
+    retrieving its full metadata from Cromwell server.
+
+    Endpoint:
+        GET /task_states/WORKFLOW_ID
+    Response (JSON):
+        {
+            "workflow_id": WORKFLOW_ID,
+            "status_count": {STATUS: NUM_TASKS, ...},
+            "tasks": [TaskState.to_dict(), ...]
+        }
+    """
+
+    DEFAULT_PORT = 8001
+    DEFAULT_TIMEOUT_SEC = 10.0
+    URL_PATH_TASK_STATES = '/task_states/'
+
+    def __init__(self, port=DEFAULT_PORT, timeout=DEFAULT_TIMEOUT_SEC):
+        """
+        Args:
+            port:
+                Port for endpoint.
+                Make sure to use different port for multiple Caper servers
+                on the same machine.
+            timeout:
+                Timeout (in seconds) for a client to read from endpoint.
+        """
+        self._port = port
+        self._timeout = timeout
+
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def port(self):
+        """Actual port of endpoint.
+        This can be different from port given to constructor if it's 0
+        (any free port) and endpoint is running.
+        """
+        if self._httpd:
+            return self._httpd.server_address[1]
+        return self._port
+
+    def start(self, task_state_table):
+        """Starts a thread serving task states.
+
+        Args:
+            task_state_table:
+                TaskStateTable object to be served.
+        """
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if not self.path.startswith(TaskStateServer.URL_PATH_TASK_STATES):
+                    self.send_error(404)
+                    return
+                workflow_id = unquote(
+                    self.path[len(TaskStateServer.URL_PATH_TASK_STATES) :]
+                )
+                tasks = task_state_table.find(workflow_id=workflow_id)
+                body = json.dumps(
+                    {
+                        'workflow_id': workflow_id,
+                        'status_count': task_state_table.count_by_status(workflow_id),
+                        'tasks': [t.to_dict() for t in tasks],
+                    }
+                ).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        self._httpd = _ThreadingHTTPServer(('', self._port), Handler)
+        self._thread = Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info('Task state server started. port={port}'.format(port=self.port))
+        return self._thread
+
+    def is_alive(self):
+        return self._thread.is_alive() if self._thread else False
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._thread.join()
+            self._httpd = None
+            self._thread = None
+            logger.info('Task state server ended.')
+
+    def read(self, hostname, workflow_id):
+        """Reads task states of a workflow from endpoint.
+
+        Returns:
+            Dict of response. See class docstring for details.
+            None if endpoint is not available.
+        """
+        url = 'http://{hostname}:{port}{path}{workflow_id}'.format(
+            hostname=hostname,
+            port=self.port,
+            path=TaskStateServer.URL_PATH_TASK_STATES,
+            workflow_id=quote(workflow_id),
+        )
+        try:
+            with urlopen(url, timeout=self._timeout) as res:
+                return json.loads(res.read().decode())
+        except (URLError, OSError, ValueError):
+            logger.error(
+                'Failed to read task states from Caper server. {url}'.format(url=url)
+            )
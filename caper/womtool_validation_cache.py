@@ -0,0 +1,67 @@
+import hashlib
+import io
+import json
+import zipfile
+
+from autouri import AbsPath, AutoURI
+
+from . import caper_defaults
+from .json_file_cache import JSONFileCache
+
+
+class WomtoolValidationCache(JSONFileCache):
+    """Local on-disk cache for verdicts of Womtool validation
+    (see Cromwell.validate).
+
+    Each entry is keyed by a hash of contents of WDL, input JSON and
+    files in imports ZIP and version of Womtool JAR (basename, size and mtime)
+    so that a new Womtool invalidates all entries.
+    """
+
+    DEFAULT_CACHE_DIR = caper_defaults.DEFAULT_WOMTOOL_VALIDATION_CACHE_DIR
+    DEFAULT_MAX_SIZE = caper_defaults.DEFAULT_WOMTOOL_VALIDATION_CACHE_MAX_SIZE
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_size=DEFAULT_MAX_SIZE):
+        """
+        Args:
+            cache_dir:
+                Local directory to store cache files.
+            max_size:
+                Maximum total size of cache files in bytes.
+        """
+        super().__init__(cache_dir=cache_dir, max_size=max_size)
+
+    @staticmethod
+    def make_key(womtool, wdl, inputs=None, imports=None):
+        """Makes a key for validation.
+
+        Args:
+            womtool:
+                Local path of Womtool JAR.
+            wdl, inputs, imports:
+                WDL, input JSON and imports ZIP files.
+                inputs and imports are optional.
+        """
+        womtool_metadata = AbsPath(womtool).get_metadata(skip_md5=True)
+        h = hashlib.sha256()
+        h.update(
+            json.dumps(
+                [
+                    AbsPath(womtool).basename,
+                    womtool_metadata.size,
+                    womtool_metadata.mtime,
+                ]
+            ).encode()
+        )
+        for f in (wdl, inputs):
+            contents = AutoURI(f).read(byte=True) if f else b''
+            h.update(hashlib.sha256(contents).digest())
+        if imports:
+            # imports ZIP is made again for each submission and
+            # its archive bytes have mtimes of files in it.
+            # so hash names and contents of files only.
+            with zipfile.ZipFile(io.BytesIO(AutoURI(imports).read(byte=True))) as z:
+                for name in sorted(z.namelist()):
+                    h.update(hashlib.sha256(name.encode()).digest())
+                    h.update(hashlib.sha256(z.read(name)).digest())
+        return h.hexdigest()
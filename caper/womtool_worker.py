@@ -0,0 +1,248 @@
+import logging
+import os
+import shutil
+import tempfile
+from subprocess import PIPE, Popen
+from threading import Lock, Thread
+
+from .nb_subproc_thread import RingBufferOutputCapture
+
+logger = logging.getLogger(__name__)
+
+
+WOMTOOL_WORKER_JAVA_SRC = r'''
+import java.io.*;
+import java.lang.reflect.Method;
+import java.nio.charset.StandardCharsets;
+import java.util.Arrays;
+import java.util.List;
+
+/**
+ * Runs Womtool repeatedly in a single JVM.
+ *
+ * Request: a line of tab-delimited Womtool arguments.
+ * Response: a header line "RC\tNUM_BYTES" followed by NUM_BYTES of
+ * UTF-8 encoded Womtool outputs (STDOUT and STDERR).
+ * "READY" is sent as the first response once Womtool is loaded.
+ */
+public class WomtoolWorker {
+    public static void main(String[] args) throws Exception {
+        PrintStream out = new PrintStream(
+            new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        // anything printed by Womtool should not interfere with responses
+        System.setOut(System.err);
+        BufferedReader in = new BufferedReader(
+            new InputStreamReader(System.in, StandardCharsets.UTF_8));
+
+        Class<?> womtoolMainClass = Class.forName("womtool.WomtoolMain$");
+        Object womtoolMain = womtoolMainClass.getField("MODULE$").get(null);
+        Method runWomtool = null;
+        for (Method m : womtoolMainClass.getMethods()) {
+            if (m.getName().equals("runWomtool") && m.getParameterCount() == 1) {
+                runWomtool = m;
+            }
+        }
+        if (runWomtool == null) {
+            throw new NoSuchMethodException("womtool.WomtoolMain.runWomtool");
+        }
+        Method asScalaBuffer = Class.forName("scala.collection.JavaConverters")
+            .getMethod("asScalaBuffer", List.class);
+
+        respond(out, 0, "READY");
+        String line;
+        while ((line = in.readLine()) != null) {
+            if (line.isEmpty()) {
+                continue;
+            }
+            int rc;
+            String msg;
+            try {
+                Object buf = asScalaBuffer.invoke(null, Arrays.asList(line.split("\t")));
+                Object seq = buf.getClass().getMethod("toList").invoke(buf);
+                Object termination = runWomtool.invoke(womtoolMain, seq);
+                rc = (Integer) termination.getClass().getMethod("returnCode").invoke(termination);
+                msg = getOption(termination, "stdout") + getOption(termination, "stderr");
+            } catch (Throwable e) {
+                rc = 1;
+                StringWriter sw = new StringWriter();
+                e.printStackTrace(new PrintWriter(sw));
+                msg = sw.toString();
+            }
+            respond(out, rc, msg);
+        }
+    }
+
+    private static String getOption(Object obj, String name) throws Exception {
+        Object opt = obj.getClass().getMethod(name).invoke(obj);
+        if ((Boolean) opt.getClass().getMethod("isDefined").invoke(opt)) {
+            return String.valueOf(opt.getClass().getMethod("get").invoke(opt));
+        }
+        return "";
+    }
+
+    private static void respond(PrintStream out, int rc, String msg) {
+        byte[] b = msg.getBytes(StandardCharsets.UTF_8);
+        out.print(rc + "\t" + b.length + "\n");
+        out.write(b, 0, b.length);
+        out.flush();
+    }
+}
+'''
+
+
+class WomtoolWorkerError(Exception):
+    pass
+
+
+class WomtoolWorker:
+    """Long-lived JVM process running Womtool.
+
+    Womtool is loaded once and each run is a request/response over
+    the worker's STDIN/STDOUT so that JVM startup and JIT warm-up are
+    amortized over many runs (e.g. validating many WDLs/inputs).
+    Requests are serialized so that one worker can be shared by threads.
+
+    Worker's Java source is launched as a single-file program (Java >= 11)
+    with Womtool JAR on classpath. It exits when its STDIN is closed
+    (stop() or exit of Caper process).
+    """
+
+    WORKER_CLASS_NAME = 'WomtoolWorker'
+    RESPONSE_READY = 'READY'
+    DEFAULT_STDERR_MAX_SIZE = 64 * 1024
+
+    def __init__(self, womtool, java_heap=None):
+        """
+        Args:
+            womtool:
+                Local path of Womtool JAR.
+            java_heap:
+                Java heap size for worker (java -Xmx).
+        """
+        self._womtool = womtool
+        self._java_heap = java_heap
+        self._lock = Lock()
+        self._proc = None
+        self._stderr = None
+
+    @property
+    def is_alive(self):
+        return self._proc is not None and self._proc.poll() is None
+
+    def start(self):
+        """Starts a worker and waits until Womtool is loaded.
+        Does nothing if worker is already running.
+        """
+        with self._lock:
+            if self.is_alive:
+                return
+            self._start()
+
+    def run(self, args):
+        """Runs Womtool on worker. Starts a worker if not running.
+
+        Args:
+            args:
+                List of Womtool arguments. e.g. ['validate', 'main.wdl']
+                Arguments should not have tabs or newlines.
+        Returns:
+            Tuple of (return code, Womtool's STDOUT and STDERR).
+        """
+        for arg in args:
+            if '\t' in arg or '\n' in arg:
+                raise ValueError(
+                    'Womtool argument with tab/newline is not allowed. {a}'.format(
+                        a=arg
+                    )
+                )
+        with self._lock:
+            if not self.is_alive:
+                self._start()
+            try:
+                self._proc.stdin.write(('\t'.join(args) + '\n').encode())
+                self._proc.stdin.flush()
+            except OSError as e:
+                raise WomtoolWorkerError(
+                    'Failed to send a request to Womtool worker.'
+                ) from e
+            return self._read_response()
+
+    def stop(self):
+        with self._lock:
+            if self._proc is None:
+                return
+            try:
+                self._proc.stdin.close()
+                self._proc.wait(timeout=10)
+            except Exception:
+                self._proc.kill()
+                self._proc.wait()
+            self._proc = None
+
+    def _start(self):
+        tmp_d = tempfile.mkdtemp(prefix='caper_womtool_worker_')
+        try:
+            src = os.path.join(
+                tmp_d, '{name}.java'.format(name=WomtoolWorker.WORKER_CLASS_NAME)
+            )
+            with open(src, 'w') as fp:
+                fp.write(WOMTOOL_WORKER_JAVA_SRC)
+
+            cmd = ['java']
+            if self._java_heap:
+                cmd.append('-Xmx{heap}'.format(heap=self._java_heap))
+            cmd += ['-DLOG_LEVEL=INFO', '-cp', self._womtool, src]
+            logger.info('Starting Womtool worker... {cmd}'.format(cmd=cmd))
+            try:
+                self._proc = Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE)
+            except OSError as e:
+                raise WomtoolWorkerError('Failed to start Womtool worker.') from e
+
+            self._stderr = RingBufferOutputCapture(
+                max_size=WomtoolWorker.DEFAULT_STDERR_MAX_SIZE
+            )
+            Thread(
+                target=WomtoolWorker._drain,
+                args=(self._proc.stderr, self._stderr),
+                daemon=True,
+            ).start()
+
+            rc, msg = self._read_response()
+            if msg != WomtoolWorker.RESPONSE_READY:
+                raise WomtoolWorkerError(
+                    'Unexpected response from Womtool worker. rc={rc}, msg={msg}'.format(
+                        rc=rc, msg=msg
+                    )
+                )
+        except WomtoolWorkerError:
+            self._kill()
+            raise
+        finally:
+            # source is compiled in memory on startup so it's not needed any more
+            shutil.rmtree(tmp_d, ignore_errors=True)
+
+    def _read_response(self):
+        header = self._proc.stdout.readline()
+        try:
+            rc, num_bytes = header.decode().split('\t')
+            rc, num_bytes = int(rc), int(num_bytes)
+        except ValueError:
+            self._kill()
+            raise WomtoolWorkerError(
+                'Womtool worker died or sent an invalid response. '
+                'header={h}, STDERR={stderr}'.format(
+                    h=header, stderr=self._stderr.getvalue() if self._stderr else ''
+                )
+            )
+        return rc, self._proc.stdout.read(num_bytes).decode()
+
+    def _kill(self):
+        if self._proc is not None:
+            self._proc.kill()
+            self._proc.wait()
+            self._proc = None
+
+    @staticmethod
+    def _drain(fileobj, capture):
+        for line in iter(fileobj.readline, b''):
+            capture.write(line.decode(errors='replace'))
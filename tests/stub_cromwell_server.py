@@ -0,0 +1,157 @@
+"""Minimal stub of Cromwell server's REST API for offline tests.
+It keeps track of number of TCP connections made by clients.
+"""
+import json
+import re
+import socket
+import struct
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from urllib.parse import parse_qs, urlparse
+
+RE_METADATA = re.compile(r'^/api/workflows/v1/([^/]+)/metadata$')
+RE_ABORT = re.compile(r'^/api/workflows/v1/([^/]+)/abort$')
+ENDPOINT_SUBMIT = '/api/workflows/v1'
+
+
+class StubCromwellHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.num_connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, obj, status=200):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        with self.server.lock:
+            self.server.num_requests += 1
+
+        if url.path == '/api/workflows/v1/backends':
+            self._send_json({'defaultBackend': 'Local', 'supportedBackends': ['Local']})
+            return
+
+        m = RE_METADATA.match(url.path)
+        if m:
+            wf_id = m.group(1)
+            workflow = self.server.workflows.get(wf_id)
+            if wf_id in self.server.resetting_ids:
+                # close connection without response (TCP RST)
+                self.connection.setsockopt(
+                    socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0)
+                )
+                self.close_connection = True
+            elif wf_id in self.server.failing_ids:
+                self._send_json({'status': 'error'}, status=500)
+            elif workflow is None:
+                self._send_json({'status': 'fail'}, status=404)
+            else:
+                metadata = dict(workflow, calls={})
+                if 'includeKey' in params:
+                    metadata = {
+                        k: v
+                        for k, v in metadata.items()
+                        if k == 'id'
+                        or any(k.startswith(key) for key in params['includeKey'])
+                    }
+                elif 'excludeKey' in params:
+                    metadata = {
+                        k: v
+                        for k, v in metadata.items()
+                        if not any(k.startswith(key) for key in params['excludeKey'])
+                    }
+                self._send_json(metadata)
+            return
+
+        if url.path == '/api/workflows/v1/query':
+            results = list(self.server.workflows.values())
+            if 'id' in params:
+                results = [w for w in results if w['id'] in params['id']]
+            if 'status' in params:
+                results = [w for w in results if w['status'] in params['status']]
+            total = len(results)
+            if 'page' in params:
+                page = int(params['page'][0])
+                page_size = int(params['pageSize'][0])
+                results = results[(page - 1) * page_size : page * page_size]
+            self._send_json({'results': results, 'totalResultsCount': total})
+            return
+
+        self._send_json({'status': 'fail'}, status=404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        with self.server.lock:
+            self.server.num_requests += 1
+
+        if url.path == ENDPOINT_SUBMIT:
+            wf_id = str(uuid.uuid4())
+            with self.server.lock:
+                self.server.submissions.append((time.time(), wf_id, body))
+            self._send_json({'id': wf_id, 'status': 'Submitted'})
+            return
+
+        m = RE_ABORT.match(url.path)
+        if m:
+            self._send_json({'id': m.group(1), 'status': 'Aborting'})
+            return
+        self._send_json({'status': 'fail'}, status=404)
+
+
+class StubCromwellServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, workflows=None, failing_ids=(), resetting_ids=(), port=0):
+        """
+        Args:
+            workflows:
+                List of workflow JSONs (dict with keys `id`, `status`, ...).
+            failing_ids:
+                Workflow IDs to respond with HTTP 500 for metadata requests.
+            resetting_ids:
+                Workflow IDs to reset connection for metadata requests.
+            port:
+                Port for server. 0 means a random free port.
+        """
+        super().__init__(('localhost', port), StubCromwellHandler)
+        self.lock = Lock()
+        self.num_connections = 0
+        self.num_requests = 0
+        self.workflows = {w['id']: w for w in workflows or []}
+        self.failing_ids = set(failing_ids)
+        self.resetting_ids = set(resetting_ids)
+        # list of (time, workflow ID, multipart body) for submitted workflows
+        self.submissions = []
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread = Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
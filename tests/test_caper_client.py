@@ -0,0 +1,116 @@
+import json
+import os
+import time
+
+import pytest
+
+from caper.caper_client import CaperClientSubmit, SubmitRateLimiter
+from caper.womtool_validation_cache import WomtoolValidationCache
+
+from .example_wdl import make_directory_with_wdls
+from .stub_cromwell_server import StubCromwellServer
+
+
+def test_submit_rate_limiter():
+    limiter = SubmitRateLimiter(max_rate=50)
+    t_start = time.monotonic()
+    for _ in range(6):
+        limiter.wait()
+    # first one is not delayed
+    assert time.monotonic() - t_start >= 0.1
+
+    # no limit
+    limiter = SubmitRateLimiter()
+    t_start = time.monotonic()
+    for _ in range(100):
+        limiter.wait()
+    assert time.monotonic() - t_start < 0.1
+
+
+def test_submit_batch(tmp_path):
+    make_directory_with_wdls(str(tmp_path / 'wdl'))
+    wdl = str(tmp_path / 'wdl' / 'main.wdl')
+    inputs_list = []
+    for i in range(5):
+        inputs = str(tmp_path / 'sample{i}.json'.format(i=i))
+        with open(inputs, 'w') as fp:
+            json.dump({'main.input_s': 'sample{i}'.format(i=i)}, fp)
+        inputs_list.append(inputs)
+    # this one fails but it should not stop submitting others
+    inputs_list.insert(2, str(tmp_path / 'not_exists.json'))
+
+    server = StubCromwellServer().start()
+    try:
+        c = CaperClientSubmit(
+            local_loc_dir=str(tmp_path / 'loc'),
+            server_hostname='localhost',
+            server_port=server.port,
+        )
+        work_dir = str(tmp_path / 'work')
+        result = c.submit_batch(
+            wdl,
+            inputs_list,
+            backend='Local',
+            ignore_womtool=True,
+            work_dir=work_dir,
+            num_threads=3,
+            max_submit_rate=20,
+        )
+    finally:
+        server.stop()
+
+    assert len(result) == 6
+    assert result[2] is None
+    submitted = [r['id'] for r in result if r]
+    assert len(submitted) == 5
+    assert sorted(submitted) == sorted(wf_id for _, wf_id, _ in server.submissions)
+
+    # rate limit
+    times = sorted(t for t, _, _ in server.submissions)
+    assert times[-1] - times[0] >= 4 * 0.05 * 0.9
+
+    # imports ZIP is made once for all workflows
+    assert os.path.exists(os.path.join(work_dir, 'imports.zip'))
+    for i in (0, 1, 3, 4, 5):
+        assert not os.path.exists(os.path.join(work_dir, str(i), 'imports.zip'))
+        with open(os.path.join(work_dir, str(i), 'labels.json')) as fp:
+            labels = json.load(fp)
+        assert labels['caper-str-label'] == 'sample{j}'.format(j=i if i < 2 else i - 1)
+    assert all(b'sample' in body for _, _, body in server.submissions)
+
+
+@pytest.mark.parametrize('use_womtool_worker', [True, False])
+def test_submit_batch_womtool(tmp_path, womtool, use_womtool_worker):
+    """Each input JSON is validated with Womtool (on a worker if used).
+    Passed validations are counted with a validation cache.
+    """
+    make_directory_with_wdls(str(tmp_path / 'wdl'))
+    wdl = str(tmp_path / 'wdl' / 'main.wdl')
+    inputs_list = []
+    for i in range(3):
+        inputs = str(tmp_path / 'sample{i}.json'.format(i=i))
+        with open(inputs, 'w') as fp:
+            json.dump({'main.input_s': 'sample{i}'.format(i=i)}, fp)
+        inputs_list.append(inputs)
+
+    server = StubCromwellServer().start()
+    try:
+        cache = WomtoolValidationCache(cache_dir=str(tmp_path / 'cache'))
+        c = CaperClientSubmit(
+            local_loc_dir=str(tmp_path / 'loc'),
+            server_hostname='localhost',
+            server_port=server.port,
+            womtool=womtool,
+            womtool_validation_cache=cache,
+            use_womtool_worker=use_womtool_worker,
+        )
+        result = c.submit_batch(wdl, inputs_list, backend='Local', num_threads=3)
+    finally:
+        server.stop()
+
+    assert all(result)
+    # WDL/imports once and then each input JSON
+    assert len(os.listdir(cache.cache_dir)) == 4
+    assert c._cromwell.use_womtool_worker == use_womtool_worker
+    # stopped at the end of batch
+    assert c._cromwell._womtool_worker is None
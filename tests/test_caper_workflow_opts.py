@@ -4,6 +4,7 @@ from textwrap import dedent
 
 import pytest
 
+from caper.caper_wdl_parser import CaperWDLParser
 from caper.caper_workflow_opts import CaperWorkflowOpts
 from caper.cromwell_backend import BACKEND_AWS, BACKEND_GCP
 
@@ -200,6 +201,50 @@ def test_create_file_docker(tmp_path):
     assert dra_local2['docker'] == 'ubuntu:16'
 
 
+def test_find_docker_singularity_with_wdl_parser(tmp_path):
+    wdl = tmp_path / 'docker.wdl'
+    wdl.write_text(
+        dedent(
+            """\
+            version 1.0
+            workflow test_docker {
+                meta {
+                    caper_docker: "ubuntu:latest"
+                }
+            }
+        """
+        )
+    )
+    wdl_parser = CaperWDLParser(str(wdl))
+    # parsed WDL is reused
+    os.remove(str(wdl))
+
+    co = CaperWorkflowOpts()
+    assert co.find_docker_singularity(
+        str(wdl), backend=BACKEND_GCP, wdl_parser=wdl_parser
+    ) == ('ubuntu:latest', None)
+    assert co.find_docker_singularity(
+        str(wdl), backend='my_backend', docker='', wdl_parser=wdl_parser
+    ) == ('ubuntu:latest', None)
+    # nothing to find
+    assert co.find_docker_singularity(str(wdl), backend='my_backend') == (None, None)
+
+    f = co.create_file(
+        directory=str(tmp_path),
+        wdl=str(wdl),
+        backend=BACKEND_GCP,
+        wdl_parser=wdl_parser,
+    )
+    with open(f) as fp:
+        dra = json.load(fp)[CaperWorkflowOpts.DEFAULT_RUNTIME_ATTRIBUTES]
+    assert dra['docker'] == 'ubuntu:latest'
+
+    with pytest.raises(ValueError):
+        co.find_docker_singularity(
+            str(wdl), backend='my_backend', singularity='', wdl_parser=wdl_parser
+        )
+
+
 def test_create_file_singularity(tmp_path):
     """Test with singularity and singularity defined in WDL.
     """
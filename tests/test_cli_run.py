@@ -36,6 +36,7 @@ def test_wrong_subcmd():
         ['--docker', 'ubuntu:latest', '--singularity', 'docker://ubuntu:latest'],
         ['--docker', '--soft-glob-output'],
         ['--docker', 'ubuntu:latest', '--soft-glob-output'],
+        ['--womtool-worker'],
     ],
 )
 def test_mutually_exclusive_params(tmp_path, cmd):
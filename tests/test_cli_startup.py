@@ -0,0 +1,56 @@
+"""Guards against regressions in CLI startup time.
+Scientific stack (numpy, pandas, matplotlib, sklearn) should be imported
+only by subcommands that actually need it (e.g. gcp_res_analysis).
+"""
+import subprocess
+import sys
+
+HEAVY_MODULES = ('numpy', 'pandas', 'matplotlib', 'sklearn')
+
+# budget (in seconds) for caper's own modules,
+# excluding third-party modules that every subcommand needs (e.g. autouri).
+IMPORT_TIME_BUDGET_SEC = 1.0
+
+
+def get_import_times(module):
+    """Runs `python -X importtime -c "import MODULE"`.
+
+    Returns:
+        Dict of {module: (self time in sec, cumulative time in sec)}
+        for all modules imported.
+    """
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    result = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:') :].split('|')
+        result[name.strip()] = (int(self_us) / 1e6, int(cumulative_us) / 1e6)
+    return result
+
+
+def test_cli_does_not_import_heavy_modules():
+    import_times = get_import_times('caper.cli')
+    assert 'caper.cli' in import_times
+    imported = [name for name in import_times if name.split('.')[0] in HEAVY_MODULES]
+    assert not imported
+
+
+def test_cli_import_time_budget():
+    import_times = get_import_times('caper.cli')
+    caper_self_time = sum(
+        self_time
+        for name, (self_time, _) in import_times.items()
+        if name.split('.')[0] == 'caper'
+    )
+    print(
+        'caper.cli import time: total={total:.3f}, caper only={caper:.3f}'.format(
+            total=import_times['caper.cli'][1], caper=caper_self_time
+        )
+    )
+    assert caper_self_time < IMPORT_TIME_BUDGET_SEC
@@ -48,6 +48,28 @@ def test_validate(tmp_path, cromwell, womtool):
     assert c.validate(str(wdl), str(inputs), imports)
 
 
+def test_validate_with_womtool_worker(tmp_path, cromwell, womtool):
+    c = Cromwell(cromwell=cromwell, womtool=womtool, use_womtool_worker=True)
+
+    wdl = tmp_path / 'wrong.wdl'
+    wdl.write_text(WRONG_WDL)
+    assert not c.validate(str(wdl))
+    worker = c._womtool_worker
+    assert worker.is_alive
+
+    make_directory_with_wdls(str(tmp_path / 'successful'))
+    wdl = tmp_path / 'successful' / 'main.wdl'
+    inputs = tmp_path / 'successful' / 'inputs.json'
+    for _ in range(3):
+        assert c.validate(str(wdl), str(inputs))
+    # same JVM is reused
+    assert c._womtool_worker is worker
+    assert c._use_womtool_worker
+
+    c.stop_womtool_worker()
+    assert not worker.is_alive
+
+
 def test_run(tmp_path, cromwell, womtool):
     fileobj_stdout = sys.stdout
 
@@ -1,10 +1,23 @@
+import io
+import json
+import math
 import os
 import sys
+import time
+import tracemalloc
 
+import pytest
 from autouri import AutoURI
 
 from caper.cromwell import Cromwell
-from caper.cromwell_metadata import CromwellMetadata
+from caper.cromwell_metadata import (
+    CallIndex,
+    CromwellMetadata,
+    map_in_order,
+    read_tail,
+    reduce_monitoring_log,
+)
+from caper.monitoring_stats_cache import MonitoringStatsCache
 
 from .example_wdl import make_directory_with_failing_wdls, make_directory_with_wdls
 
@@ -96,3 +109,377 @@ def test_on_failed_workflow(tmp_path, cromwell, womtool):
     assert '* Found failures JSON object' in report
     assert 'NAME=sub.t2_failing' in report
     assert 'INTENTED_ERROR: command not found' in report
+
+
+def make_metadata(workflow_id, num_calls=10, num_shards=3, depth=1):
+    """Makes a metadata JSON object with embedded subworkflows.
+    """
+    calls = {}
+    for i in range(num_calls):
+        call_name = 'main.t{i}'.format(i=i)
+        calls[call_name] = [
+            {
+                'shardIndex': shard_idx,
+                'attempt': 1,
+                'executionStatus': 'Done',
+                'callRoot': '/root/{id}/call-t{i}/shard-{j}'.format(
+                    id=workflow_id, i=i, j=shard_idx
+                ),
+                'stderr': '/root/{id}/call-t{i}/shard-{j}/stderr'.format(
+                    id=workflow_id, i=i, j=shard_idx
+                ),
+                'commandLine': 'echo hello world; ' * 100,
+                'inputs': {
+                    'fastqs': ['/data/{k}.fastq.gz'.format(k=k) for k in range(20)]
+                },
+            }
+            for shard_idx in range(num_shards)
+        ]
+    if depth:
+        calls['main.sub'] = [
+            {
+                'shardIndex': -1,
+                'subWorkflowMetadata': make_metadata(
+                    workflow_id + '-sub', num_calls, num_shards, depth - 1
+                ),
+            }
+        ]
+    return {
+        'id': workflow_id,
+        'status': 'Succeeded',
+        'calls': calls,
+        'outputs': {'out': 1.5},
+        'workflowRoot': '/root/{id}'.format(id=workflow_id),
+    }
+
+
+def test_streaming(tmp_path):
+    metadata = make_metadata('f9c26f2e-f550-4748-a650-5d0d4cab9f3a', depth=2)
+    metadata_file = tmp_path / 'metadata.json'
+    metadata_file.write_text(json.dumps(metadata, indent=4))
+
+    cm = CromwellMetadata(metadata)
+    cm_streaming = CromwellMetadata(str(metadata_file), streaming=True)
+
+    assert cm_streaming.calls is None
+    assert cm_streaming.workflow_id == cm.workflow_id
+    assert cm_streaming.workflow_status == 'Succeeded'
+    assert cm_streaming.workflow_root == cm.workflow_root
+    assert cm_streaming.data['outputs'] == {'out': 1.5}
+
+    recursed_calls = list(cm.recursed_calls)
+    assert len(recursed_calls) == 90
+    assert list(cm_streaming.recursed_calls) == recursed_calls
+    # can recurse again
+    assert len(list(cm_streaming.recursed_calls)) == 90
+    assert cm_streaming.troubleshoot(show_completed_task=True) == cm.troubleshoot(
+        show_completed_task=True
+    )
+
+
+def test_streaming_remote_file():
+    with pytest.raises(ValueError):
+        CromwellMetadata('gs://some-bucket/metadata.json', streaming=True)
+
+
+def test_streaming_peak_memory(tmp_path):
+    """Compares peak memory of loading the whole metadata JSON
+    with streaming calls.
+    """
+    metadata = make_metadata(
+        'f9c26f2e-f550-4748-a650-5d0d4cab9f3a', num_calls=40, num_shards=10, depth=3
+    )
+    metadata_file = tmp_path / 'metadata.json'
+    metadata_file.write_text(json.dumps(metadata))
+    del metadata
+
+    def count_calls(cm):
+        return sum(1 for _ in cm.recursed_calls)
+
+    tracemalloc.start()
+    num_calls = count_calls(CromwellMetadata(str(metadata_file)))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    num_calls_streaming = count_calls(
+        CromwellMetadata(str(metadata_file), streaming=True)
+    )
+    _, peak_streaming = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        'file size={size}, peak memory: json.loads={peak}, streaming={streaming}'.format(
+            size=metadata_file.stat().st_size, peak=peak, streaming=peak_streaming
+        )
+    )
+    assert num_calls == num_calls_streaming
+    assert peak_streaming * 4 < peak
+
+
+def test_call_index():
+    metadata = make_metadata('f9c26f2e-f550-4748-a650-5d0d4cab9f3a', depth=1)
+    metadata['status'] = 'Failed'
+    metadata['calls']['main.t0'][1]['executionStatus'] = 'Failed'
+    metadata['calls']['main.sub'][0]['subWorkflowMetadata']['calls']['main.t0'][2][
+        'executionStatus'
+    ] = 'Failed'
+    cm = CromwellMetadata(metadata)
+
+    call_index = cm.call_index
+    # cached
+    assert cm.call_index is call_index
+    assert len(call_index) == 60
+    assert call_index.column('call')[0] is metadata['calls']['main.t0'][0]
+
+    failed = call_index.find(status='Failed')
+    assert [call_index.column('shard_idx')[i] for i in failed] == [1, 2]
+    assert [call_index.column('parent_call_names')[i] for i in failed] == [
+        tuple(),
+        ('main.sub',),
+    ]
+    assert len(call_index.find(call_name='main.t1', shard_idx=(0, 1))) == 4
+    assert len(call_index.find(exclude_status='Done')) == 2
+    assert call_index.find(call_name='main.sub') == []
+
+    rows = list(call_index.rows(failed))
+    assert rows[1][0] == 'main.t0'
+    assert rows[1][1]['executionStatus'] == 'Failed'
+
+    assert cm.workflow_root == '/root/f9c26f2e-f550-4748-a650-5d0d4cab9f3a'
+    troubleshoot = cm.troubleshoot()
+    assert troubleshoot.count('STATUS=Failed') == 2
+    assert 'STATUS=Done' not in troubleshoot
+
+
+def test_call_index_streaming(tmp_path):
+    metadata = make_metadata('f9c26f2e-f550-4748-a650-5d0d4cab9f3a', depth=1)
+    del metadata['workflowRoot']
+    metadata_file = tmp_path / 'metadata.json'
+    metadata_file.write_text(json.dumps(metadata))
+
+    cm = CromwellMetadata(metadata)
+    cm_streaming = CromwellMetadata(str(metadata_file), streaming=True)
+    call_index = cm_streaming.call_index
+    assert set(call_index.column('call')) == {None}
+    for col in CallIndex.COLUMNS[:-1]:
+        assert call_index.column(col) == cm.call_index.column(col)
+
+    # guessed from callRoot of calls
+    assert cm_streaming.workflow_root == cm.workflow_root
+
+
+def test_troubleshoot_num_threads(tmp_path):
+    metadata = make_metadata('f9c26f2e-f550-4748-a650-5d0d4cab9f3a', depth=1)
+    metadata['status'] = 'Failed'
+    for call_name, call, _ in CromwellMetadata(metadata).recursed_calls:
+        call['executionStatus'] = 'Failed'
+        stderr = tmp_path / '{name}.{shard}.{n}.stderr'.format(
+            name=call_name, shard=call['shardIndex'], n=len(call['stderr'])
+        )
+        stderr.write_text('error in {s}\n'.format(s=stderr.name))
+        call['stderr'] = str(stderr)
+
+    report = CromwellMetadata(metadata).troubleshoot(num_threads=1)
+    assert report.count('STDERR_CONTENTS=') == 60
+    assert CromwellMetadata(metadata).troubleshoot(num_threads=8) == report
+    # order of calls is kept
+    stderrs = [
+        call['stderr'] for _, call, _ in CromwellMetadata(metadata).recursed_calls
+    ]
+    positions = [report.index('error in ' + os.path.basename(s)) for s in stderrs]
+    assert positions == sorted(positions)
+
+
+def test_map_in_order():
+    consumed = []
+
+    def items():
+        for i in range(100):
+            consumed.append(i)
+            yield i
+
+    def fn(i):
+        time.sleep(0.001 * (i % 3))
+        return i * 2
+
+    results = []
+    for result in map_in_order(fn, items(), num_threads=2, max_pending_per_thread=3):
+        # at most 2 * 3 items are in flight
+        assert len(consumed) - len(results) <= 6
+        results.append(result)
+    assert results == [i * 2 for i in range(100)]
+
+
+def test_read_tail(tmp_path):
+    log = tmp_path / 'stderr'
+    lines = ['line {i} é\n'.format(i=i) for i in range(1000)]
+    log.write_text(''.join(lines))
+
+    assert read_tail(str(log)) == (''.join(lines), False)
+    assert read_tail(str(log), num_bytes=len(log.read_bytes())) == (
+        ''.join(lines),
+        False,
+    )
+
+    # partial first line is dropped
+    contents, truncated = read_tail(str(log), num_bytes=100)
+    assert truncated
+    assert contents == ''.join(lines[-len(contents.splitlines()) :])
+    assert len(contents.encode()) <= 100
+
+    assert read_tail(str(log), num_bytes=100, num_lines=2) == (
+        ''.join(lines[-2:]),
+        True,
+    )
+    assert read_tail(str(log), num_lines=3) == (''.join(lines[-3:]), True)
+
+
+def test_troubleshoot_tail(tmp_path):
+    metadata = make_metadata('f9c26f2e-f550-4748-a650-5d0d4cab9f3a', depth=0)
+    metadata['status'] = 'Failed'
+    call = metadata['calls']['main.t0'][0]
+    call['executionStatus'] = 'Failed'
+    stderr = tmp_path / 'stderr'
+    stderr.write_text('verbose log\n' * 100000 + 'real error\n')
+    call['stderr'] = str(stderr)
+
+    cm = CromwellMetadata(metadata)
+    report = cm.troubleshoot(tail_bytes=1000)
+    assert 'STDERR_CONTENTS= (tail only)\n' in report
+    assert report.endswith('verbose log\nreal error\n\n')
+    assert len(report) < 5000
+
+    assert cm.troubleshoot(tail_lines=1).endswith('(tail only)\nreal error\n\n')
+    report = cm.troubleshoot(tail_bytes=None)
+    assert 'STDERR_CONTENTS=\n' in report
+    assert report.count('verbose log') == 100000
+
+
+def test_gcp_monitor_num_threads(gcp_res_analysis_metadata):
+    cm = CromwellMetadata(gcp_res_analysis_metadata)
+
+    file_size_cache = {}
+    result = cm.gcp_monitor(num_threads=1, file_size_cache=file_size_cache)
+    assert file_size_cache
+
+    # shared cache is reused and order of calls is kept
+    cached = dict(file_size_cache)
+    assert cm.gcp_monitor(num_threads=8, file_size_cache=file_size_cache) == result
+    assert file_size_cache == cached
+
+
+def test_gcp_monitor_stats_cache(tmp_path, gcp_res_analysis_metadata):
+    cm = CromwellMetadata(gcp_res_analysis_metadata)
+    stats_cache = MonitoringStatsCache(cache_dir=str(tmp_path))
+
+    result = cm.gcp_monitor(stats_cache=stats_cache)
+    assert stats_cache.size > 0
+    assert cm.gcp_monitor(stats_cache=stats_cache) == result
+    assert cm.gcp_monitor() == result
+
+
+MONITORING_LOG = (
+    'timestamp\tcpu_pct\tmem\tdisk\n'
+    '2020-10-01T12:00:00\t10.5\t1000\t2000\n'
+    '2020-10-01T12:00:05\t90.0\t3000\t2000\n'
+    '2020-10-01T12:00:10\t50.25\t2000\t4000\n'
+)
+
+
+def test_reduce_monitoring_log():
+    import pandas as pd
+
+    stat_methods = ('mean', 'std', 'max', 'min', 'last', 'median', 'sum', 'sem')
+    result = reduce_monitoring_log(MONITORING_LOG, (0,), stat_methods)
+
+    dataframe = pd.read_csv(io.StringIO(MONITORING_LOG), delimiter='\t')
+    for col_name in ('cpu_pct', 'mem', 'disk'):
+        for stat_method in stat_methods:
+            if stat_method == 'last':
+                expected = dataframe[col_name].iloc[-1].item()
+            else:
+                expected = getattr(dataframe[col_name], stat_method)().item()
+            val = result[stat_method][col_name]
+            assert val == pytest.approx(expected)
+            # Python type
+            assert type(val) is type(expected)
+    assert 'timestamp' not in result['mean']
+
+    # single row: std is NaN as in pandas
+    result = reduce_monitoring_log(
+        '\n'.join(MONITORING_LOG.split('\n')[:2]), (0,), ('std', 'last')
+    )
+    assert math.isnan(result['std']['mem'])
+    assert result['last'] == {'cpu_pct': 10.5, 'mem': 1000, 'disk': 2000}
+
+    # header only
+    result = reduce_monitoring_log(MONITORING_LOG.split('\n')[0], (0,), ('max',))
+    assert result == {'max': {'cpu_pct': None, 'mem': None, 'disk': None}}
+
+
+def test_reduce_monitoring_log_like_pandas():
+    """Compares with pandas for logs with truncated rows and
+    float columns of whole numbers.
+    """
+    import pandas as pd
+
+    stat_methods = ('mean', 'max', 'min', 'last', 'sum', 'count')
+    logs = [
+        # float column with whole numbers only
+        'timestamp\tcpu_pct\tmem\n0\t90.0\t1000\n5\t80.0\t2000\n',
+        # truncated last line of a running/preempted task
+        MONITORING_LOG + '2020-10-01T12:00:15\t30.5',
+        MONITORING_LOG + '2020-10-01T12:00:15\t30.5\t10',
+    ]
+    for log in logs:
+        result = reduce_monitoring_log(log, (0,), stat_methods)
+        dataframe = pd.read_csv(io.StringIO(log), delimiter='\t')
+        for col_name in dataframe.columns[1:]:
+            for stat_method in stat_methods:
+                if stat_method == 'last':
+                    expected = dataframe[col_name].iloc[-1].item()
+                else:
+                    expected = getattr(dataframe[col_name], stat_method)().item()
+                val = result[stat_method][col_name]
+                if math.isnan(expected):
+                    assert math.isnan(val)
+                else:
+                    assert val == pytest.approx(expected)
+                assert type(val) is type(expected)
+
+
+def test_benchmark_reduce_monitoring_log():
+    import pandas as pd
+
+    log = MONITORING_LOG + ''.join(
+        '2020-10-01T12:00:00\t{cpu}\t{mem}\t{disk}\n'.format(
+            cpu=i % 100, mem=i * 1000, disk=i * 2000
+        )
+        for i in range(10000)
+    )
+    stat_methods = CromwellMetadata.DEFAULT_GCP_MONITOR_STAT_METHODS
+
+    t_start = time.perf_counter()
+    for _ in range(10):
+        dataframe = pd.read_csv(io.StringIO(log), delimiter='\t')
+        for i, col_name in enumerate(dataframe.columns):
+            if i == 0:
+                continue
+            for stat_method in stat_methods:
+                if stat_method == 'last':
+                    last_idx = dataframe.tail(1).index.item()
+                    dataframe[col_name][last_idx]
+                else:
+                    getattr(dataframe[col_name], stat_method)()
+    elapsed_pandas = time.perf_counter() - t_start
+
+    t_start = time.perf_counter()
+    for _ in range(10):
+        reduce_monitoring_log(log, (0,), stat_methods)
+    elapsed = time.perf_counter() - t_start
+    print(
+        'pandas={pandas:.3f}s, numpy={numpy:.3f}s'.format(
+            pandas=elapsed_pandas, numpy=elapsed
+        )
+    )
@@ -2,13 +2,18 @@ import sys
 import time
 
 import pytest
+import requests
 
 from caper.caper_labels import CaperLabels
 from caper.cromwell import Cromwell
+from caper.cromwell_metadata import CromwellMetadata
 from caper.cromwell_rest_api import CromwellRestAPI, has_wildcard, is_valid_uuid
 from caper.wdl_parser import WDLParser
 
 from .example_wdl import make_directory_with_wdls
+from .stub_cromwell_server import StubCromwellServer
+
+NUM_REQUESTS_BENCHMARK = 200
 
 
 @pytest.mark.parametrize(
@@ -48,6 +53,179 @@ def test_has_wildcard(test_input, expected):
     assert has_wildcard(test_input) == expected
 
 
+@pytest.fixture
+def stub_server():
+    server = StubCromwellServer().start()
+    yield server
+    server.stop()
+
+
+def test_pooled_session_reuses_connection(stub_server):
+    cra = CromwellRestAPI(hostname='localhost', port=stub_server.port)
+    for _ in range(10):
+        assert cra.get_default_backend() == 'Local'
+    cra.close()
+
+    assert stub_server.num_requests == 10
+    # keep-alive: all sequential requests go through a single connection
+    assert stub_server.num_connections == 1
+
+
+def test_pooled_session_timeout(stub_server):
+    cra = CromwellRestAPI(hostname='localhost', port=stub_server.port, timeout=5.0)
+    assert cra.get_backends()['supportedBackends'] == ['Local']
+    cra.close()
+
+
+def test_benchmark_pooled_session(stub_server):
+    """Compares requests/sec of one-shot requests (new connection per request)
+    against pooled keep-alive session.
+    """
+    url = 'http://localhost:{port}{endpoint}'.format(
+        port=stub_server.port, endpoint=CromwellRestAPI.ENDPOINT_BACKEND
+    )
+    t_start = time.perf_counter()
+    for _ in range(NUM_REQUESTS_BENCHMARK):
+        requests.get(url, headers={'accept': 'application/json'}).json()
+    rps_before = NUM_REQUESTS_BENCHMARK / (time.perf_counter() - t_start)
+    num_connections_before = stub_server.num_connections
+
+    cra = CromwellRestAPI(hostname='localhost', port=stub_server.port)
+    t_start = time.perf_counter()
+    for _ in range(NUM_REQUESTS_BENCHMARK):
+        cra.get_backends()
+    rps_after = NUM_REQUESTS_BENCHMARK / (time.perf_counter() - t_start)
+    num_connections_after = stub_server.num_connections - num_connections_before
+    cra.close()
+
+    print(
+        'requests/sec: one-shot={before:.1f}, pooled={after:.1f}'.format(
+            before=rps_before, after=rps_after
+        )
+    )
+    assert num_connections_before == NUM_REQUESTS_BENCHMARK
+    assert num_connections_after == 1
+
+
+@pytest.mark.parametrize('num_threads', [1, 4])
+def test_get_metadata_num_threads(num_threads):
+    workflows = [
+        {'id': 'abcdef00-0000-4000-8000-{i:012x}'.format(i=i), 'status': 'Succeeded'}
+        for i in range(20)
+    ]
+    workflow_ids = [w['id'] for w in workflows]
+    failing_id = workflow_ids[5]
+    server = StubCromwellServer(workflows=workflows, failing_ids=[failing_id]).start()
+    try:
+        cra = CromwellRestAPI(hostname='localhost', port=server.port)
+        result = cra.get_metadata(workflow_ids, num_threads=num_threads)
+        cra.close()
+    finally:
+        server.stop()
+
+    # failed one is skipped and order is kept
+    assert [m['id'] for m in result] == [
+        wf_id for wf_id in workflow_ids if wf_id != failing_id
+    ]
+
+
+def test_get_metadata_connection_reset():
+    workflows = [
+        {'id': 'abcdef00-0000-4000-8000-{i:012x}'.format(i=i), 'status': 'Succeeded'}
+        for i in range(8)
+    ]
+    workflow_ids = [w['id'] for w in workflows]
+    resetting_id = workflow_ids[3]
+    server = StubCromwellServer(
+        workflows=workflows, resetting_ids=[resetting_id]
+    ).start()
+    try:
+        cra = CromwellRestAPI(hostname='localhost', port=server.port)
+        result = cra.get_metadata(workflow_ids, num_threads=4)
+        cra.close()
+    finally:
+        server.stop()
+
+    # one connection reset does not abort others
+    assert [m['id'] for m in result] == [
+        wf_id for wf_id in workflow_ids if wf_id != resetting_id
+    ]
+
+
+def test_get_metadata_include_exclude_keys():
+    workflow_id = 'abcdef00-0000-4000-8000-000000000000'
+    workflow = {
+        'id': workflow_id,
+        'status': 'Failed',
+        'failures': [{'message': 'error'}],
+        'submittedFiles': {'workflow': 'a' * 1000},
+    }
+    server = StubCromwellServer(workflows=[workflow]).start()
+    try:
+        cra = CromwellRestAPI(hostname='localhost', port=server.port)
+        m = cra.get_metadata(
+            [workflow_id], include_keys=CromwellMetadata.TROUBLESHOOT_KEYS
+        )[0]
+        assert m == {
+            'id': workflow_id,
+            'status': 'Failed',
+            'failures': [{'message': 'error'}],
+        }
+
+        m = cra.get_metadata([workflow_id], exclude_keys=['submittedFiles'])[0]
+        assert 'submittedFiles' not in m
+        assert m['status'] == 'Failed'
+
+        with pytest.raises(ValueError):
+            cra.get_metadata(
+                [workflow_id], include_keys=['status'], exclude_keys=['calls']
+            )
+        cra.close()
+    finally:
+        server.stop()
+
+
+def test_find_with_wildcard_paging():
+    workflows = [
+        {
+            'id': 'abcdef00-0000-4000-8000-{i:012x}'.format(i=i),
+            'status': 'Running' if i % 2 else 'Succeeded',
+            'labels': {'caper-str-label': 'sample{i}'.format(i=i)},
+        }
+        for i in range(25)
+    ]
+    server = StubCromwellServer(workflows=workflows).start()
+    try:
+        cra = CromwellRestAPI(hostname='localhost', port=server.port)
+
+        # all workflows are found across 3 pages
+        result = cra.find_with_wildcard(workflow_ids=['abcdef00-*'], page_size=10)
+        assert [w['id'] for w in result] == [w['id'] for w in workflows]
+        assert server.num_requests == 3
+
+        # matching by labels with wildcard
+        result = cra.find(labels=[('caper-str-label', 'sample1?')])
+        assert [w['labels']['caper-str-label'] for w in result] == [
+            'sample{i}'.format(i=i) for i in range(10, 20)
+        ]
+
+        # server-side filtering by status
+        result = cra.find_with_wildcard(
+            workflow_ids=['*'], statuses=['Running'], page_size=10
+        )
+        assert len(result) == 12
+        assert all(w['status'] == 'Running' for w in result)
+
+        # first match is yielded after retrieving the first page only
+        num_requests = server.num_requests
+        it = cra.iter_find(workflow_ids=['*'])
+        next(it)
+        assert server.num_requests == num_requests + 1
+        cra.close()
+    finally:
+        server.stop()
+
+
 def test_all(tmp_path, cromwell, womtool):
     """Test Cromwell.server() method, which returns a Thread object.
     """
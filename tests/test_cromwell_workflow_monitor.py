@@ -0,0 +1,363 @@
+import re
+import time
+from threading import Event
+
+from caper.cromwell_workflow_monitor import (
+    CromwellWorkflowMonitor,
+    MetadataWriteQueue,
+    TaskStateTable,
+)
+
+
+def test_metadata_write_queue_merge():
+    written = []
+    release = Event()
+
+    def write_fn(workflow_id):
+        release.wait()
+        written.append(workflow_id)
+
+    q = MetadataWriteQueue(write_fn, num_threads=2, delay=0.1)
+    q.start()
+    for _ in range(10):
+        q.put('a')
+    q.put('b')
+    assert q.queue_depth == 2
+    assert q.stats['merged'] == 9
+
+    # request while being written is deferred
+    time.sleep(0.3)
+    assert q.stats['in_progress'] == 2
+    q.put('a')
+    q.put('a')
+    assert q.stats['deferred'] == 1
+
+    release.set()
+    q.stop(wait=True)
+    assert sorted(written) == ['a', 'a', 'b']
+    assert q.stats['written'] == 3
+    assert q.queue_depth == 0
+
+
+def test_metadata_write_queue_retry():
+    trials = []
+
+    def write_fn(workflow_id):
+        trials.append(time.time())
+        if len(trials) < 3:
+            raise ValueError('Metadata is not ready.')
+
+    q = MetadataWriteQueue(write_fn, num_threads=1, delay=0.05, max_retry=3)
+    q.start()
+    t_start = time.time()
+    q.put('a')
+    while q.stats['written'] + q.stats['failed'] == 0:
+        time.sleep(0.01)
+        assert time.time() - t_start < 5.0
+    q.stop()
+
+    assert len(trials) == 3
+    assert q.stats['written'] == 1
+    # backoff: 0.05 -> 0.1 -> 0.2
+    assert trials[2] - trials[1] > trials[1] - trials[0]
+
+
+def test_metadata_write_queue_give_up():
+    def write_fn(workflow_id):
+        raise ValueError('Metadata is not ready.')
+
+    q = MetadataWriteQueue(write_fn, num_threads=1, delay=0.01, max_retry=2)
+    q.start()
+    q.put('a')
+    t_start = time.time()
+    while not q.stats['failed']:
+        time.sleep(0.01)
+        assert time.time() - t_start < 5.0
+    q.stop()
+    assert q.stats['written'] == 0
+
+
+def test_metadata_write_queue_stop_wait_timeout():
+    written = []
+    release = Event()
+
+    def write_fn(workflow_id):
+        release.wait()
+        written.append(workflow_id)
+
+    q = MetadataWriteQueue(write_fn, num_threads=1, delay=10.0)
+    q.start()
+    q.put('a')
+    q.put('b')
+    # stop(wait=True) does not wait for delay of pending workflows
+    release.set()
+    q.stop(wait=True, timeout=5.0)
+    assert sorted(written) == ['a', 'b']
+
+    release.clear()
+    q = MetadataWriteQueue(write_fn, num_threads=1, delay=0.0)
+    q.start()
+    q.put('c')
+    q.put('d')
+    t_start = time.time()
+    q.stop(wait=True, timeout=0.2)
+    assert time.time() - t_start < 5.0
+    assert q.queue_depth == 0
+    release.set()
+    assert 'd' not in written
+
+
+def test_update_does_not_block_on_writing_metadata():
+    wm = CromwellWorkflowMonitor(is_server=True, auto_write_metadata=True)
+    release = Event()
+    written = []
+
+    def retrieve_and_write_metadata(workflow_id):
+        # mimic slow REST API/storage I/O
+        release.wait()
+        written.append(workflow_id)
+
+    wm._metadata_write_queue._write_fn = retrieve_and_write_metadata
+    wm._metadata_write_queue._delay = 0.0
+
+    workflow_id = 'f9c26f2e-f550-4748-a650-5d0d4cab9f3a'
+    t_start = time.time()
+    wm.update(
+        'workflow {id} submitted\n'
+        'WorkflowActor-{id} is in a terminal state\n'.format(id=workflow_id)
+    )
+    assert time.time() - t_start < 1.0
+
+    release.set()
+    wm.stop(wait=True)
+    assert written == [workflow_id]
+
+
+def make_cromwell_log(num_workflows=20, num_tasks=50, num_noise_lines=20):
+    """Makes a Cromwell server log mimicking a recorded one.
+    Returns a list of lines and a dict of expected final workflow statuses.
+    """
+    lines = [
+        '2020-10-01 12:00:00,000 INFO  - Running with database db.url = jdbc:hsqldb:mem',
+        '2020-10-01 12:00:05,000 INFO  - Cromwell 52 service started on 0:0:0:0:0:0:0:0:8000...',
+    ]
+    expected = {}
+    for i in range(num_workflows):
+        wf_id = 'abcdef{i:02x}-0000-4000-8000-000000000000'.format(i=i)
+        sub_id = 'fedcba{i:02x}-0000-4000-8000-000000000000'.format(i=i)
+        short_id = wf_id[:8]
+        lines += [
+            '2020-10-01 12:00:10,000 INFO  - WorkflowStoreActor: workflow {id} submitted'.format(
+                id=wf_id
+            ),
+            '2020-10-01 12:00:11,000 INFO  - WorkflowManagerActor Successfully '
+            'started WorkflowActor-{id}'.format(id=wf_id),
+            '2020-10-01 12:00:12,000 INFO  - {id}-SubWorkflowActor-SubWorkflow-sub:-1:1 '
+            '[UUID({short})]: Starting sub.t2'.format(id=sub_id, short=sub_id[:8]),
+        ]
+        for j in range(num_tasks):
+            lines += [
+                '2020-10-01 12:01:00,000 INFO  - BackgroundConfigAsyncJobExecutionActor '
+                '[UUID({short})main.t1:{j}:1]: job id: {job}'.format(
+                    short=short_id, j=j, job=1000 + j
+                ),
+                '2020-10-01 12:01:01,000 INFO  - BackgroundConfigAsyncJobExecutionActor '
+                '[UUID({short})main.t1:{j}:1]: Status change from - to '
+                'WaitingForReturnCode'.format(short=short_id, j=j),
+            ]
+            for _ in range(num_noise_lines):
+                lines.append(
+                    '2020-10-01 12:01:02,000 INFO  - BackgroundConfigAsyncJobExecutionActor '
+                    '[UUID({short})main.t1:{j}:1]: `echo hello > out.txt`'.format(
+                        short=short_id, j=j
+                    )
+                )
+                lines.append(
+                    '2020-10-01 12:01:03,000 INFO  - Assigned new job execution tokens '
+                    'to the following groups: {short}: 1'.format(short=short_id)
+                )
+        if i % 3 == 0:
+            lines.append(
+                '2020-10-01 12:02:00,000 INFO  - Workflow {id} failed (during '
+                'ExecutingWorkflowState): Job main.t1:0:1 exited with return code 1'.format(
+                    id=wf_id
+                )
+            )
+            expected[wf_id] = 'Failed'
+        else:
+            expected[wf_id] = 'Succeeded'
+        lines.append(
+            '2020-10-01 12:02:01,000 INFO  - WorkflowManagerActor '
+            'WorkflowActor-{id} is in a terminal state: WorkflowFailedState'.format(
+                id=wf_id
+            )
+        )
+    return lines, expected
+
+
+def test_update_single_pass_classifier():
+    lines, expected = make_cromwell_log(num_workflows=4, num_tasks=3, num_noise_lines=2)
+    started = []
+    wm = CromwellWorkflowMonitor(
+        is_server=True, on_server_start=lambda: started.append(True)
+    )
+    wm.update('\n'.join(lines) + '\n')
+
+    assert started == [True]
+    assert wm.is_server_started()
+    assert wm._workflow_status_map == expected
+    assert set(wm._subworkflows) == {
+        'fedcba{i:02x}-0000-4000-8000-000000000000'.format(i=i) for i in range(4)
+    }
+
+
+def test_log_line_classifier_groups():
+    classifier = CromwellWorkflowMonitor.LOG_LINE_CLASSIFIER
+    result = list(
+        classifier.classify(
+            'BackgroundConfigAsyncJobExecutionActor [UUID(abcdef01)main.t1:NA:2]: '
+            'Status change from Running to Done'
+        )
+    )
+    assert result == [
+        (
+            CromwellWorkflowMonitor.LOG_LINE_TASK_STATUS_CHANGE,
+            ('abcdef01', 'main.t1', 'NA', '2', 'Running', 'Done'),
+        )
+    ]
+    # prefiltered out
+    assert not list(classifier.classify('Assigned new job execution tokens'))
+
+
+def test_benchmark_replay_cromwell_log():
+    """Replays a Cromwell log and compares throughput (lines/sec)
+    with a naive parser which splits a chunk for each category and
+    runs all regexes on each line.
+    """
+    lines, expected = make_cromwell_log()
+    chunk = '\n'.join(lines) + '\n'
+    regexes = [
+        CromwellWorkflowMonitor.RE_CROMWELL_SERVER_START,
+        *[t.regex for t in CromwellWorkflowMonitor.ALL_STATUS_TRANSITIONS],
+        CromwellWorkflowMonitor.RE_SUBWORKFLOW_FOUND,
+        CromwellWorkflowMonitor.RE_TASK_START,
+        CromwellWorkflowMonitor.RE_TASK_CALL_CACHED,
+        CromwellWorkflowMonitor.RE_TASK_STATUS_CHANGE,
+    ]
+
+    t_start = time.perf_counter()
+    for _ in range(4):
+        chunk.split('\n')
+    for line in chunk.split('\n'):
+        for regex in regexes:
+            re.findall(regex, line)
+    elapsed_naive = time.perf_counter() - t_start
+
+    wm = CromwellWorkflowMonitor()
+    t_start = time.perf_counter()
+    wm.update(chunk)
+    elapsed = time.perf_counter() - t_start
+
+    print(
+        'lines/sec: naive={naive:.0f}, single-pass={single:.0f}'.format(
+            naive=len(lines) / elapsed_naive, single=len(lines) / elapsed
+        )
+    )
+    assert wm._workflow_status_map == expected
+
+
+def test_short_id_index_and_eviction():
+    wf_id = 'abcdef01-0000-4000-8000-000000000000'
+    sub_id = 'fedcba01-0000-4000-8000-000000000000'
+    wm = CromwellWorkflowMonitor(terminal_workflow_retention=0.5)
+    wm.update(
+        'workflow {id} submitted\n'
+        '{sub}-SubWorkflowActor-SubWorkflow-sub:-1:1\n'.format(id=wf_id, sub=sub_id)
+    )
+    assert wm._find_workflow_id_from_short_id('abcdef01') == wf_id
+    assert wm._find_workflow_id_from_short_id('fedcba01') == sub_id
+    assert wm._find_workflow_id_from_short_id('00000000') is None
+
+    wm.update(
+        'Workflow actor for {sub} completed with status Succeeded\n'
+        'WorkflowActor-{id} is in a terminal state\n'.format(id=wf_id, sub=sub_id)
+    )
+    # still within retention
+    assert wm._workflow_status_map[wf_id] == 'Succeeded'
+    assert wm._find_workflow_id_from_short_id('abcdef01') == wf_id
+
+    time.sleep(0.6)
+    wm.update('some other line\n')
+    assert not wm._workflow_status_map
+    assert not wm._subworkflows
+    assert not wm._short_id_index
+    assert not wm._terminal_workflows
+
+
+def test_evict_subworkflow_without_terminal_state():
+    wf_id = 'abcdef01-0000-4000-8000-000000000000'
+    sub_id = 'fedcba01-0000-4000-8000-000000000000'
+    running_sub_id = 'fedcba02-0000-4000-8000-000000000000'
+    wm = CromwellWorkflowMonitor(terminal_workflow_retention=0.5)
+    wm.update(
+        'workflow {id} submitted\n'
+        '{sub}-SubWorkflowActor-SubWorkflow-sub:-1:1\n'
+        '{running_sub}-SubWorkflowActor-SubWorkflow-sub:-1:1\n'
+        'started WorkflowActor-{running_sub}\n'.format(
+            id=wf_id, sub=sub_id, running_sub=running_sub_id
+        )
+    )
+    assert set(wm._subworkflows) == {sub_id, running_sub_id}
+
+    time.sleep(0.6)
+    wm.update('some other line\n')
+    # subworkflow's terminal state is never caught in the log
+    assert set(wm._subworkflows) == {running_sub_id}
+    assert wm._find_workflow_id_from_short_id('fedcba01') is None
+    # parent workflow without a terminal state is kept
+    assert wm._find_workflow_id_from_short_id('abcdef01') == wf_id
+    assert wm._find_workflow_id_from_short_id('fedcba02') == running_sub_id
+
+
+def test_task_state_table():
+    table = TaskStateTable()
+    table.update('a', 'main.t1', 0, 1, 'Running', '1000')
+    table.update('a', 'main.t1', 0, 1, 'Done')
+    table.update('a', 'main.t1', 1, 1, 'Running', '1001')
+    table.update('a', 'main.t1', 1, 1, 'Failed')
+    table.update('a', 'main.t1', 1, 2, 'Running', '1002')
+    table.update('b', 'main.t2', -1, 1, 'Running', '2000')
+    assert len(table) == 4
+
+    task = table.get('a', 'main.t1', 0, 1)
+    assert task.status == 'Done'
+    # job_id is kept
+    assert task.job_id == '1000'
+    assert table.get('a', 'main.t1', 2, 1) is None
+
+    assert len(table.find(workflow_id='a')) == 3
+    assert len(table.find(status='Running')) == 2
+    assert [t.job_id for t in table.find(task_name='main.t2')] == ['2000']
+    # only the latest attempt is counted
+    assert table.count_by_status('a') == {'Done': 1, 'Running': 1}
+
+    table.remove_workflow('a')
+    assert len(table) == 1
+    assert table.count_by_status('a') == {}
+
+
+def test_update_task_state_table():
+    lines, _ = make_cromwell_log(num_workflows=2, num_tasks=3, num_noise_lines=1)
+    changed = []
+    wm = CromwellWorkflowMonitor(on_task_status_change=changed.append)
+    wm.update('\n'.join(lines) + '\n')
+
+    wf_id = 'abcdef01-0000-4000-8000-000000000000'
+    table = wm.task_state_table
+    assert len(table) == 6
+    task = table.get(wf_id, 'main.t1', 2, 1)
+    assert task.status == 'WaitingForReturnCode'
+    assert task.job_id == '1002'
+    assert table.count_by_status(wf_id) == {'WaitingForReturnCode': 3}
+    # two changes (job id, status) for each task
+    assert len(changed) == 12
@@ -0,0 +1,52 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from caper.json_file_cache import JSONFileCache
+
+
+def test_json_file_cache_overwrite_size(tmp_path):
+    cache = JSONFileCache(cache_dir=str(tmp_path), max_size=1000)
+    for _ in range(20):
+        cache.put('a', {'x': 'a' * 100})
+    assert cache.size == os.path.getsize(str(tmp_path / 'a.json'))
+    # not evicted by a drifted size
+    assert cache.get('a') == {'x': 'a' * 100}
+
+    cache.put('a', {'x': 'a'})
+    assert cache.size == os.path.getsize(str(tmp_path / 'a.json'))
+
+
+def test_json_file_cache_concurrent_put(tmp_path):
+    cache = JSONFileCache(cache_dir=str(tmp_path), max_size=1024 * 1024)
+
+    def put(i):
+        cache.put('a', {'i': i})
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(put, range(400)))
+
+    assert cache.get('a')['i'] in range(400)
+    assert os.listdir(str(tmp_path)) == ['a.json']
+    assert cache.size == os.path.getsize(str(tmp_path / 'a.json'))
+
+
+def test_json_file_cache_lazy_size(tmp_path):
+    for i in range(10):
+        f = tmp_path / '{i}.json'.format(i=i)
+        f.write_text('x' * 100)
+        os.utime(str(f), (i, i))
+
+    # directory is not scanned until eviction runs
+    cache = JSONFileCache(cache_dir=str(tmp_path), max_size=1000)
+    assert cache._size is None
+    assert cache.get('0') is None
+    assert cache._size is None
+
+    # writing more than 10% of max_size triggers eviction
+    cache.put('a', 'a' * 200)
+    assert cache._size is not None
+    assert cache.size <= 900
+    assert cache.size == sum(
+        os.path.getsize(str(tmp_path / f)) for f in os.listdir(str(tmp_path))
+    )
+    assert cache.get('a') == 'a' * 200
@@ -0,0 +1,49 @@
+import io
+import json
+
+import pytest
+
+from caper.json_stream import JSONStreamReader
+
+DATA = {
+    'a': 1,
+    'b': [1.5, -2e3, 'x', None, True, False, {}, []],
+    'c': {'d': {'e': 'long string with "quotes", [brackets] and {braces}' * 10}},
+    'f': [],
+    'g': 1234567890,
+}
+
+
+def walk(reader):
+    """Rebuilds a JSON object by walking through containers
+    one item at a time.
+    """
+    ch = reader.peek()
+    if ch == '{':
+        return {key: walk(reader) for key in reader.iter_object()}
+    elif ch == '[':
+        return [walk(reader) for _ in reader.iter_array()]
+    return reader.read_value()
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 7, 1024])
+@pytest.mark.parametrize('indent', [None, 4])
+def test_json_stream_reader(chunk_size, indent):
+    text = json.dumps(DATA, indent=indent)
+    reader = JSONStreamReader(io.StringIO(text), chunk_size=chunk_size)
+    assert walk(reader) == DATA
+
+    reader = JSONStreamReader(io.StringIO(text), chunk_size=chunk_size)
+    result = {}
+    for key in reader.iter_object():
+        if key in ('b', 'c'):
+            reader.skip_value()
+        else:
+            result[key] = reader.read_value()
+    assert result == {'a': 1, 'f': [], 'g': 1234567890}
+
+
+def test_json_stream_reader_truncated():
+    reader = JSONStreamReader(io.StringIO('{"a": [1, 2'), chunk_size=4)
+    with pytest.raises(ValueError):
+        walk(reader)
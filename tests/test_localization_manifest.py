@@ -0,0 +1,257 @@
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+import pytest
+from autouri import AbsPath, AutoURI
+
+from caper.caper_base import (
+    AUTOURI_THREAD_ID_POOL,
+    AutoURIThreadIdPool,
+    CaperBase,
+    LocalizationRecursionError,
+)
+from caper.localization_manifest import LocalizationManifest
+
+
+class CountingHTTPRequestHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def send_header(self, keyword, value):
+        # mimic a server which does not give version info of a file
+        if keyword == 'Last-Modified' and self.server.no_last_modified:
+            return
+        super().send_header(keyword, value)
+
+    def do_GET(self):
+        self.server.requests[self.path] += 1
+        # mimic latency of a remote storage
+        time.sleep(self.server.delay)
+        super().do_GET()
+
+
+@pytest.fixture
+def http_dir(tmp_path):
+    """Serves files on a temporary directory with a local HTTP server.
+    Yields a tuple of (directory, URL prefix, server).
+    server.requests is a Counter of requests for each path.
+    """
+    root = tmp_path / 'http'
+    root.mkdir()
+    server = ThreadingHTTPServer(
+        ('localhost', 0), partial(CountingHTTPRequestHandler, directory=str(root))
+    )
+    server.daemon_threads = True
+    server.requests = Counter()
+    server.delay = 0.0
+    server.no_last_modified = False
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url_prefix = 'http://localhost:{port}'.format(port=server.server_address[1])
+    yield root, url_prefix, server
+    server.shutdown()
+    server.server_close()
+
+
+def test_localization_manifest(tmp_path):
+    src = tmp_path / 'src.txt'
+    src.write_text('hello')
+    loc = tmp_path / 'loc.txt'
+    loc.write_text('hello')
+
+    manifest = LocalizationManifest(str(tmp_path / 'manifest'))
+    assert manifest.make_key(AbsPath(str(tmp_path / 'x.txt')), str(loc)) is None
+
+    key = manifest.make_key(AbsPath(str(src)), str(loc))
+    assert not manifest.is_localized(key, str(loc))
+    manifest.add(key, str(loc))
+    assert manifest.is_localized(key, str(loc))
+    # different destination
+    assert not manifest.is_localized(key, str(tmp_path / 'loc2.txt'))
+
+    manifest.add(key, str(loc))
+    # localized file is modified
+    loc.write_text('hello world')
+    assert not manifest.is_localized(key, str(loc))
+    assert not os.listdir(manifest.manifest_dir)
+
+    # source file is modified
+    manifest.add(key, str(loc))
+    time.sleep(0.01)
+    src.write_text('hello!')
+    assert manifest.make_key(AbsPath(str(src)), str(loc)) != key
+
+
+def test_localization_manifest_concurrent_add(tmp_path):
+    """e.g. threads of a batch submission localizing a shared file.
+    """
+    src = tmp_path / 'src.txt'
+    src.write_text('hello')
+    loc = tmp_path / 'loc.txt'
+    loc.write_text('hello')
+
+    manifest = LocalizationManifest(str(tmp_path / 'manifest'))
+    key = manifest.make_key(AbsPath(str(src)), str(loc))
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda _: manifest.add(key, str(loc)), range(400)))
+
+    assert manifest.is_localized(key, str(loc))
+    assert len(os.listdir(manifest.manifest_dir)) == 1
+
+
+def test_autouri_thread_id_pool():
+    pool = AutoURIThreadIdPool()
+    with pool.acquire() as thread_id1:
+        with pool.acquire() as thread_id2:
+            assert thread_id1 != thread_id2
+            assert thread_id1 < -1 and thread_id2 < -1
+    assert pool.num_thread_ids == 2
+
+    def job(_):
+        with pool.acquire() as thread_id:
+            time.sleep(0.01)
+            return thread_id
+
+    # IDs are reused. bounded by number of concurrent jobs
+    for _ in range(3):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            thread_ids = set(executor.map(job, range(16)))
+        assert len(thread_ids) <= 4
+    assert pool.num_thread_ids == 4
+
+
+def test_localize_on_backend_with_manifest(tmp_path, http_dir):
+    root, url_prefix, server = http_dir
+    requests = server.requests
+    for i in range(3):
+        (root / 'ref{i}.fa'.format(i=i)).write_text('ACGT' * (i + 1))
+    inputs = {
+        'main.refs': [url_prefix + '/ref{i}.fa'.format(i=i) for i in range(3)],
+        'main.sample': url_prefix + '/ref0.fa',
+    }
+    (root / 'inputs.json').write_text(json.dumps(inputs))
+
+    caper_base = CaperBase(local_loc_dir=str(tmp_path / 'loc'))
+
+    def localize(no_loc_manifest=False):
+        requests.clear()
+        loc_json = caper_base.localize_on_backend(
+            url_prefix + '/inputs.json',
+            backend='Local',
+            recursive=True,
+            no_loc_manifest=no_loc_manifest,
+        )
+        with open(loc_json) as fp:
+            return json.load(fp)
+
+    loc_inputs = localize()
+    loc_ref0 = loc_inputs['main.sample']
+    assert loc_ref0 == loc_inputs['main.refs'][0]
+    assert open(loc_ref0).read() == 'ACGT'
+    mtime = os.path.getmtime(loc_ref0)
+
+    # without manifest, md5 file and file itself are checked again
+    assert localize(no_loc_manifest=True) == loc_inputs
+    num_requests_wo_manifest = requests['/ref1.fa'] + requests['/ref1.fa.md5']
+
+    # with manifest, only file's header is checked
+    assert localize() == loc_inputs
+    num_requests = requests['/ref1.fa'] + requests['/ref1.fa.md5']
+    assert num_requests == 1
+    assert num_requests < num_requests_wo_manifest
+    assert os.path.getmtime(loc_ref0) == mtime
+
+    # integrity check for localized file
+    with open(loc_ref0, 'w') as fp:
+        fp.write('corrupted')
+    localize()
+    assert open(loc_ref0).read() == 'ACGT'
+
+
+def test_localize_on_backend_without_version_info(tmp_path, http_dir):
+    root, url_prefix, server = http_dir
+    server.no_last_modified = True
+    (root / 'ref.fa').write_text('ACGT')
+    (root / 'inputs.json').write_text(json.dumps({'main.ref': url_prefix + '/ref.fa'}))
+
+    src = AutoURI(url_prefix + '/ref.fa')
+    assert src.get_metadata(skip_md5=True).mtime is None
+    assert LocalizationManifest.make_key(src, str(tmp_path / 'ref.fa')) is None
+
+    caper_base = CaperBase(local_loc_dir=str(tmp_path / 'loc'))
+    for _ in range(2):
+        loc_json = caper_base.localize_on_backend(
+            url_prefix + '/inputs.json', backend='Local', recursive=True
+        )
+    # not found on manifest, so file is checked again
+    assert server.requests['/ref.fa'] > 1
+    manifest_dir = caper_base._loc_manifest.manifest_dir
+    assert not os.path.exists(manifest_dir) or not os.listdir(manifest_dir)
+    with open(loc_json) as fp:
+        assert open(json.load(fp)['main.ref']).read() == 'ACGT'
+
+
+def test_localize_on_backend_self_reference(tmp_path):
+    inputs_json = tmp_path / 'inputs.json'
+    inputs_json.write_text(json.dumps({'main.inputs_json': str(inputs_json)}))
+
+    caper_base = CaperBase(local_loc_dir=str(tmp_path / 'loc'))
+    with pytest.raises(LocalizationRecursionError):
+        caper_base.localize_on_backend(
+            str(inputs_json), backend='Local', recursive=True
+        )
+
+
+def test_localize_on_backend_num_threads(tmp_path, http_dir):
+    root, url_prefix, server = http_dir
+    for i in range(8):
+        (root / 'fastq{i}.gz'.format(i=i)).write_text('ACGT' * (i + 1))
+    (root / 'ref.fa').write_text('ACGT')
+    (root / 'genome.tsv').write_text(
+        'ref\t{p}/ref.fa\nname\thg38\n'.format(p=url_prefix)
+    )
+    inputs = {
+        'main.fastqs': [url_prefix + '/fastq{i}.gz'.format(i=i) for i in range(8)],
+        'main.ref': url_prefix + '/ref.fa',
+        'main.genome_tsv': url_prefix + '/genome.tsv',
+    }
+    (root / 'inputs.json').write_text(json.dumps(inputs))
+    server.delay = 0.05
+
+    result = {}
+    elapsed = {}
+    for num_threads in (1, 8):
+        server.requests.clear()
+        caper_base = CaperBase(
+            local_loc_dir=str(tmp_path / 'loc{n}'.format(n=num_threads))
+        )
+        t_start = time.time()
+        loc_json = caper_base.localize_on_backend(
+            url_prefix + '/inputs.json',
+            backend='Local',
+            recursive=True,
+            num_threads=num_threads,
+        )
+        elapsed[num_threads] = time.time() - t_start
+        with open(loc_json) as fp:
+            result[num_threads] = json.load(fp)
+    # a thread_id for caller and one for each worker thread
+    assert AUTOURI_THREAD_ID_POOL.num_thread_ids <= 1 + 8
+    # duplicate file (main.ref and ref in genome TSV) is localized once
+    assert server.requests['/ref.fa'] == server.requests['/fastq0.gz']
+
+    loc_prefix1 = str(tmp_path / 'loc1')
+    loc_prefix8 = str(tmp_path / 'loc8')
+    assert json.loads(json.dumps(result[8]).replace(loc_prefix8, loc_prefix1)) == (
+        result[1]
+    )
+    # nested TSV is written and it points to localized files
+    with open(result[8]['main.genome_tsv']) as fp:
+        assert fp.read().split('\n')[0] == 'ref\t' + result[8]['main.ref']
+    print('elapsed: {e}'.format(e=elapsed))
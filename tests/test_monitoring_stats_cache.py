@@ -0,0 +1,52 @@
+import os
+
+from autouri import AbsPath
+
+from caper.monitoring_stats_cache import MonitoringStatsCache
+
+
+def test_monitoring_stats_cache(tmp_path):
+    log = tmp_path / 'monitoring.log'
+    log.write_text('timestamp\tmem\n0\t100\n')
+    uri = AbsPath(str(log))
+
+    cache = MonitoringStatsCache(cache_dir=str(tmp_path / 'cache'))
+    key = cache.make_key(uri.uri, uri.get_metadata(), [0], ['max'])
+    assert key == cache.make_key(uri.uri, uri.get_metadata(), [0], ['max'])
+    assert key != cache.make_key(uri.uri, uri.get_metadata(), [0], ['min'])
+    assert cache.get(key) is None
+
+    data = {'task_name': 'main.t1', 'stats': {'max': {'mem': 100}}}
+    cache.put(key, data)
+    assert cache.get(key) == data
+    assert cache.size > 0
+
+    # persistent
+    assert MonitoringStatsCache(cache_dir=str(tmp_path / 'cache')).get(key) == data
+
+    # modified log has a different key
+    log.write_text('timestamp\tmem\n0\t100\n1\t200\n')
+    os.utime(str(log), (0, 0))
+    assert key != cache.make_key(uri.uri, uri.get_metadata(), [0], ['max'])
+
+
+def test_monitoring_stats_cache_eviction(tmp_path):
+    cache = MonitoringStatsCache(cache_dir=str(tmp_path), max_size=1000)
+    # 129 bytes for each entry
+    value = {'x': 'a' * 120}
+    for i in range(10):
+        cache.put(str(i), value)
+        # make access time distinguishable
+        os.utime(str(tmp_path / '{i}.json'.format(i=i)), (i, i))
+    assert cache.size <= 1000
+    # least recently used ones are evicted
+    assert cache.get('0') is None
+    assert cache.get('8') == value
+    # recently used one survives
+    os.utime(str(tmp_path / '8.json'), (100, 100))
+
+    for i in range(10, 15):
+        cache.put(str(i), value)
+    assert cache.size <= 1000
+    assert cache.get('8') == value
+    assert cache.get('7') is None
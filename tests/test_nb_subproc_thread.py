@@ -1,9 +1,15 @@
 import os
+import threading
 import time
 
 import pytest
 
-from caper.nb_subproc_thread import NBSubprocThread
+from caper.nb_subproc_thread import (
+    NBSubprocThread,
+    OutputCapture,
+    RingBufferOutputCapture,
+    SpillOutputCapture,
+)
 
 SH_CONTENTS = """#!/bin/bash
 
@@ -52,7 +58,11 @@ def on_finish():
     return 'done'
 
 
-def test_nb_subproc_thread(tmp_path):
+ENGINES = [NBSubprocThread.ENGINE_SELECTOR, NBSubprocThread.ENGINE_THREAD]
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_nb_subproc_thread(tmp_path, engine):
     sh = tmp_path / 'test.sh'
     sh.write_text(SH_CONTENTS)
 
@@ -63,6 +73,7 @@ def test_nb_subproc_thread(tmp_path):
         on_stderr=on_stderr,
         on_finish=on_finish,
         poll_interval=0.1,
+        engine=engine,
     )
     assert th.returnvalue is None
     assert not th.is_alive()
@@ -75,11 +86,12 @@ def test_nb_subproc_thread(tmp_path):
     assert th.returnvalue == 'done'
 
 
-def test_nb_subproc_thread_stopped(tmp_path):
+@pytest.mark.parametrize('engine', ENGINES)
+def test_nb_subproc_thread_stopped(tmp_path, engine):
     sh = tmp_path / 'test.sh'
     sh.write_text(SH_CONTENTS)
 
-    th = NBSubprocThread(args=['bash', str(sh)], on_stdout=on_stdout)
+    th = NBSubprocThread(args=['bash', str(sh)], on_stdout=on_stdout, engine=engine)
     th.start()
     time.sleep(2)
     assert th.is_alive()
@@ -91,10 +103,13 @@ def test_nb_subproc_thread_stopped(tmp_path):
     assert 'hello kitty 4' not in th.stderr
 
 
-def test_nb_subproc_thread_nonzero_rc():
+@pytest.mark.parametrize('engine', ENGINES)
+def test_nb_subproc_thread_nonzero_rc(engine):
     for rc in range(10):
         th = NBSubprocThread(
-            args=['bash', '-c', 'exit {rc}'.format(rc=rc)], on_stderr=on_stderr
+            args=['bash', '-c', 'exit {rc}'.format(rc=rc)],
+            on_stderr=on_stderr,
+            engine=engine,
         )
         th.start()
         th.join()
@@ -115,3 +130,78 @@ def test_nb_subproc_thread_nonzero_rc_for_real_apps(test_app, expected_rc):
     assert th.returncode == expected_rc
     assert test_str in th.stderr
     assert th.stdout == ''
+
+
+def test_nb_subproc_thread_selector_lines():
+    """Selector engine reads raw chunks from pipes.
+    Callbacks should still get one complete line at a time.
+    """
+    stdouts = []
+    stderrs = []
+    script = (
+        'printf "a\\nb"; sleep 0.2; printf "c\\n\\nd\\n"; '
+        'printf "e\\n" 1>&2; printf "no newline" 1>&2'
+    )
+    th = NBSubprocThread(
+        args=['bash', '-c', script],
+        on_stdout=stdouts.append,
+        on_stderr=stderrs.append,
+        engine=NBSubprocThread.ENGINE_SELECTOR,
+    )
+    th.start()
+    th.join()
+    assert th.returncode == 0
+    assert stdouts == ['a\n', 'bc\n', '\n', 'd\n']
+    assert stderrs == ['e\n', 'no newline']
+    assert th.stdout == 'a\nbc\n\nd\n'
+
+
+def test_nb_subproc_thread_selector_single_thread():
+    num_threads = threading.active_count()
+    th = NBSubprocThread(
+        args=['bash', '-c', 'sleep 0.5'], engine=NBSubprocThread.ENGINE_SELECTOR
+    )
+    th.start()
+    time.sleep(0.2)
+    # no reader threads other than the thread itself
+    assert threading.active_count() == num_threads + 1
+    th.join()
+    assert th.returncode == 0
+
+
+def test_output_capture():
+    capture = OutputCapture()
+    for i in range(5):
+        capture.write('line {i}\n'.format(i=i))
+    assert capture.getvalue() == ''.join('line {i}\n'.format(i=i) for i in range(5))
+    capture.write('last\n')
+    assert capture.getvalue().endswith('line 4\nlast\n')
+
+
+def test_ring_buffer_output_capture():
+    capture = RingBufferOutputCapture(max_size=20)
+    for i in range(100):
+        capture.write('line {i:03d}\n'.format(i=i))
+    # last 2 lines (9 chars each)
+    assert capture.getvalue() == 'line 098\nline 099\n'
+
+    # a single chunk larger than max_size is truncated
+    capture.write('x' * 30 + '\n')
+    assert capture.getvalue() == 'x' * 19 + '\n'
+
+
+def test_spill_output_capture(tmp_path):
+    spill = tmp_path / 'stdout.txt'
+    capture = SpillOutputCapture(str(spill), max_size=20)
+    th = NBSubprocThread(
+        args=['bash', '-c', 'for i in $(seq 1000 1999); do echo $i; done'],
+        stdout_capture=capture,
+    )
+    th.start()
+    th.join()
+    assert th.returncode == 0
+    # tail in memory
+    assert th.stdout == '1996\n1997\n1998\n1999\n'
+    # everything in file
+    assert capture.read_all() == ''.join('{i}\n'.format(i=i) for i in range(1000, 2000))
+    assert spill.read_text() == capture.read_all()
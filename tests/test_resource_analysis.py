@@ -5,7 +5,11 @@ gs://encode-pipeline-test-samples/encode-atac-seq-pipeline/ENCSR356KRQ_subsample
 
 import pytest
 
-from caper.resource_analysis import LinearResourceAnalysis, ResourceAnalysis
+from caper.resource_analysis import (
+    LinearResourceAnalysis,
+    ResourceAnalysis,
+    TaskResourceTable,
+)
 
 
 def test_resource_analysis_abstract_class(gcp_res_analysis_metadata):
@@ -85,3 +89,115 @@ def test_resource_analysis_analyze(gcp_res_analysis_metadata):
     result_all = analysis.analyze()
     # 38 tasks in total
     assert len(result_all) == 38
+
+
+def make_task_resources():
+    """Makes a list of task resource data (as in CromwellMetadata.gcp_monitor())
+    for two workflows.
+    """
+    task_resources = []
+    for i in range(2):
+        task_resources += [
+            {
+                'task_name': 'main.align',
+                'workflow_id': 'wf{i}'.format(i=i),
+                'stats': {'max': {'mem': 1000 * (i + 1), 'disk': 0}},
+                'input_file_sizes': {'fastqs_R1': [10 * (i + 1)], 'fastqs_R2': []},
+            },
+            {
+                'task_name': 'main.align_mito',
+                'workflow_id': 'wf{i}'.format(i=i),
+                'stats': {'max': {'mem': 500 * (i + 1), 'disk': 2.5}},
+                'input_file_sizes': {
+                    'fastqs_R1': [10 * (i + 1)],
+                    'fastqs_R2': [20, 30],
+                },
+            },
+            {
+                # no monitoring data
+                'task_name': 'main.filter',
+                'workflow_id': 'wf{i}'.format(i=i),
+                'stats': {},
+                'input_file_sizes': {'bam': [100]},
+            },
+        ]
+    return task_resources
+
+
+def test_task_resource_table():
+    table = TaskResourceTable(make_task_resources())
+    assert len(table) == 6
+    assert table.task_names == ['main.align', 'main.align_mito', 'main.filter']
+    rows = table.find_rows('main.align*')
+    assert rows.tolist() == [0, 1, 3, 4]
+    assert table.find_rows('main.none').tolist() == []
+
+    resources = table.get_resources(rows, ['stats.max.mem', 'stats.max.cpu'])
+    assert list(resources) == ['stats.max.mem']
+    mem, mask = resources['stats.max.mem']
+    assert mem.tolist() == [1000, 500, 2000, 1000]
+    assert mask.all()
+    disk, mask = table.get_resources(rows, ['stats.max.disk'])['stats.max.disk']
+    assert disk.tolist() == [0.0, 2.5, 0.0, 2.5]
+    assert mask.tolist() == [False, True, False, True]
+
+    in_file_sizes = table.get_in_file_sizes(rows)
+    assert list(in_file_sizes) == ['fastqs_R1', 'fastqs_R2']
+    assert in_file_sizes['fastqs_R2'][0].tolist() == [0, 50, 0, 50]
+    assert list(table.get_in_file_sizes(rows, ['fastqs_R2'])) == ['fastqs_R2']
+    assert not table.get_in_file_sizes(table.find_rows('main.align'), ['fastqs_R2'])
+
+
+def test_resource_analysis_analyze_task_columnar():
+    analysis = LinearResourceAnalysis()
+    analysis._task_resources = make_task_resources()
+
+    result = analysis.analyze_task(
+        'main.align*', reduce_in_file_vars=None, target_resources=['stats.max.mem']
+    )
+    assert result['x'] == {'fastqs_R1': [10, 10, 20, 20], 'fastqs_R2': [0, 50, 0, 50]}
+    assert result['y'] == {'stats.max.mem': [1000, 500, 2000, 1000]}
+    assert isinstance(result['y']['stats.max.mem'][0], int)
+
+    result = analysis.analyze_task(
+        'main.align*', reduce_in_file_vars=sum, target_resources=['stats.max.disk']
+    )
+    # x only for tasks with y data
+    assert result['x'] == {'sum(fastqs_R1,fastqs_R2)': [60, 70]}
+    assert result['y'] == {'stats.max.disk': [2.5, 2.5]}
+
+    result = analysis.analyze_task(
+        'main.align*',
+        reduce_in_file_vars=lambda vec: vec[0] - vec[1],
+        target_resources=['stats.max.mem'],
+    )
+    assert result['x'] == {'<lambda>(fastqs_R1,fastqs_R2)': [10, -40, 20, -30]}
+    coeffs, intercept = result['coeffs']['stats.max.mem']
+    assert len(coeffs) == 1
+
+    result = analysis.analyze_task('main.filter')
+    assert result['x'] == {'sum()': []}
+    assert result['y'] == {}
+
+    result_all = analysis.analyze()
+    assert list(result_all) == ['main.align', 'main.align_mito', 'main.filter']
+
+
+def test_resource_analysis_analyze_num_processes(tmp_path):
+    analysis = LinearResourceAnalysis()
+    analysis._task_resources = make_task_resources()
+
+    plot_pdf_serial = str(tmp_path / 'serial.pdf')
+    plot_pdf_parallel = str(tmp_path / 'parallel.pdf')
+    result_serial = analysis.analyze(plot_pdf=plot_pdf_serial)
+    result_parallel = analysis.analyze(plot_pdf=plot_pdf_parallel, num_processes=2)
+    assert result_parallel == result_serial
+    assert list(result_parallel) == list(result_serial)
+
+    # one page for each fitted (task, resource)
+    num_pages = sum(
+        1 for coeffs in result_serial.values() for c in coeffs['coeffs'].values() if c
+    )
+    for plot_pdf in (plot_pdf_serial, plot_pdf_parallel):
+        with open(plot_pdf, 'rb') as fp:
+            assert fp.read().count(b'/Type /Page ') == num_pages
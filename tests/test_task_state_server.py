@@ -0,0 +1,39 @@
+from caper.cromwell_workflow_monitor import CromwellWorkflowMonitor, TaskStateTable
+from caper.task_state_server import TaskStateServer
+
+
+def test_task_state_server():
+    wf_id = 'abcdef01-0000-4000-8000-000000000000'
+    table = TaskStateTable()
+    wm = CromwellWorkflowMonitor(task_state_table=table)
+    assert wm.task_state_table is table
+
+    wm.update(
+        'workflow {id} submitted\n'
+        'BackgroundConfigAsyncJobExecutionActor [UUID(abcdef01)main.t1:0:1]: '
+        'job id: 1000\n'
+        'BackgroundConfigAsyncJobExecutionActor [UUID(abcdef01)main.t1:1:1]: '
+        'job id: 1001\n'
+        'BackgroundConfigAsyncJobExecutionActor [UUID(abcdef01)main.t1:0:1]: '
+        'Status change from Running to Done\n'.format(id=wf_id)
+    )
+
+    server = TaskStateServer(port=0)
+    server.start(task_state_table=table)
+    try:
+        assert server.is_alive()
+        res = server.read('localhost', wf_id)
+        assert res['workflow_id'] == wf_id
+        assert res['status_count'] == {'Done': 1, 'Started': 1}
+        assert sorted((t['shard_idx'], t['job_id']) for t in res['tasks']) == [
+            (0, '1000'),
+            (1, '1001'),
+        ]
+        assert server.read('localhost', 'not-existing-id')['tasks'] == []
+        port = server.port
+    finally:
+        server.stop()
+
+    assert not server.is_alive()
+    # endpoint is not available any more
+    assert TaskStateServer(port=port, timeout=1.0).read('localhost', wf_id) is None
@@ -0,0 +1,80 @@
+import zipfile
+
+from caper.caper_wdl_parser import CaperWDLParser
+from caper.cromwell import Cromwell
+from caper.womtool_validation_cache import WomtoolValidationCache
+
+from .example_wdl import make_directory_with_wdls
+
+
+def test_womtool_validation_cache_make_key(tmp_path):
+    womtool = tmp_path / 'womtool-59.jar'
+    womtool.write_text('jar')
+    wdl = tmp_path / 'main.wdl'
+    wdl.write_text('version 1.0\nworkflow main {}\n')
+    inputs = tmp_path / 'inputs.json'
+    inputs.write_text('{}')
+
+    make_key = WomtoolValidationCache.make_key
+    key = make_key(str(womtool), str(wdl), str(inputs))
+    assert key == make_key(str(womtool), str(wdl), str(inputs))
+    assert key != make_key(str(womtool), str(wdl))
+
+    # contents of WDL/inputs matter
+    inputs.write_text('{"main.a": 1}')
+    key2 = make_key(str(womtool), str(wdl), str(inputs))
+    assert key != key2
+
+    # new Womtool invalidates all
+    womtool.write_text('new jar')
+    assert key2 != make_key(str(womtool), str(wdl), str(inputs))
+
+
+def test_womtool_validation_cache_make_key_imports(tmp_path):
+    """imports ZIP is made again for each submission.
+    Key should not depend on mtimes of files in it.
+    """
+    womtool = tmp_path / 'womtool-59.jar'
+    womtool.write_text('jar')
+    make_directory_with_wdls(str(tmp_path / 'wdls'))
+    wdl = str(tmp_path / 'wdls' / 'main.wdl')
+    imports = CaperWDLParser(wdl).create_imports_file(str(tmp_path))
+
+    def rezip(zip_file, date_time, modify=False):
+        with zipfile.ZipFile(imports) as z_src, zipfile.ZipFile(
+            zip_file, 'w'
+        ) as z_dest:
+            for name in z_src.namelist():
+                contents = z_src.read(name)
+                if modify:
+                    contents += b'\n'
+                z_dest.writestr(zipfile.ZipInfo(name, date_time=date_time), contents)
+        return zip_file
+
+    imports1 = rezip(str(tmp_path / 'imports1.zip'), (2020, 1, 1, 0, 0, 0))
+    imports2 = rezip(str(tmp_path / 'imports2.zip'), (2021, 1, 1, 0, 0, 0))
+    with open(imports1, 'rb') as fp1, open(imports2, 'rb') as fp2:
+        assert fp1.read() != fp2.read()
+
+    make_key = WomtoolValidationCache.make_key
+    key = make_key(str(womtool), wdl, imports=imports1)
+    assert key == make_key(str(womtool), wdl, imports=imports2)
+    assert key != make_key(str(womtool), wdl)
+
+    imports3 = rezip(str(tmp_path / 'imports3.zip'), (2020, 1, 1, 0, 0, 0), True)
+    assert key != make_key(str(womtool), wdl, imports=imports3)
+
+
+def test_validate_with_cache(tmp_path):
+    """Validated WDL/inputs are not validated with Womtool (Java) again.
+    Womtool JAR here is not real so that it fails if Womtool is actually run.
+    """
+    womtool = tmp_path / 'womtool-59.jar'
+    womtool.write_text('not a jar')
+    wdl = tmp_path / 'main.wdl'
+    wdl.write_text('version 1.0\nworkflow main {}\n')
+
+    cache = WomtoolValidationCache(cache_dir=str(tmp_path / 'cache'))
+    cache.put(cache.make_key(str(womtool), str(wdl)), {'valid': True})
+    cromwell = Cromwell(womtool=str(womtool), womtool_validation_cache=cache)
+    assert cromwell.validate(str(wdl))
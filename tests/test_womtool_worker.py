@@ -0,0 +1,34 @@
+import pytest
+
+from caper.cromwell import Cromwell
+from caper.womtool_worker import WomtoolWorker, WomtoolWorkerError
+
+
+def test_womtool_worker_invalid_args(tmp_path):
+    worker = WomtoolWorker(str(tmp_path / 'womtool.jar'))
+    with pytest.raises(ValueError):
+        worker.run(['validate', 'main\t.wdl'])
+    assert not worker.is_alive
+
+
+def test_womtool_worker_fails_to_start(tmp_path):
+    """Worker fails to load Womtool from a wrong JAR (or Java is not found).
+    """
+    womtool = tmp_path / 'womtool.jar'
+    womtool.write_text('not a jar')
+    worker = WomtoolWorker(str(womtool))
+    with pytest.raises(WomtoolWorkerError):
+        worker.run(['--version'])
+    assert not worker.is_alive
+
+
+def test_validate_falls_back_without_womtool_worker(tmp_path):
+    womtool = tmp_path / 'womtool.jar'
+    womtool.write_text('not a jar')
+    wdl = tmp_path / 'main.wdl'
+    wdl.write_text('version 1.0\nworkflow main {}\n')
+
+    c = Cromwell(womtool=str(womtool), use_womtool_worker=True)
+    c.validate(str(wdl))
+    assert not c._use_womtool_worker
+    assert c._womtool_worker is None